@@ -0,0 +1,122 @@
+"""Compare concurrent API calls over HTTP/1.1 and multiplexed over HTTP/2.
+
+Local servers answer every ``ping`` after a simulated network latency, one
+speaks HTTP/1.1, the other HTTP/2 with prior knowledge (requires the ``http2``
+extra). Calls are made from a pool of threads like ``--jobs`` does, e.g.::
+
+    python benchmarks/http2_concurrency.py --requests 200 --jobs 16 --latency 0.05
+"""
+
+import argparse
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+import h2.config
+import h2.connection
+import h2.events
+
+from porkbun_api_cli.api import PorkbunAPI
+
+BODY = b'{"status": "SUCCESS", "yourIp": "127.0.0.1"}'
+
+
+class Server(ThreadingHTTPServer):
+    request_queue_size = 1024
+
+
+def make_handler(latency, connections):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            connections.append(1)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(BODY)))
+            self.end_headers()
+            self.wfile.write(BODY)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve_h2(sock, latency, connections):
+    def handle(client):
+        conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False))
+        lock = threading.Lock()
+
+        def respond(stream_id):
+            with lock:
+                conn.send_headers(stream_id, [(":status", "200"), ("content-length", str(len(BODY)))])
+                conn.send_data(stream_id, BODY, end_stream=True)
+                client.sendall(conn.data_to_send())
+
+        with lock:
+            conn.initiate_connection()
+            client.sendall(conn.data_to_send())
+        while data := client.recv(65535):
+            with lock:
+                for event in conn.receive_data(data):
+                    if isinstance(event, h2.events.DataReceived):
+                        conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+                    elif isinstance(event, h2.events.StreamEnded):
+                        threading.Timer(latency, respond, args=(event.stream_id,)).start()
+                client.sendall(conn.data_to_send())
+
+    while True:
+        client, _ = sock.accept()
+        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connections.append(1)
+        threading.Thread(target=handle, args=(client,), daemon=True).start()
+
+
+def measure(name, api, requests, jobs, connections):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for _ in executor.map(lambda _: api.get_my_ip(), range(requests)):
+            pass
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<10} {requests:>6} requests {elapsed:8.3f} s {requests / elapsed:10.1f} req/s {len(connections):>4} conn"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200, help="number of API calls")
+    parser.add_argument("--jobs", type=int, default=16, help="number of concurrent calls")
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated latency in seconds")
+    args = parser.parse_args()
+
+    http1_connections, http2_connections = [], []
+    server = Server(("127.0.0.1", 0), make_handler(args.latency, http1_connections))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    sock = socket.create_server(("127.0.0.1", 0), backlog=1024)
+    threading.Thread(target=serve_h2, args=(sock, args.latency, http2_connections), daemon=True).start()
+
+    http1 = PorkbunAPI(apikey="apikey", secretapikey="secretapikey", endpoint=f"http://127.0.0.1:{server.server_port}/")
+    http2 = PorkbunAPI(
+        apikey="apikey", secretapikey="secretapikey", endpoint=f"http://127.0.0.1:{sock.getsockname()[1]}/", http2=True
+    )
+    try:
+        measure("HTTP/1.1", http1, args.requests, args.jobs, http1_connections)
+        measure("HTTP/2", http2, args.requests, args.jobs, http2_connections)
+    finally:
+        http2.close()
+        server.shutdown()
+        sock.close()
+
+
+if __name__ == "__main__":
+    main()
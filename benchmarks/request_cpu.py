@@ -0,0 +1,78 @@
+"""Measure client-side CPU time spent per API request, excluding the network.
+
+Request bodies are built the way earlier versions did (merging credentials and
+the endpoint into the payload, encoding with the standard library) and with the
+pre-encoded credential envelope of the current codec. Responses are decoded
+with the standard library and with the current codec::
+
+    python benchmarks/request_cpu.py --number 100000
+"""
+
+import argparse
+import json
+import timeit
+from unittest.mock import Mock
+
+from porkbun_api_cli import codec
+from porkbun_api_cli.api import PorkbunAPI
+
+CONFIG = {
+    "secretapikey": "sk1_" + "0" * 64,
+    "apikey": "pk1_" + "0" * 64,
+    "endpoint": "https://api.porkbun.com/api/json/v3/",
+}
+
+PAYLOAD = {"name": "www", "type": "A", "content": "192.168.192.168", "ttl": "600"}
+
+RESPONSE = json.dumps(
+    {
+        "status": "SUCCESS",
+        "records": [
+            {"id": str(i), "name": f"host{i}.example.com", "type": "A", "content": "192.168.192.168", "ttl": "600"}
+            for i in range(20)
+        ],
+    }
+).encode("utf-8")
+
+
+class CannedTransport:
+    """Transport answering every request with the same response, without any network."""
+
+    def __init__(self, response):
+        self.response = response
+
+    def post(self, url, data, headers, stream=False, timeout=None):
+        return self.response
+
+    def close(self):
+        pass
+
+
+def report(name, number, func):
+    elapsed = min(timeit.repeat(func, number=number, repeat=5))
+    print(f"{name:<36} {elapsed / number * 1e6:8.2f} us/request")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=100000, help="number of requests per measurement")
+    args = parser.parse_args()
+
+    print(f"codec: {codec.NAME}")
+
+    envelope = codec.encode_envelope({"secretapikey": CONFIG["secretapikey"], "apikey": CONFIG["apikey"]})
+    report("encode body (merge + json.dumps)", args.number, lambda: json.dumps({**CONFIG, **PAYLOAD}))
+    report("encode body (envelope + codec)", args.number, lambda: codec.encode_with_envelope(envelope, PAYLOAD))
+    report("decode response (json.loads)", args.number, lambda: json.loads(RESPONSE))
+    report("decode response (codec)", args.number, lambda: codec.loads(RESPONSE))
+
+    api = PorkbunAPI(**CONFIG, transport=CannedTransport(Mock(status_code=200, content=RESPONSE)))
+    report(
+        "PorkbunAPI._query_api",
+        args.number // 10,
+        lambda: api._query_api("dns/create/example.com", payload=PAYLOAD, datafield="records"),
+    )
+
+
+if __name__ == "__main__":
+    main()
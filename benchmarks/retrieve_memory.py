@@ -0,0 +1,81 @@
+"""Compare peak memory of retrieving a large zone as a whole and as a stream.
+
+A local HTTP server serves a gzip compressed ``dns/retrieve`` response with
+the requested number of records, e.g.::
+
+    python benchmarks/retrieve_memory.py --records 100000
+"""
+
+import argparse
+import gzip
+import json
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+from porkbun_api_cli.api import PorkbunAPI
+
+
+def make_handler(body):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def measure(name, func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{name:<28} {count:>8} records {elapsed:8.3f} s {peak / 2**20:10.1f} MiB peak")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=100000, help="number of records in the zone")
+    args = parser.parse_args()
+
+    records = [
+        {
+            "id": str(i),
+            "name": f"host{i}.example.com",
+            "type": "A",
+            "content": f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+            "ttl": "600",
+            "prio": None,
+            "notes": "",
+        }
+        for i in range(args.records)
+    ]
+    body = gzip.compress(json.dumps({"status": "SUCCESS", "records": records}).encode("utf-8"))
+    del records
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(body))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api = PorkbunAPI(apikey="apikey", secretapikey="secretapikey", endpoint=f"http://127.0.0.1:{server.server_port}/")
+
+    try:
+        measure("list_dns_records", lambda: len(api.list_dns_records("example.com")))
+        measure("list(iter_dns_records)", lambda: len(list(api.iter_dns_records("example.com"))))
+        measure("iter_dns_records (consume)", lambda: sum(1 for _ in api.iter_dns_records("example.com")))
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Compare record updates of many hosts served by ``serve`` with every host calling the API itself.
+
+A local server plays the Porkbun API, keeping records in memory and answering
+every call after a simulated network latency. Every client sets its own record
+a number of times, half of them to the value it already has, either through a
+record server sharing one API client and its zone cache, or with an API client
+of its own retrieving the zone first like a run of ``sync`` does, e.g.::
+
+    python benchmarks/server_throughput.py --clients 64 --updates 10 --latency 0.05
+"""
+
+import argparse
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+from porkbun_api_cli import ratelimit
+from porkbun_api_cli import server
+from porkbun_api_cli import transport
+from porkbun_api_cli.api import PorkbunAPI
+
+DOMAIN = "example.com"
+TOKEN = "benchmark-token-0123456789"
+
+
+class APIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def make_handler(latency, records, calls, lock):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            parts = self.path.strip("/").split("/")
+            time.sleep(latency)
+            with lock:
+                calls.append(parts[1])
+                if parts[1] == "retrieve":
+                    response = {"status": "SUCCESS", "records": [dict(x) for x in records]}
+                elif parts[1] == "create":
+                    record = {**payload, "id": str(len(records) + 1), "name": f"{payload['name']}.{DOMAIN}"}
+                    del record["apikey"], record["secretapikey"]
+                    records.append(record)
+                    response = {"status": "SUCCESS", "id": len(records)}
+                else:
+                    next(x for x in records if x["id"] == parts[3])["content"] = payload["content"]
+                    response = {"status": "SUCCESS"}
+            body = json.dumps(response).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def contents(updates):
+    # every other update repeats the value already set
+    return [f"10.0.{i // 2}.1" for i in range(updates)]
+
+
+def run_direct(endpoint, client, updates):
+    for content in contents(updates):
+        api = PorkbunAPI(apikey="apikey", secretapikey="secretapikey", endpoint=endpoint)
+        record = {"name": f"host{client}", "type": "A", "content": content}
+        existing = [x for x in api.iter_dns_records(DOMAIN) if x["name"] == f"host{client}.{DOMAIN}"]
+        if not existing:
+            api.create_record(DOMAIN, record)
+        elif existing[0]["content"] != content:
+            api.update_record(DOMAIN, existing[0]["id"], record)
+
+
+def run_served(port, client, updates):
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    for content in contents(updates):
+        body = json.dumps({"domain": DOMAIN, "name": f"host{client}", "type": "A", "content": content})
+        connection.request("POST", "/records", body=body, headers={"Authorization": f"Bearer {TOKEN}"})
+        response = connection.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError(f"request failed with {response.status} HTTP status code")
+    connection.close()
+
+
+def measure(name, run, clients, updates, calls):
+    del calls[:]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        for _ in executor.map(run, range(clients)):
+            pass
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<8} {clients * updates:>6} updates {elapsed:8.3f} s {clients * updates / elapsed:10.1f} updates/s"
+        f" {len(calls):>6} API calls"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=64, help="number of concurrent clients")
+    parser.add_argument("--updates", type=int, default=10, help="number of updates per client")
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated latency in seconds")
+    parser.add_argument("--rate-limit", type=float, default=1000, help="API requests per second of the server")
+    args = parser.parse_args()
+
+    records, calls, lock = [], [], threading.Lock()
+    api_server = APIServer(("127.0.0.1", 0), make_handler(args.latency, records, calls, lock))
+    threading.Thread(target=api_server.serve_forever, daemon=True).start()
+    endpoint = f"http://127.0.0.1:{api_server.server_port}/"
+
+    api = PorkbunAPI(
+        apikey="apikey",
+        secretapikey="secretapikey",
+        endpoint=endpoint,
+        transport=transport.RequestsTransport(pool_size=server.POOL_SIZE),
+    )
+    api.rate_limiter = ratelimit.TokenBucket(args.rate_limit, burst=int(args.rate_limit))
+    clients = {"benchmark": {"token": TOKEN, "records": [f"*.{DOMAIN}"]}}
+    record_server = server.create_server(server.RecordService(server.ZoneCache(api), clients), port=0)
+    threading.Thread(target=record_server.serve_forever, daemon=True).start()
+
+    try:
+        measure("direct", lambda i: run_direct(endpoint, i, args.updates), args.clients, args.updates, calls)
+        del records[:]
+        measure(
+            "served",
+            lambda i: run_served(record_server.server_port, i, args.updates),
+            args.clients,
+            args.updates,
+            calls,
+        )
+    finally:
+        record_server.shutdown()
+        record_server.server_close()
+        api.close()
+        api_server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
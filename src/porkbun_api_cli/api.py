@@ -1,26 +1,130 @@
-import json
+import codecs
+import copy
+import time
 
-import requests
+from . import circuit
+from . import codec
+from . import jsonstream
+from . import transport
+from . import utils
+
+
+def _endpoint_family(endpoint):
+    """Get the family of an API endpoint sharing a circuit, i.e., the endpoint without the domain
+    name and other parameters.
+
+    >>> _endpoint_family("dns/edit/example.com/123"), _endpoint_family("ping")
+    ('dns/edit', 'ping')"""
+    return "/".join(endpoint.split("/")[:2])
+
+
+def _create_transport(endpoint, http2):
+    if http2:
+        return transport.HTTP2Transport(prior_knowledge=endpoint.startswith("http://"))
+    return transport.RequestsTransport()
 
 
 class PorkbunAPI:
 
-    def __init__(self, apikey, secretapikey, endpoint):
-        self._config = {"secretapikey": secretapikey, "apikey": apikey, "endpoint": endpoint}
+    # no Accept-Encoding is set: the HTTP client of the transport advertises every encoding it
+    # can decode, gzip and deflate as well as brotli and zstd if their decoders are installed, and
+    # decompresses responses on the fly, also while streaming
+    HEADERS = {}
+
+    # size of response chunks read while streaming
+    CHUNK_SIZE = 64 * 1024
+
+    # number of domains returned per page by domain/listAll
+    DOMAINS_PAGE_SIZE = 1000
+
+    def __init__(
+        self,
+        apikey,
+        secretapikey,
+        endpoint,
+        http2=False,
+        transport=None,
+        circuit_breaker=None,
+        connect_timeout=10.0,
+        read_timeout=60.0,
+    ):
+        self._endpoint = endpoint
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        # time budget of the run, timeouts of requests are limited to what is left of it
+        self.deadline = None
+        # requests are sent with ``requests`` unless multiplexed over HTTP/2, or
+        # through a transport given explicitly, e.g., to record or replay them
+        self.transport = _create_transport(endpoint, http2) if transport is None else transport
+        # requests to failing endpoints fail fast with ``circuit.CircuitOpenError``
+        self.circuit_breaker = circuit.CircuitBreaker() if circuit_breaker is None else circuit_breaker
+        # requests wait for their turn if set, e.g., ``ratelimit.TokenBucket`` shared by all threads
+        self.rate_limiter = None
+        # called with the endpoint family, seconds taken and HTTP status code (None if raised) of every
+        # request if set, e.g., ``history.LatencyHistory.observe``
+        self.observer = None
+        # credentials are encoded once and spliced into every request body
+        self._envelope = codec.encode_envelope({"secretapikey": secretapikey, "apikey": apikey})
+        # fingerprints of retrieved zones keyed by domain name, only computed if enabled
+        self.fingerprint_zones = False
+        self.zone_fingerprints = {}
+
+    def _post(self, endpoint, payload=None, stream=False):
+        timeout = (self.connect_timeout, self.read_timeout)
+        if self.deadline is not None:
+            timeout = self.deadline.timeout(*timeout)
+        family = _endpoint_family(endpoint)
+        self.circuit_breaker.before(family)
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        data = codec.encode_with_envelope(self._envelope, payload)
+        start = time.monotonic()
+        try:
+            response = self.transport.post(
+                self._endpoint + endpoint, data, self.HEADERS, stream=stream, timeout=timeout
+            )
+        except Exception:
+            self.circuit_breaker.record(family, False)
+            if self.observer is not None:
+                self.observer(family, time.monotonic() - start, None)
+            raise
+        if self.observer is not None:
+            self.observer(family, time.monotonic() - start, response.status_code)
+        # client errors other than rate limiting are caused by the request, not the API
+        self.circuit_breaker.record(family, response.status_code < 500 and response.status_code != 429)
+        return response
+
+    def close(self):
+        """Close connections kept open and files written by the transport."""
+        self.transport.close()
+
+    def with_deadline(self, deadline):
+        """Get a client limited by a time budget of its own, e.g., for one of many concurrent runs.
+
+        It shares the transport, circuit breaker, rate limiter and everything else with this
+        client, whose own deadline is left as it is.
+
+        :param deadline: time budget of requests made with the returned client, None for none
+        :type deadline: porkbun_api_cli.budget.Deadline
+        :rtype: PorkbunAPI"""
+        client = copy.copy(self)
+        client.deadline = deadline
+        return client
 
     def _query_api(self, endpoint, payload=None, datafield=None):
-        if payload is None:
-            payload = {}
-        data = {**self._config, **payload}
+        import requests
 
         try:
-            r = requests.post(self._config["endpoint"] + endpoint, data=json.dumps(data))
-        except requests.RequestException as e:
+            r = self._post(endpoint, payload)
+        except (requests.RequestException, transport.TransportError) as e:
             return "request raised an exception: " + str(e), False
 
         if r.status_code == 200:
-            response = r.json()
-            if "status" in response:
+            try:
+                response = codec.loads(r.content)
+            except ValueError:
+                return f"invalid response from '{endpoint}': malformed JSON", False
+            if isinstance(response, dict) and "status" in response:
                 if response["status"] == "SUCCESS":
                     if datafield is None:
                         return None, True
@@ -48,17 +152,84 @@ class PorkbunAPI:
                 False,
             )
 
-    def list_dns_records(
-        self,
-        domain,
-    ):
-        data, success = self._query_api(endpoint=f"dns/retrieve/{domain}", datafield="records")
+    def list_dns_records(self, domain, name_types=None):
+        if name_types is None:
+            data, success = self._query_api(endpoint=f"dns/retrieve/{domain}", datafield="records")
+        else:
+            # only retrieve records with given subdomain names and types
+            data, success = [], True
+            for name, record_type in name_types:
+                try:
+                    data.extend(self.list_dns_records_by_name_type(domain, record_type, name))
+                except RuntimeError as e:
+                    data, success = str(e), False
+                    break
 
         if success:
+            if self.fingerprint_zones:
+                self.zone_fingerprints[domain] = utils.fingerprint_records(data)
             return data
         else:
             raise RuntimeError("list_dns_records failed: " + data)
 
+    def iter_dns_records(self, domain):
+        """Retrieve all DNS records of a domain and yield them one by one as they are parsed
+        from the response, without holding the whole response in memory.
+
+        :param domain: domain name
+        :type domain: str
+        :returns: existing DNS records
+        :rtype: generator"""
+        import requests
+
+        endpoint = f"dns/retrieve/{domain}"
+        fingerprint = utils.RecordsFingerprint() if self.fingerprint_zones else None
+        fields = {}
+        try:
+            with self._post(endpoint, stream=True) as r:
+                if r.status_code != 200:
+                    raise RuntimeError(
+                        f"iter_dns_records failed: request to '{endpoint}' failed with {r.status_code} HTTP status code"
+                    )
+                # JSON is always UTF-8 encoded, whatever the response headers say
+                decoder = codecs.getincrementaldecoder("utf-8")()
+                chunks = (decoder.decode(chunk) for chunk in r.iter_content(chunk_size=self.CHUNK_SIZE))
+                for record in jsonstream.iter_array_member(chunks, "records", fields):
+                    if fields.get("status", "SUCCESS") != "SUCCESS":
+                        break
+                    if fingerprint is not None:
+                        fingerprint.add(record)
+                    yield record
+        except (requests.RequestException, transport.TransportError) as e:
+            raise RuntimeError("iter_dns_records failed: request raised an exception: " + str(e)) from e
+        except ValueError as e:
+            raise RuntimeError(f"iter_dns_records failed: invalid response from '{endpoint}': {str(e)}") from e
+
+        if "status" not in fields:
+            raise RuntimeError(f"iter_dns_records failed: invalid response from '{endpoint}': status field not found")
+        if fields["status"] != "SUCCESS":
+            raise RuntimeError(
+                "iter_dns_records failed: "
+                + fields.get("message", f"invalid response from '{endpoint}': no error message provided")
+            )
+        if fingerprint is not None:
+            self.zone_fingerprints[domain] = fingerprint.hexdigest()
+
+    def list_dns_records_by_name_type(self, domain, record_type, subdomain=""):
+        if isinstance(domain, str) and len(domain) > 0 and isinstance(record_type, str) and len(record_type) > 0:
+            endpoint = f"dns/retrieveByNameType/{domain}/{record_type}"
+            if subdomain:
+                endpoint += f"/{subdomain}"
+            data, success = self._query_api(endpoint=endpoint, datafield="records")
+        else:
+            data = "invalid input values"
+            success = False
+
+        if success:
+            return data
+        else:
+            raise RuntimeError("list_dns_records_by_name_type failed: " + data)
+
     def create_record(self, domain, record):
         if (
             isinstance(domain, str)
@@ -94,6 +265,78 @@ class PorkbunAPI:
         else:
             raise RuntimeError("update_record failed: " + data)
 
+    def update_records_by_name_type(self, domain, record_type, subdomain, new_record):
+        if (
+            isinstance(domain, str)
+            and len(domain) > 0
+            and isinstance(record_type, str)
+            and len(record_type) > 0
+            and isinstance(subdomain, str)
+            and isinstance(new_record, dict)
+            and "content" in new_record
+        ):
+            endpoint = f"dns/editByNameType/{domain}/{record_type}"
+            if subdomain:
+                endpoint += f"/{subdomain}"
+            payload = {x: new_record[x] for x in ["content", "ttl", "prio", "notes"] if x in new_record}
+            data, success = self._query_api(endpoint=endpoint, payload=payload)
+        else:
+            data = "invalid input values"
+            success = False
+
+        if success:
+            return None
+        else:
+            raise RuntimeError("update_records_by_name_type failed: " + data)
+
+    def list_domains(self, start=0):
+        if isinstance(start, int) and start >= 0:
+            data, success = self._query_api(
+                endpoint="domain/listAll", payload={"start": str(start)}, datafield="domains"
+            )
+        else:
+            data = "invalid input values"
+            success = False
+
+        if success:
+            return data
+        else:
+            raise RuntimeError("list_domains failed: " + data)
+
+    def list_all_domains(self, jobs=4):
+        """List all domains in the account. Pages are requested ``jobs`` at a time concurrently
+        until a page that is not full is received.
+
+        :param jobs: number of pages requested concurrently
+        :type jobs: int
+        :returns: domains in the account
+        :rtype: list"""
+        from concurrent.futures import ThreadPoolExecutor
+
+        jobs = max(1, jobs)
+        result = []
+        start = 0
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            while True:
+                starts = range(start, start + jobs * self.DOMAINS_PAGE_SIZE, self.DOMAINS_PAGE_SIZE)
+                for page in executor.map(self.list_domains, starts):
+                    result.extend(page)
+                    if len(page) < self.DOMAINS_PAGE_SIZE:
+                        return result
+                start += jobs * self.DOMAINS_PAGE_SIZE
+
+    def get_nameservers(self, domain):
+        if isinstance(domain, str) and len(domain) > 0:
+            data, success = self._query_api(endpoint=f"domain/getNs/{domain}", datafield="ns")
+        else:
+            data = "invalid input values"
+            success = False
+
+        if success:
+            return data
+        else:
+            raise RuntimeError("get_nameservers failed: " + data)
+
     def get_my_ip(self):
         data, success = self._query_api(endpoint="ping", datafield="yourIp")
 
@@ -0,0 +1,54 @@
+import time
+
+
+class DeadlineExceeded(RuntimeError):
+    """Work was not started as the time budget of the run is used up."""
+
+
+class Deadline:
+    """Time budget of a run shared by all API calls made during it.
+
+    :param seconds: budget in seconds from now
+    :type seconds: float
+    :param clock: monotonic clock returning seconds
+    :type clock: callable"""
+
+    def __init__(self, seconds, clock=time.monotonic):
+        self.seconds = seconds
+        self.clock = clock
+        self._end = clock() + seconds
+
+    def remaining(self):
+        """Get the remaining budget.
+
+        :returns: seconds left, never negative
+        :rtype: float"""
+        return max(0.0, self._end - self.clock())
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    def check(self):
+        """Make sure some budget is left before starting work.
+
+        :raises DeadlineExceeded: if the budget is used up"""
+        if self.expired:
+            raise DeadlineExceeded(f"deadline of {self.seconds:g} s exceeded")
+
+    def timeout(self, connect, read):
+        """Limit connect and read timeouts of a request to the remaining budget.
+
+        >>> Deadline(20, clock=lambda: 0.0).timeout(10, 60)
+        (10, 20.0)
+
+        :param connect: connect timeout in seconds
+        :type connect: float
+        :param read: read timeout in seconds
+        :type read: float
+        :returns: connect and read timeouts
+        :rtype: tuple
+        :raises DeadlineExceeded: if the budget is used up"""
+        self.check()
+        remaining = self.remaining()
+        return min(connect, remaining), min(read, remaining)
@@ -0,0 +1,114 @@
+import collections
+import threading
+import time
+
+
+class CircuitOpenError(RuntimeError):
+    """Request was not sent as too many recent requests to the same endpoint failed."""
+
+    def __init__(self, family, failures, requests, retry_in):
+        super().__init__(
+            f"circuit open for '{family}' after {failures} of {requests} recent requests failed,"
+            f" next attempt in {retry_in:.1f} s"
+        )
+        self.family = family
+
+
+class _Circuit:
+    def __init__(self, window):
+        self.results = collections.deque(maxlen=window)
+        self.opened_at = None
+        self.probing = False
+
+
+class CircuitBreaker:
+    """Fail requests immediately while an API endpoint is failing.
+
+    Outcomes of recent requests are tracked per endpoint family, e.g., ``dns/create``
+    for all domains. Once at least ``min_requests`` of the last ``window`` requests were
+    made and the share of failures reaches ``threshold``, the circuit opens and requests
+    fail with :class:`CircuitOpenError` without being sent. Every ``reset_timeout`` seconds
+    the circuit half-opens to let a single request through as a probe: the circuit closes
+    if it succeeds and stays open otherwise.
+
+    :param threshold: share of failed requests opening the circuit
+    :type threshold: float
+    :param min_requests: number of requests needed before the circuit may open
+    :type min_requests: int
+    :param window: number of recent requests tracked
+    :type window: int
+    :param reset_timeout: seconds until an open circuit lets a probe through
+    :type reset_timeout: float
+    :param clock: monotonic clock returning seconds
+    :type clock: callable"""
+
+    def __init__(self, threshold=0.5, min_requests=5, window=20, reset_timeout=30.0, clock=time.monotonic):
+        self.threshold = threshold
+        self.min_requests = min_requests
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def _circuit(self, family):
+        if family not in self._circuits:
+            self._circuits[family] = _Circuit(self.window)
+        return self._circuits[family]
+
+    def state(self, family):
+        """Get the state of the circuit of an endpoint family.
+
+        :param family: endpoint family
+        :type family: str
+        :returns: "closed", "open" or "half-open"
+        :rtype: str"""
+        with self._lock:
+            circuit = self._circuit(family)
+            if circuit.opened_at is None:
+                return "closed"
+            return "half-open" if circuit.probing else "open"
+
+    def before(self, family):
+        """Check whether a request may be sent, called before sending it.
+
+        :param family: endpoint family
+        :type family: str
+        :raises CircuitOpenError: if the circuit is open"""
+        with self._lock:
+            circuit = self._circuit(family)
+            if circuit.opened_at is None:
+                return
+            now = self.clock()
+            retry_in = circuit.opened_at + self.reset_timeout - now
+            if retry_in > 0:
+                failures = sum(1 for x in circuit.results if not x)
+                raise CircuitOpenError(family, failures, len(circuit.results), retry_in)
+            # let this request through as a probe, others wait for another timeout
+            circuit.opened_at = now
+            circuit.probing = True
+
+    def record(self, family, success):
+        """Record the outcome of a request.
+
+        :param family: endpoint family
+        :type family: str
+        :param success: False if the request failed because of the API, e.g., a server error
+        :type success: bool"""
+        with self._lock:
+            circuit = self._circuit(family)
+            if circuit.opened_at is not None:
+                # only the outcome of the probe counts while the circuit is open
+                if circuit.probing:
+                    circuit.probing = False
+                    if success:
+                        circuit.results.clear()
+                        circuit.opened_at = None
+                    else:
+                        circuit.opened_at = self.clock()
+                return
+
+            circuit.results.append(success)
+            failures = sum(1 for x in circuit.results if not x)
+            if len(circuit.results) >= self.min_requests and failures >= self.threshold * len(circuit.results):
+                circuit.opened_at = self.clock()
@@ -1,13 +1,28 @@
 #!/usr/bin/env python3
 
+import collections
 import sys
+import time
 
 import click
 
 from . import __version__
 from . import api as PorkbunAPI
+from . import budget
+from . import engine
+from . import history
+from . import log
+from . import profiling
+from . import ratelimit
+from . import report
+from . import state
+from . import templates
+from . import transport
 from . import utils
 
+_event_log = engine.event_log
+_log_if_level = engine.log_if_level
+
 
 def _print_version(ctx, param, value):
     if not value or ctx.resilient_parsing:
@@ -16,121 +31,234 @@ def _print_version(ctx, param, value):
     ctx.exit(0)
 
 
-def _log_if_level(level, verbosity, message, file=None, nl=True):
-    if verbosity >= level:
-        click.echo(message, file=file, nl=nl)
+class _DefaultGroup(click.Group):
+    """Command group that runs the default command unless a subcommand is named,
+    so that ``porkbun-api-cli CONFIG_FILE`` keeps working."""
 
+    default_command = "sync"
 
-def _collect_existing_dns_records(api, domain_names, verbose):
-    result = {}
-    for domain_name in domain_names:
-        _log_if_level(0, verbose, f"- querying records for '{domain_name}' .. ", nl=False)
+    def parse_args(self, ctx, args):
+        if not args or (args[0] not in self.commands and args[0] not in ctx.help_option_names + ["-V", "--version"]):
+            args = [self.default_command, *args]
+        return super().parse_args(ctx, args)
+
+
+class _PendingValue:
+    """Template variable whose value is still being retrieved, e.g., the IP address reported
+    by the API. Rendering it waits for the value, so only records using it wait."""
+
+    def __init__(self, future):
+        self._future = future
+
+    def __str__(self):
+        return str(self._future.result())
+
+
+def _discover_domains(api, verbose, domain_entries, defaults, jobs):
+    """Extend configured domain entries with all other domains in the account, applying defaults to them."""
+    configured = {entry["name"] for entry in domain_entries}
+    discovered = [entry["domain"] for entry in api.list_all_domains(jobs) if entry["domain"] not in configured]
+    _log_if_level(
+        1,
+        verbose,
+        "found {count} domains in the account not included in current configuration",
+        count=len(discovered),
+    )
+    return [*domain_entries, *({**defaults, "name": name} for name in discovered)]
 
-        try:
-            existing_records = api.list_dns_records(domain_name)
-        except RuntimeError as e:
-            existing_records = None
-            _log_if_level(0, verbose, "failed")
-            _log_if_level(0, verbose, f"Querying records for '{domain_name}' failed: {str(e)}", file=sys.stderr)
-        else:
-            _log_if_level(0, verbose, "done")
 
-        result[domain_name] = existing_records
+def _create_api(config, verbose, record=None, replay=None, replay_latency=None):
+    """Create an API client for the configuration, optionally recording its requests to or
+    replaying them from a cassette. The client is closed when the command finishes."""
+    try:
+        api = PorkbunAPI.PorkbunAPI(**config["api"])
+        if replay is not None:
+            api.transport = transport.ReplayTransport(replay, latency=replay_latency)
+        elif record is not None:
+            api.transport = transport.RecordingTransport(api.transport, record)
+    except (ImportError, OSError, ValueError) as e:
+        _log_if_level(0, verbose, "failed to set up Porkbun API client: {error}", error=e)
+        sys.exit(1)
+    click.get_current_context().call_on_close(api.close)
+    return api
 
-    return result
 
+def _write_profile_report(profiler):
+    # report follows all buffered log events
+    _event_log.flush()
+    profiler.report(sys.stderr)
 
-def _plan_operations(mode, verbose, existing_domains, config_domains):
-    all_domain_names = sorted({*existing_domains.keys(), *config_domains.keys()})
 
-    _log_if_level(1, verbose, "\n\tPROCESSING EXISTING RECORDS\n")
-    planned_operations = {}
-    for domain_name in all_domain_names:
-        existing_dns_records = existing_domains.get(domain_name, None)
-        config_dns_records = config_domains.get(domain_name, None)
+def _parse_replay_latency(ctx, param, value):
+    if value is None or value in ["none", "recorded"]:
+        return None if value == "none" else value
+    try:
+        return float(value)
+    except ValueError:
+        raise click.BadParameter("expected 'none', 'recorded' or a number of seconds") from None
 
-        if existing_dns_records is None:
-            _log_if_level(0, verbose, f"skipping '{domain_name}': querying existing records failed")
-            planned_operations[domain_name] = None
+
+def _log_estimate(verbose, estimate, jobs):
+    if not estimate.calls:
+        return
+    if estimate.duration is None:
+        _log_if_level(0, verbose, "estimated {calls} API calls, no latency history yet", calls=estimate.calls)
+        return
+    _log_if_level(
+        0,
+        verbose,
+        "estimated {calls} API calls taking {duration} with {jobs} concurrent requests, throttling risk {risk}",
+        calls=estimate.calls,
+        duration=history.format_duration(estimate.duration),
+        jobs=jobs,
+        risk=estimate.risk,
+    )
+    if estimate.failures >= 1:
+        _log_if_level(
+            0,
+            verbose,
+            "about {failures:.0f} of them may fail judging by errors of previous runs",
+            failures=estimate.failures,
+        )
+
+
+def _update_zone_state(zone_state, zone_fingerprints, desired_fingerprints, operations_plan):
+    for domain_name, operations in operations_plan.items():
+        zone = zone_fingerprints.get(domain_name)
+        if operations is None or zone is None or domain_name not in desired_fingerprints:
             continue
-        if config_dns_records is None:
-            _log_if_level(1, verbose, f"skipping '{domain_name}': not included in current configuration")
-            planned_operations[domain_name] = None
+        if operations:
+            zone_state.discard(domain_name)
+        else:
+            zone_state.update(domain_name, zone, desired_fingerprints[domain_name])
+    zone_state.save()
+
+
+def _lock_domains(domain_locks, verbose, domain_entries, wait):
+    """Lock domains in name order, so that runs waiting for each other's domains cannot deadlock,
+    skipping those still locked by other runs once ``wait`` seconds in total have passed.
+
+    Returns the entries of locked domains."""
+    from . import locks
+
+    end = time.monotonic() + wait
+    locked = set()
+    for domain_name in sorted({entry["name"] for entry in domain_entries}):
+        try:
+            domain_locks.acquire(domain_name, timeout=max(0.0, end - time.monotonic()))
+        except locks.DomainLocked as e:
+            _log_if_level(0, verbose, "{error}, skipping it", error=e)
+            continue
+        except (OSError, ValueError) as e:
+            _log_if_level(0, verbose, "locking domain '{domain}' failed: {error}", domain=domain_name, error=e)
+            sys.exit(1)
+        locked.add(domain_name)
+    _log_if_level(2, verbose, "locked {count} domains in {path}", count=len(locked), path=domain_locks.lock_dir)
+    return [entry for entry in domain_entries if entry["name"] in locked]
+
+
+def _verify_propagation(api, verbose, results, timeout):
+    """Query the authoritative nameservers of changed domains until they serve the records created
+    or updated by applied operations, see :func:`porkbun_api_cli.propagation.verify_records`, and
+    log how long it took for every record."""
+    # asyncio is only imported if verification is requested
+    from . import propagation
+
+    _log_if_level(1, verbose, "\n\tVERIFICATION\n")
+    changes = []
+    for domain_name, operation, status, _ in results:
+        if status != "applied" or operation["operation"] not in ["create", "update"]:
+            continue
+        record = operation["new"]
+        if record["type"] not in propagation.TYPES:
+            _log_if_level(
+                1,
+                verbose,
+                "\t{type}-record '{name}' cannot be verified",
+                type=record["type"],
+                name=utils.get_record_fqdn(domain_name, record),
+            )
             continue
+        changes.append((domain_name, record))
 
-        operations = []
-        processed = []
-        for record in config_dns_records:
-            existing = filter(lambda x: utils.compare_record_by_name_type(domain_name, record, x), existing_dns_records)
-            existing_found = False
-            for entry in existing:
-                existing_found = True
-                processed.append(entry)
-                if utils.compare_record_by_content_ttl_prio(record, entry):
-                    _log_if_level(
-                        3,
-                        verbose,
-                        f"\t- found matching {record['type']}-record '{record['name']}.{domain_name}'",
-                    )
-                elif utils.operation_allowed_by_mode("update", mode):
-                    _log_if_level(
-                        2,
-                        verbose,
-                        f"\t- update {record['type']}-record '{record['name']}.{domain_name}'",
-                    )
-                    operations.append({"operation": "update", "new": record, "existing": entry})
-            if not existing_found and utils.operation_allowed_by_mode("create", mode):
-                _log_if_level(2, verbose, f"\t- create {record['type']}-record '{record['name']}.{domain_name}'")
-                operations.append({"operation": "create", "new": record, "existing": None})
-
-        # check if additional exntries should be removed
-        if utils.operation_allowed_by_mode("delete", mode):
-            for record in existing_dns_records:
-                if record not in processed:
-                    _log_if_level(2, verbose, f"\t- delete {record['type']}-record '{record['name']}'")
-                    operations.append({"operation": "delete", "new": None, "existing": record})
-
-        planned_operations[domain_name] = operations
-
-    return planned_operations
-
-
-def _execute_operations_plan(api, verbose, operations_plan):
-    _log_if_level(1, verbose, "\n\tEXECUTION\n")
-    for domain_name, operations in operations_plan.items():
-        _log_if_level(1, verbose, f"- altering domain '{domain_name}'")
-        for operation in operations:
-            op = operation["operation"]
-            if op not in ["create", "update", "delete"]:
-                _log_if_level(0, verbose, f"unknown operation '{op}'")
-                continue
+    nameservers = {}
+    for domain_name in dict.fromkeys(x for x, _ in changes):
+        try:
+            nameservers[domain_name] = api.get_nameservers(domain_name)
+        except RuntimeError as e:
+            _log_if_level(
+                0, verbose, "querying nameservers of domain '{domain}' failed: {error}", domain=domain_name, error=e
+            )
+            continue
+        if not nameservers[domain_name]:
+            _log_if_level(0, verbose, "domain '{domain}' has no nameservers", domain=domain_name)
+    changes = [x for x in changes if nameservers.get(x[0])]
+    if not changes:
+        _log_if_level(1, verbose, "no changed records to verify")
+        return
+
+    _log_if_level(
+        1,
+        verbose,
+        "waiting up to {timeout:g} s for {count} records to be served by {nameservers} nameservers",
+        timeout=timeout,
+        count=len(changes),
+        nameservers=len({x for domain_name, _ in changes for x in nameservers[domain_name]}),
+    )
+    # nothing is logged while waiting
+    _event_log.flush()
+    propagated = propagation.verify(changes, nameservers, timeout)
+
+    for result in propagated:
+        name = utils.get_record_fqdn(result.domain, result.record)
+        if result.live:
+            _log_if_level(
+                1,
+                verbose,
+                "\t{type}-record '{name}' live after {latency:.1f} s",
+                type=result.record["type"],
+                name=name,
+                latency=result.latency,
+            )
+        else:
+            _log_if_level(
+                0,
+                verbose,
+                "\t{type}-record '{name}' not live after {timeout:g} s on: {pending}",
+                type=result.record["type"],
+                name=name,
+                timeout=timeout,
+                pending=", ".join(f"{x} ({result.errors[x]})" if x in result.errors else x for x in result.pending),
+            )
+    _log_if_level(
+        1,
+        verbose,
+        "{live} of {count} records live on all nameservers",
+        live=sum(1 for x in propagated if x.live),
+        count=len(propagated),
+    )
+
+
+_version_option = click.option(
+    "-V",
+    "--version",
+    is_flag=True,
+    help="Print tool version and exit",
+    callback=_print_version,
+    expose_value=False,
+    is_eager=True,
+)
 
-            if op in ["create", "update"]:
-                record = operation["new"]
-                if len(record["name"]):
-                    name = f"{record['name']}.{domain_name}"
-                else:
-                    name = domain_name
-            elif op == "delete":
-                record = operation["existing"]
-                name = record["name"]
-            _log_if_level(1, verbose, f"\t{op} {record['type']}-record '{name}' ... ", nl=False)
 
-            try:
-                if op == "create":
-                    api.create_record(domain_name, record)
-                elif op == "update":
-                    api.update_record(domain_name, operation["existing"]["id"], record)
-                elif op == "delete":
-                    _log_if_level(0, verbose, f"{op} operation is not implemented - skipped")
-            except RuntimeError as e:
-                _log_if_level(0, verbose, f"querying Porkbun API for domain '{domain_name}' failed: {str(e)}")
-            else:
-                if op != "delete":
-                    _log_if_level(1, verbose, "done")
+@click.group(cls=_DefaultGroup)
+@_version_option
+def main():
+    """CLI client for managing domains with Porkbun through API calls.
 
+    Runs the sync command unless another command is given."""
 
-@click.command()
+
+@main.command("sync")
 @click.argument("config_file", type=click.Path(exists=True))
 @click.option(
     "-m",
@@ -146,19 +274,140 @@ def _execute_operations_plan(api, verbose, operations_plan):
     default="append",
 )
 @click.option("-n", "--dry-run", is_flag=True, help="Perform a trial run without any changes made")
+@_version_option
+@click.option("-v", "--verbose", count=True, help="Output verbosity")
 @click.option(
-    "-V",
-    "--version",
+    "--log-format",
+    type=click.Choice(log.EventLog.FORMATS),
+    default="text",
+    help="Output log messages as plain text or as JSON lines",
+)
+@click.option(
+    "-o",
+    "--output",
+    type=click.Choice(["text", *report.PlanWriter.FORMATS]),
+    default="text",
+    help="Stream planned operations to standard output as JSON or NDJSON, log messages go to standard error",
+)
+@click.option(
+    "--state-dir",
+    type=click.Path(file_okay=False),
+    envvar="PORKBUN_API_CLI_STATE_DIR",
+    help="Keep fingerprints of zones in sync with the configuration to skip planning for them on the next run "
+    "and latencies of API requests to estimate plans",
+)
+@click.option(
+    "--targeted-lookups",
+    type=click.IntRange(min=0),
+    default=3,
+    show_default=True,
+    help="Retrieve records by name and type for domains configuring at most this many of them, 0 disables",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of concurrent API requests, chosen from the latency history kept in --state-dir if not given, "
+    "otherwise 1",
+)
+@click.option(
+    "--all-domains",
+    type=click.Choice(["apply", "drift"]),
+    help="Also process all other domains in the account using the 'defaults' record set, which configuration must have: "
+    "apply it or only report drift from it without making any changes",
+)
+@click.option(
+    "--record",
+    type=click.Path(dir_okay=False),
+    help="Record API requests and responses to a cassette file, credentials are left out",
+)
+@click.option(
+    "--replay",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Serve API responses from a cassette file instead of the network",
+)
+@click.option(
+    "--replay-latency",
+    default="none",
+    show_default=True,
+    callback=_parse_replay_latency,
+    help="Delay replayed responses: 'none', 'recorded' or a number of seconds",
+)
+@click.option(
+    "--profile",
+    type=click.Path(dir_okay=False),
+    help="Profile CPU time and memory of every phase, write the CPU profile to this pstats file "
+    "and a summary to standard error",
+)
+@click.option(
+    "--profile-top",
+    type=click.IntRange(min=1),
+    default=10,
+    show_default=True,
+    help="Number of hot functions and allocation sites reported per phase",
+)
+@click.option(
+    "--deadline",
+    type=click.FloatRange(min=0, min_open=True),
+    default=None,
+    metavar="SECONDS",
+    help="Time budget of the run, no further requests are made once it is used up",
+)
+@click.option(
+    "--lock-dir",
+    type=click.Path(file_okay=False),
+    envvar="PORKBUN_API_CLI_LOCK_DIR",
+    help="Lock domains with lock files in this directory shared by concurrent runs, so that runs on other "
+    "domains can proceed in parallel",
+)
+@click.option(
+    "--lock-wait",
+    type=click.FloatRange(min=0),
+    default=0.0,
+    show_default=True,
+    metavar="SECONDS",
+    help="Time to wait for domains locked by other runs before skipping them",
+)
+@click.option(
+    "--verify",
     is_flag=True,
-    help="Print tool version and exit",
-    callback=_print_version,
-    expose_value=False,
-    is_eager=True,
+    help="Query the authoritative nameservers of changed domains until they serve the changed records "
+    "and report how long it took for every record",
+)
+@click.option(
+    "--verify-timeout",
+    type=click.FloatRange(min=0, min_open=True),
+    default=120.0,
+    show_default=True,
+    metavar="SECONDS",
+    help="Time to wait for changed records to be served by all nameservers, limited by --deadline",
 )
-@click.option("-v", "--verbose", count=True, help="Output verbosity")
 @click.argument("arguments", nargs=-1)
-def main(config_file, mode, dry_run, verbose, arguments):
-    """CLI client for managing domains with Porkbun through API calls.
+def sync_command(
+    config_file,
+    mode,
+    dry_run,
+    verbose,
+    log_format,
+    output,
+    state_dir,
+    targeted_lookups,
+    jobs,
+    all_domains,
+    record,
+    replay,
+    replay_latency,
+    profile,
+    profile_top,
+    deadline,
+    lock_dir,
+    lock_wait,
+    verify,
+    verify_timeout,
+    arguments,
+):
+    """Synchronize DNS records with configuration.
 
     It can create, edit and list DNS records following a configuration
     provided in a YAML file. The client is flexible and can restrict
@@ -174,47 +423,384 @@ def main(config_file, mode, dry_run, verbose, arguments):
                  entries that are not listed in the configuration
     """  # noqa: E501, B950
 
+    if record is not None and replay is not None:
+        raise click.UsageError("--record and --replay are mutually exclusive")
+
+    # the budget counts from the start of the run
+    run_deadline = None if deadline is None else budget.Deadline(deadline)
+
+    # log settings of an earlier command in the same process do not carry over, buffered
+    # log events are written out when the command finishes, including sys.exit
+    _event_log.reset(fmt=log_format, stream="stdout" if output == "text" else "stderr")
+    click.get_current_context().call_on_close(_event_log.flush)
+
+    profiler = profiling.Profiler(profile, top=profile_top)
+    if profiler.enabled:
+        click.get_current_context().call_on_close(lambda: _write_profile_report(profiler))
+
     # load configuration
-    try:
-        config = utils.load_config(config_file)
-    except Exception as e:
-        click.echo(f"failed to load configuration from {config_file}: " + str(e))
+    with profiler.phase("load_config"):
+        warnings = []
+        try:
+            config = utils.load_config(config_file, warnings)
+        except Exception as e:
+            _log_if_level(0, verbose, "failed to load configuration from {path}: {error}", path=config_file, error=e)
+            sys.exit(1)
+        for warning in warnings:
+            _log_if_level(1, verbose, "warning: {warning}", warning=warning)
+
+    # other domains would be planned without any records, i.e., emptied in replace mode
+    if all_domains is not None and config.get("defaults") is None:
+        _log_if_level(0, verbose, "--all-domains requires a 'defaults' section in {path}", path=config_file)
         sys.exit(1)
 
-    api = PorkbunAPI.PorkbunAPI(**config["api"])
+    api = _create_api(config, verbose, record=record, replay=replay, replay_latency=replay_latency)
+    api.deadline = run_deadline
+
+    zone_state = None
+    latency_history = None
+    if state_dir is not None:
+        zone_state = state.ZoneState(state_dir)
+        api.fingerprint_zones = True
+        latency_history = history.LatencyHistory(state_dir)
+        api.observer = latency_history.observe
+        click.get_current_context().call_on_close(latency_history.save)
+        if jobs is None:
+            jobs = latency_history.suggest_jobs()
+            _log_if_level(1, verbose, "{jobs} concurrent API requests chosen from latency history", jobs=jobs)
+    if jobs is None:
+        jobs = 1
+
+    if all_domains == "drift":
+        dry_run = True
 
     if dry_run:
-        click.echo("dry run requested, enable verbose output")
+        _log_if_level(0, verbose, "dry run requested, enable verbose output")
         verbose = max(2, verbose)
 
-    # test API config
-    try:
-        ip = api.get_my_ip()
-        _log_if_level(1, verbose, f"IP address reported by API '{ip}'")
-    except RuntimeError as e:
-        _log_if_level(0, verbose, f"querying Porkbun API failed: {str(e)}")
-        sys.exit(1)
+    from concurrent.futures import ThreadPoolExecutor
 
-    # extract domain domain names
-    domain_names = [entry["name"] for entry in config["domains"]]
+    with profiler.phase("collect"), ThreadPoolExecutor(max_workers=1) as startup:
+        # the credentials are checked while the first zones are retrieved
+        ping = startup.submit(api.get_my_ip)
 
-    existing_domains = _collect_existing_dns_records(api, domain_names, verbose)
-    config_domains = {x["name"]: x["records"] for x in config["domains"]}
+        verified = []
 
-    operations_plan = _plan_operations(mode, verbose, existing_domains, config_domains)
+        def verify_credentials():
+            if verified:
+                return
+            try:
+                ip = ping.result()
+            except RuntimeError as e:
+                _log_if_level(0, verbose, "querying Porkbun API failed: {error}", error=e)
+                sys.exit(1)
+            _log_if_level(1, verbose, "IP address reported by API '{ip}'", ip=ip)
+            verified.append(ip)
+
+        domain_entries = config["domains"]
+        if all_domains is not None:
+            try:
+                domain_entries = _discover_domains(api, verbose, domain_entries, config.get("defaults"), jobs)
+            except RuntimeError as e:
+                # invalid credentials are the more likely cause
+                verify_credentials()
+                _log_if_level(0, verbose, "listing domains failed: {error}", error=e)
+                sys.exit(1)
+
+        # dry runs make no changes that could race with other runs
+        domain_locks = None
+        if lock_dir is not None and not dry_run:
+            from . import locks
+
+            domain_locks = locks.DomainLocks(lock_dir)
+            click.get_current_context().call_on_close(domain_locks.release_all)
+            domain_entries = _lock_domains(domain_locks, verbose, domain_entries, lock_wait)
+
+        # extract domain domain names
+        domain_names = [entry["name"] for entry in domain_entries]
+
+        config_domains = templates.ConfigDomains(
+            domain_entries, config.get("templates"), {**(config.get("vars") or {}), "ip": _PendingValue(ping)}
+        )
+
+        name_types = engine.select_targeted_lookups(mode, config_domains, targeted_lookups)
+        existing_domains = engine.collect_existing_dns_records(
+            api, domain_names, verbose, name_types=name_types, jobs=jobs, verify=verify_credentials
+        )
+        # nothing to do if verified while collecting
+        verify_credentials()
+
+    with profiler.phase("plan"):
+        unchanged_domains = set()
+        if zone_state is not None:
+            desired_fingerprints = {
+                name: utils.fingerprint_records(records, mode) for name, records in config_domains.items()
+            }
+            unchanged_domains = {
+                name
+                for name, desired in desired_fingerprints.items()
+                if zone_state.unchanged(name, api.zone_fingerprints.get(name), desired)
+            }
+
+        # planned operations are not kept in memory if they are only streamed out
+        plan_writer = None if output == "text" else report.PlanWriter(output)
+        operations_plan = engine.plan_operations(
+            mode,
+            verbose,
+            existing_domains,
+            config_domains,
+            plan_writer=plan_writer,
+            keep=plan_writer is None or not dry_run,
+            unchanged_domains=unchanged_domains,
+        )
+
+        if zone_state is not None and operations_plan is not None:
+            _update_zone_state(zone_state, api.zone_fingerprints, desired_fingerprints, operations_plan)
+
+    if latency_history is not None and operations_plan is not None:
+        rate_limit = None if api.rate_limiter is None else api.rate_limiter.rate
+        _log_estimate(verbose, latency_history.estimate(operations_plan, jobs, rate_limit), jobs)
 
     if dry_run:
-        click.echo("dry run requested, skipping execution")
+        _log_if_level(0, verbose, "dry run requested, skipping execution")
         sys.exit(0)
     else:
-        click.echo("Would you like to proceed? [yN]: ", nl=False)
+        _event_log.flush()
+        click.echo("Would you like to proceed? [yN]: ", nl=False, err=plan_writer is not None)
         confirm = click.getchar()
-        click.echo()
+        click.echo(err=plan_writer is not None)
         if confirm.lower() != 'y':
             _log_if_level(0, verbose, "Operation aborted.", file=sys.stderr)
             sys.exit(0)
 
-    _execute_operations_plan(api, verbose, operations_plan)
+    if run_deadline is not None and run_deadline.expired:
+        _log_if_level(0, verbose, "deadline of {deadline:g} s exceeded, skipping execution", deadline=deadline)
+        sys.exit(1)
+
+    if domain_locks is not None:
+        for domain_name in sorted(domain_locks.lost):
+            _log_if_level(
+                0, verbose, "lock of domain '{domain}' was taken over, skipping its operations", domain=domain_name
+            )
+            operations_plan.pop(domain_name, None)
+
+    with profiler.phase("execute"):
+        priorities = {entry["name"]: entry["priority"] for entry in domain_entries if entry.get("priority")}
+        results = engine.execute_operations_plan(
+            api, verbose, operations_plan, jobs=jobs, priorities=priorities, deadline=run_deadline
+        )
+
+    if verify:
+        if run_deadline is not None:
+            verify_timeout = min(verify_timeout, run_deadline.remaining())
+        if verify_timeout <= 0:
+            _log_if_level(0, verbose, "deadline of {deadline:g} s exceeded, skipping verification", deadline=deadline)
+            sys.exit(1)
+        with profiler.phase("verify"):
+            _verify_propagation(api, verbose, results, verify_timeout)
+
+
+def _iter_exported_domains(api, verbose, domain_names, jobs):
+    """Retrieve zones concurrently and yield them as configuration domain entries in order. At most
+    ``2 * jobs`` zones are retrieved ahead of the one being yielded, so memory use does not grow with
+    the number of domains."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending = collections.deque()
+        names = iter(domain_names)
+        while True:
+            for domain_name in names:
+                pending.append((domain_name, executor.submit(api.list_dns_records, domain_name)))
+                if len(pending) >= 2 * jobs:
+                    break
+            if not pending:
+                return
+
+            domain_name, future = pending.popleft()
+            try:
+                entry = utils.export_domain_entry(domain_name, future.result())
+            except (RuntimeError, ValueError) as e:
+                _log_if_level(
+                    0, verbose, "exporting records of '{domain}' failed: {error}", domain=domain_name, error=e
+                )
+                continue
+            _log_if_level(
+                1, verbose, "- exported {count} records of '{domain}'", count=len(entry["records"]), domain=domain_name
+            )
+            yield entry
+
+
+# written to exported configuration instead of the API credentials unless they are included explicitly
+_CREDENTIAL_PLACEHOLDERS = {"apikey": "<your API key>", "secretapikey": "<your secret API key>"}
+
+
+def _write_exported_config(output, api_config, entries):
+    import yaml
+
+    dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+    output.write(yaml.dump({"api": api_config}, Dumper=dumper, sort_keys=False, default_flow_style=False))
+    output.write("domains:\n")
+    output.flush()
+    # every domain is written out as soon as it was retrieved
+    for entry in entries:
+        output.write(yaml.dump([entry], Dumper=dumper, sort_keys=False, default_flow_style=False))
+        output.flush()
+
+
+@main.command("export")
+@click.argument("config_file", type=click.Path(exists=True))
+@click.argument("domains", nargs=-1)
+@click.option(
+    "-o",
+    "--output",
+    type=click.File("w", encoding="utf-8", lazy=True),
+    default="-",
+    help="Write configuration to a file instead of standard output",
+)
+@click.option("-v", "--verbose", count=True, help="Output verbosity")
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="Number of concurrent API requests",
+)
+@click.option(
+    "--include-credentials",
+    is_flag=True,
+    help="Write the API keys of CONFIG_FILE instead of placeholders",
+)
+def export_command(config_file, domains, output, verbose, jobs, include_credentials):
+    """Export existing DNS records as configuration.
+
+    Records of DOMAINS, or of all domains in the account if none are given,
+    are written out in the configuration format along with the 'api' section
+    of CONFIG_FILE, its API keys replaced by placeholders unless
+    --include-credentials is given. Syncing the exported configuration plans
+    no operations."""
+
+    # configuration goes to standard output, log messages to standard error
+    _event_log.reset(stream="stderr")
+    click.get_current_context().call_on_close(_event_log.flush)
+
+    try:
+        config = utils.load_config(config_file)
+    except Exception as e:
+        _log_if_level(0, verbose, "failed to load configuration from {path}: {error}", path=config_file, error=e)
+        sys.exit(1)
+
+    api = _create_api(config, verbose)
+
+    domain_names = list(domains)
+    if not domain_names:
+        try:
+            domain_names = [entry["domain"] for entry in api.list_all_domains(jobs)]
+        except RuntimeError as e:
+            _log_if_level(0, verbose, "listing domains failed: {error}", error=e)
+            sys.exit(1)
+
+    api_config = config["api"] if include_credentials else {**config["api"], **_CREDENTIAL_PLACEHOLDERS}
+    _write_exported_config(output, api_config, _iter_exported_domains(api, verbose, domain_names, jobs))
+
+
+@main.command("serve")
+@click.argument("config_file", type=click.Path(exists=True))
+@click.option(
+    "-p",
+    "--port",
+    type=click.IntRange(min=0, max=65535),
+    default=8053,
+    show_default=True,
+    help="Port of localhost to listen on",
+)
+@click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False),
+    help="Listen on a Unix socket instead of a port",
+)
+@click.option("-v", "--verbose", count=True, help="Output verbosity")
+@click.option(
+    "--log-format",
+    type=click.Choice(log.EventLog.FORMATS),
+    default="text",
+    help="Output log messages as plain text or as JSON lines",
+)
+def serve_command(config_file, port, socket_path, verbose, log_format):
+    """Serve record changes requested by local agents.
+
+    Agents send 'POST /records' with a JSON object with 'domain', 'name', 'type',
+    'content' and optionally 'ttl' and 'prio' fields, authenticated by a token of a
+    client from the 'server' section of CONFIG_FILE as 'Authorization: Bearer TOKEN'.
+    A record of the same name and type is updated, otherwise one is created.
+
+    All changes go through a single API client keeping its connections open, sharing
+    cached zones and limiting the rate of API requests. Changes of a record requested
+    in quick succession are coalesced, only the latest one is made."""
+    # the HTTP server is only needed by this command
+    from . import server
+
+    _event_log.reset(fmt=log_format)
+    click.get_current_context().call_on_close(_event_log.flush)
+
+    try:
+        config = utils.load_config(config_file)
+        clients = server.load_clients(config)
+    except Exception as e:
+        _log_if_level(0, verbose, "failed to load configuration from {path}: {error}", path=config_file, error=e)
+        sys.exit(1)
+
+    api = _create_api(config, verbose)
+    if isinstance(api.transport, transport.RequestsTransport):
+        # a connection per concurrently served request is kept open
+        api.transport = transport.RequestsTransport(pool_size=server.POOL_SIZE)
+    rate = config["server"].get("rate_limit", 5)
+    api.rate_limiter = ratelimit.TokenBucket(rate, burst=max(1, int(rate)))
+    cache = server.ZoneCache(api, max_age=config["server"].get("cache_ttl", 300.0))
+
+    def log_request(client, domain_name, record, outcome):
+        name = utils.get_record_fqdn(domain_name, record)
+        if isinstance(outcome, Exception):
+            _log_if_level(
+                0,
+                verbose,
+                "{client}: setting {type}-record '{name}' failed: {error}",
+                client=client,
+                type=record["type"],
+                name=name,
+                error=outcome,
+            )
+        else:
+            _log_if_level(
+                1,
+                verbose,
+                "{client}: {type}-record '{name}' ... {operation}",
+                client=client,
+                type=record["type"],
+                name=name,
+                operation=outcome,
+            )
+        # the server runs until it is stopped, events are not held back
+        _event_log.flush()
+
+    service = server.RecordService(cache, clients, log=log_request, window=config["server"].get("coalesce_window", 0.0))
+    try:
+        record_server = server.create_server(service, port=port, socket_path=socket_path)
+    except OSError as e:
+        _log_if_level(0, verbose, "failed to listen: {error}", error=e)
+        sys.exit(1)
+
+    address = socket_path if socket_path is not None else f"http://127.0.0.1:{record_server.server_port}/"
+    _log_if_level(0, verbose, "serving {count} clients on {address}", count=len(clients), address=address)
+    _event_log.flush()
+    try:
+        record_server.serve_forever()
+    except KeyboardInterrupt:
+        _log_if_level(0, verbose, "stopped")
+    finally:
+        record_server.server_close()
 
 
 if __name__ == "__main__":
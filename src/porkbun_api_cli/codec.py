@@ -0,0 +1,67 @@
+import json
+
+# use a faster JSON library when it is installed, both produce compact UTF-8 encoded output
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on installed packages
+    orjson = None
+
+if orjson is not None:
+    NAME = "orjson"
+
+    def dumps(obj):
+        """Encode an object as compact JSON.
+
+        :param obj: object to encode
+        :type obj: any
+        :returns: UTF-8 encoded JSON
+        :rtype: bytes"""
+        return orjson.dumps(obj)
+
+    def loads(data):
+        """Decode JSON.
+
+        :param data: UTF-8 encoded JSON
+        :type data: bytes or str
+        :returns: decoded object
+        :rtype: any"""
+        return orjson.loads(data)
+
+else:  # pragma: no cover - depends on installed packages
+    NAME = "json"
+
+    def dumps(obj):
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+    def loads(data):
+        return json.loads(data)
+
+
+def encode_envelope(fields):
+    """Pre-encode constant fields of a JSON object, e.g., API credentials, to splice them
+    into request bodies later on with :func:`encode_with_envelope`.
+
+    >>> encode_with_envelope(encode_envelope({"apikey": "key"}), {"name": "www"})
+    b'{"apikey":"key","name":"www"}'
+
+    :param fields: constant fields
+    :type fields: dict
+    :returns: encoded fields without the closing brace
+    :rtype: bytes"""
+    return dumps(fields)[:-1]
+
+
+def encode_with_envelope(envelope, payload=None):
+    """Encode a JSON object consisting of pre-encoded envelope fields and a payload.
+    Payload fields must not repeat envelope fields.
+
+    :param envelope: fields encoded with :func:`encode_envelope`
+    :type envelope: bytes
+    :param payload: additional fields
+    :type payload: dict
+    :returns: UTF-8 encoded JSON
+    :rtype: bytes"""
+    if not payload:
+        return envelope + b"}"
+    separator = b"," if len(envelope) > 1 else b""
+    return envelope + separator + dumps(payload)[1:]
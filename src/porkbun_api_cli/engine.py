@@ -0,0 +1,460 @@
+import collections
+import sys
+from collections.abc import Mapping
+
+from . import budget
+from . import circuit
+from . import log
+from . import scheduler
+from . import utils
+
+# events of the running command, shared by the CLI and the in-process API
+event_log = log.EventLog()
+
+
+def log_if_level(level, verbosity, message, file=None, nl=True, **fields):
+    if verbosity >= level:
+        event_log.emit(level, message, file=file, nl=nl, **fields)
+
+
+class _TargetedLookups(Mapping):
+    """Subdomain name and type pairs by domain name for domains whose records are retrieved
+    by name and type. Domains are selected on first access, so that the records of a domain
+    are expanded while the zones of earlier domains are being retrieved."""
+
+    def __init__(self, config_domains, threshold):
+        self._config_domains = config_domains
+        self._threshold = threshold
+        self._selected = {}
+
+    def _select(self, domain_name):
+        if domain_name not in self._selected:
+            name_types = sorted({(record["name"], record["type"]) for record in self._config_domains[domain_name]})
+            self._selected[domain_name] = name_types if len(name_types) <= self._threshold else None
+        return self._selected[domain_name]
+
+    def __getitem__(self, domain_name):
+        if domain_name not in self._config_domains or self._select(domain_name) is None:
+            raise KeyError(domain_name)
+        return self._selected[domain_name]
+
+    def __iter__(self):
+        return (x for x in self._config_domains if self._select(x) is not None)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+def select_targeted_lookups(mode, config_domains, threshold):
+    """Select domains whose configuration touches at most ``threshold`` subdomain name and type pairs.
+    Records of such domains are retrieved by name and type instead of the whole zone. Modes that may
+    delete records always need the whole zone."""
+    if threshold <= 0 or utils.operation_allowed_by_mode("delete", mode):
+        return {}
+    return _TargetedLookups(config_domains, threshold)
+
+
+def _retrieve_dns_records(api, domain_name, name_types):
+    if domain_name in name_types:
+        return api.list_dns_records(domain_name, name_types[domain_name])
+    return list(api.iter_dns_records(domain_name))
+
+
+def _log_retrieval_failure(verbose, domain_name, error):
+    log_if_level(
+        0,
+        verbose,
+        "Querying records for '{domain}' failed: {error}",
+        file=sys.stderr,
+        domain=domain_name,
+        error=error,
+    )
+
+
+def collect_existing_dns_records(api, domain_names, verbose, name_types=None, jobs=1, verify=None, errors=None):
+    """Retrieve existing records of domains, None for domains whose records could not be retrieved.
+    Their errors are added to ``errors`` by domain name if given.
+
+    ``verify`` is called once before any result is reported, e.g., to wait for the credentials
+    check running concurrently with the first retrievals. It may exit, results retrieved until
+    then are thrown away."""
+    if name_types is None:
+        name_types = {}
+    if errors is None:
+        errors = {}
+    if jobs > 1:
+        return _collect_existing_dns_records_concurrently(api, domain_names, verbose, name_types, jobs, verify, errors)
+
+    result = {}
+    if verify is not None:
+        if domain_names:
+            # the first zone is retrieved while the credentials are checked
+            domain_name, domain_names = domain_names[0], domain_names[1:]
+            try:
+                result[domain_name] = _retrieve_dns_records(api, domain_name, name_types)
+            except RuntimeError as e:
+                result[domain_name] = None
+                errors[domain_name] = e
+                verify()
+                log_if_level(0, verbose, "- querying records for '{domain}' .. failed", domain=domain_name)
+                _log_retrieval_failure(verbose, domain_name, e)
+            else:
+                verify()
+                log_if_level(0, verbose, "- querying records for '{domain}' .. done", domain=domain_name)
+        else:
+            verify()
+
+    # text output shows the progress of every retrieval, JSON output has one event per domain
+    progressive = event_log.fmt == "text"
+    for domain_name in domain_names:
+        if progressive:
+            log_if_level(0, verbose, "- querying records for '{domain}' .. ", nl=False, domain=domain_name)
+
+        try:
+            existing_records = _retrieve_dns_records(api, domain_name, name_types)
+        except RuntimeError as e:
+            existing_records = None
+            errors[domain_name] = e
+            result_text = "failed"
+        else:
+            result_text = "done"
+        if progressive:
+            log_if_level(0, verbose, result_text)
+        else:
+            log_if_level(
+                0, verbose, "- querying records for '{domain}' .. {result}", domain=domain_name, result=result_text
+            )
+        if existing_records is None:
+            _log_retrieval_failure(verbose, domain_name, errors[domain_name])
+
+        result[domain_name] = existing_records
+
+    return result
+
+
+def _collect_existing_dns_records_concurrently(api, domain_names, verbose, name_types, jobs, verify, errors):
+    from concurrent.futures import ThreadPoolExecutor
+
+    result = {}
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            (domain_name, executor.submit(_retrieve_dns_records, api, domain_name, name_types))
+            for domain_name in domain_names
+        ]
+        if verify is not None:
+            try:
+                verify()
+            except SystemExit:
+                for _, future in futures:
+                    future.cancel()
+                raise
+        # report results in order, requests keep running in the background
+        for domain_name, future in futures:
+            try:
+                existing_records = future.result()
+            except RuntimeError as e:
+                existing_records = None
+                errors[domain_name] = e
+                log_if_level(0, verbose, "- querying records for '{domain}' .. failed", domain=domain_name)
+                _log_retrieval_failure(verbose, domain_name, e)
+            else:
+                log_if_level(0, verbose, "- querying records for '{domain}' .. done", domain=domain_name)
+
+            result[domain_name] = existing_records
+
+    return result
+
+
+def _plan_domain_operations(mode, verbose, domain_name, existing_dns_records, config_dns_records):
+    index = utils.index_records_by_name_type(existing_dns_records)
+    keys = [(utils.get_record_fqdn(domain_name, record), record["type"]) for record in config_dns_records]
+
+    # records sharing name and type, e.g., several MX records, are first matched up
+    # exactly, every remaining record then takes up one of the remaining existing ones
+    matches = {}
+    claimed = set()
+    for i, record in enumerate(config_dns_records):
+        for entry in index.get(keys[i], ()):
+            if id(entry) not in claimed and utils.compare_record_by_content_ttl_prio(record, entry):
+                matches[i] = entry
+                claimed.add(id(entry))
+                break
+
+    for i, record in enumerate(config_dns_records):
+        if i in matches:
+            log_if_level(
+                3,
+                verbose,
+                "\t- found matching {type}-record '{name}.{domain}'",
+                domain=domain_name,
+                type=record["type"],
+                name=record["name"],
+            )
+            continue
+
+        entry = next((x for x in index.get(keys[i], ()) if id(x) not in claimed), None)
+        if entry is not None:
+            claimed.add(id(entry))
+            if utils.operation_allowed_by_mode("update", mode):
+                log_if_level(
+                    2,
+                    verbose,
+                    "\t- update {type}-record '{name}.{domain}'",
+                    domain=domain_name,
+                    type=record["type"],
+                    name=record["name"],
+                )
+                yield {"operation": "update", "new": record, "existing": entry}
+        elif utils.operation_allowed_by_mode("create", mode):
+            log_if_level(
+                2,
+                verbose,
+                "\t- create {type}-record '{name}.{domain}'",
+                domain=domain_name,
+                type=record["type"],
+                name=record["name"],
+            )
+            yield {"operation": "create", "new": record, "existing": None}
+
+    # check if additional exntries should be removed
+    if utils.operation_allowed_by_mode("delete", mode):
+        for record in existing_dns_records:
+            if id(record) not in claimed:
+                log_if_level(
+                    2,
+                    verbose,
+                    "\t- delete {type}-record '{name}'",
+                    domain=domain_name,
+                    type=record["type"],
+                    name=record["name"],
+                )
+                yield {"operation": "delete", "new": None, "existing": record}
+
+
+def _iter_planned_operations(mode, verbose, existing_domains, config_domains, unchanged_domains=()):
+    """Yield domain names along with a generator of planned operations or None for skipped domains.
+    Operations are computed lazily, the generator of each domain has to be exhausted before moving
+    on to the next domain. Domains listed in ``unchanged_domains`` are known to be in sync and get
+    no operations without comparing any records."""
+    all_domain_names = sorted({*existing_domains.keys(), *config_domains.keys()})
+
+    log_if_level(1, verbose, "\n\tPROCESSING EXISTING RECORDS\n")
+    for domain_name in all_domain_names:
+        existing_dns_records = existing_domains.get(domain_name, None)
+        config_dns_records = config_domains.get(domain_name, None)
+
+        if existing_dns_records is None:
+            log_if_level(0, verbose, "skipping '{domain}': querying existing records failed", domain=domain_name)
+            yield domain_name, None
+            continue
+        if config_dns_records is None:
+            log_if_level(1, verbose, "skipping '{domain}': not included in current configuration", domain=domain_name)
+            yield domain_name, None
+            continue
+        if domain_name in unchanged_domains:
+            log_if_level(2, verbose, "\t- no changes in '{domain}' since last run", domain=domain_name)
+            yield domain_name, iter(())
+            continue
+
+        yield domain_name, _plan_domain_operations(mode, verbose, domain_name, existing_dns_records, config_dns_records)
+
+
+def plan_operations(mode, verbose, existing_domains, config_domains, plan_writer=None, keep=True, unchanged_domains=()):
+    plan = _iter_planned_operations(mode, verbose, existing_domains, config_domains, unchanged_domains)
+    if plan_writer is not None:
+        plan = plan_writer.write(plan)
+
+    planned_operations = {}
+    for domain_name, operations in plan:
+        if operations is None:
+            planned_operations[domain_name] = None
+        elif keep:
+            planned_operations[domain_name] = list(operations)
+        else:
+            # only stream planned operations to the writer
+            collections.deque(operations, maxlen=0)
+
+    if plan_writer is not None:
+        plan_writer.close()
+
+    return planned_operations if keep else None
+
+
+def describe_operation(domain_name, operation):
+    if operation["operation"] == "delete":
+        record = operation["existing"]
+        return record, record["name"]
+    record = operation["new"]
+    return record, utils.get_record_fqdn(domain_name, record)
+
+
+def _execute_operation(api, domain_name, operation):
+    op = operation["operation"]
+    if op == "create":
+        api.create_record(domain_name, operation["new"])
+    elif op == "update":
+        api.update_record(domain_name, operation["existing"]["id"], operation["new"])
+
+
+def execute_operations_plan(api, verbose, operations_plan, jobs=1, priorities=None, deadline=None):
+    """Execute planned operations of all domains in an order derived from their dependencies
+    and priority lanes, see :class:`porkbun_api_cli.scheduler.OperationGraph`. With a single job
+    operations run one after another, by lane and in plan order where dependencies allow it,
+    otherwise up to ``jobs`` of them run concurrently and each is reported once it is done.
+    No operations are started once the deadline is exceeded, they are reported at the end.
+
+    Returns domain name, operation, status and exception raised (None on success) of every
+    operation in completion order. The status is "applied", "failed", "skipped" for operations
+    that were not implemented or depend on a failed one or "not_attempted" for operations that
+    can be resumed by running again."""
+    graph = scheduler.OperationGraph(operations_plan, priorities)
+    log_if_level(1, verbose, "\n\tEXECUTION\n")
+    log_if_level(
+        2,
+        verbose,
+        "scheduling {count} operations with {dependencies} dependencies ({lanes})",
+        count=len(graph),
+        dependencies=sum(len(x) for x in graph.dependencies),
+        lanes=", ".join(f"{name}: {graph.lanes.count(lane)}" for lane, name in enumerate(scheduler.LANES)),
+    )
+
+    current_domain = None
+    # a single job logs the start of every operation before sending its request and the outcome
+    # once it is done in text output, otherwise every operation is logged once it is done, as a
+    # single event with its domain, record and status in JSON output
+    progressive = jobs <= 1 and event_log.fmt == "text"
+    # operations that logged their start
+    started = set()
+
+    def execute(domain_name, operation):
+        nonlocal current_domain
+        op = operation["operation"]
+        if jobs <= 1 and domain_name != current_domain:
+            log_if_level(1, verbose, "- altering domain '{domain}'", domain=domain_name)
+            current_domain = domain_name
+        if op not in ["create", "update", "delete"]:
+            if jobs <= 1:
+                log_if_level(0, verbose, "unknown operation '{op}'", op=op)
+            return False
+        if progressive:
+            record, name = describe_operation(domain_name, operation)
+            log_if_level(
+                1, verbose, "\t{op} {type}-record '{name}' ... ", nl=False, op=op, type=record["type"], name=name
+            )
+            started.add(id(operation))
+        if op == "delete":
+            if progressive:
+                log_if_level(0, verbose, "{op} operation is not implemented - skipped", op=op)
+            return False
+        _execute_operation(api, domain_name, operation)
+        return True
+
+    # operations not attempted as the API is failing or the deadline is exceeded by the reason,
+    # reported at the end so they can be resumed
+    not_attempted = {}
+    open_circuits = set()
+    applied = 0
+    results = []
+    for index, executed, error in graph.run(execute, jobs, deadline=deadline):
+        domain_name, operation = graph.operations[index]
+        op = operation["operation"]
+        if op not in ["create", "update", "delete"]:
+            if jobs > 1:
+                log_if_level(0, verbose, "unknown operation '{op}' for domain '{domain}'", op=op, domain=domain_name)
+            continue
+        if error is not None and not isinstance(error, RuntimeError):
+            raise error
+
+        reason = None
+        if isinstance(error, circuit.CircuitOpenError):
+            reason = "circuit"
+        elif isinstance(error, budget.DeadlineExceeded):
+            reason = "deadline"
+        elif isinstance(error, scheduler.DependencyFailed):
+            reason = next((not_attempted[j] for j in graph.dependencies[index] if j in not_attempted), None)
+
+        record, name = describe_operation(domain_name, operation)
+        if reason is not None:
+            status = "not_attempted"
+            not_attempted[index] = reason
+            result_text = "short-circuited" if reason == "circuit" else "deadline exceeded"
+        elif isinstance(error, scheduler.DependencyFailed):
+            status = "skipped"
+            result_text = None
+        elif error is not None:
+            status = "failed"
+            result_text = "failed"
+        else:
+            status = "applied" if executed else "skipped"
+            applied += 1 if executed else 0
+            result_text = "done" if executed else "not implemented - skipped"
+
+        if status == "skipped" and error is not None:
+            log_if_level(
+                0,
+                verbose,
+                "\t{op} {type}-record '{name}' skipped: an operation it depends on failed",
+                domain=domain_name,
+                op=op,
+                type=record["type"],
+                name=name,
+                status=status,
+            )
+        elif progressive:
+            # operations not attempted did not log their start, failures are followed by the
+            # error and operations not implemented were reported while executing
+            if id(operation) not in started:
+                log_if_level(
+                    1, verbose, "\t{op} {type}-record '{name}' ... ", nl=False, op=op, type=record["type"], name=name
+                )
+            if status != "failed" and (executed or error is not None):
+                log_if_level(1, verbose, result_text)
+        else:
+            log_if_level(
+                1,
+                verbose,
+                "\t{op} {type}-record '{name}' ... {result}",
+                domain=domain_name,
+                op=op,
+                type=record["type"],
+                name=name,
+                result=result_text,
+                status=status,
+            )
+
+        if isinstance(error, circuit.CircuitOpenError) and error.family not in open_circuits:
+            open_circuits.add(error.family)
+            log_if_level(0, verbose, "Porkbun API is failing: {error}", error=error)
+        elif status == "failed":
+            log_if_level(
+                0,
+                verbose,
+                "querying Porkbun API for domain '{domain}' failed: {error}",
+                domain=domain_name,
+                error=error,
+            )
+        results.append((domain_name, operation, status, error))
+
+    summaries = {
+        "circuit": "{count} operations were not attempted while the Porkbun API was failing, run again to resume them:",
+        "deadline": "deadline exceeded with {applied} operations applied, {count} operations were not attempted,"
+        " run again to resume them:",
+    }
+    for reason, summary in summaries.items():
+        indices = sorted(i for i, x in not_attempted.items() if x == reason)
+        if not indices:
+            continue
+        log_if_level(0, verbose, summary, count=len(indices), applied=applied)
+        for index in indices:
+            domain_name, operation = graph.operations[index]
+            record, name = describe_operation(domain_name, operation)
+            log_if_level(
+                0,
+                verbose,
+                "\t{op} {type}-record '{name}'",
+                op=operation["operation"],
+                type=record["type"],
+                name=name,
+            )
+
+    return results
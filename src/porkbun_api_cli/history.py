@@ -0,0 +1,257 @@
+import json
+import os
+import threading
+import time
+
+# highest number of concurrent requests chosen from the history
+MAX_JOBS = 8
+
+# weight of the latest run in the moving averages of latencies and error rates
+WEIGHT = 0.3
+
+# share of the lowest throttled request rate aimed for when choosing the number of concurrent requests
+HEADROOM = 0.8
+
+# API endpoint families called by operations
+_FAMILIES = {"create": "dns/create", "update": "dns/edit"}
+
+
+class Estimate:
+    """Expected cost of executing a plan, see :meth:`LatencyHistory.estimate`.
+
+    :param calls: number of API calls
+    :type calls: int
+    :param duration: seconds the calls are expected to take, None without any history
+    :type duration: float
+    :param failures: number of calls expected to fail, None without any history
+    :type failures: float
+    :param risk: risk of responses being throttled, "low", "high" or "unknown"
+    :type risk: str"""
+
+    def __init__(self, calls, duration, failures, risk):
+        self.calls = calls
+        self.duration = duration
+        self.failures = failures
+        self.risk = risk
+
+    def __repr__(self):
+        return f"Estimate(calls={self.calls}, duration={self.duration!r}, risk={self.risk!r})"
+
+
+def format_duration(seconds):
+    """Format a duration for humans.
+
+    >>> format_duration(0.2), format_duration(42.4), format_duration(1865)
+    ('less than a second', '42 s', '31 min')
+
+    :param seconds: duration in seconds
+    :type seconds: float
+    :rtype: str"""
+    if seconds < 1:
+        return "less than a second"
+    if seconds < 120:
+        return f"{seconds:.0f} s"
+    return f"{seconds / 60:.0f} min"
+
+
+def _busy_time(intervals):
+    """Get the time at least one request was in flight.
+
+    >>> _busy_time([(0, 2), (1, 3), (10, 11)])
+    4
+
+    :param intervals: start and end of requests
+    :type intervals: list
+    :returns: seconds covered by the intervals
+    :rtype: float"""
+    busy = 0
+    start = end = None
+    for interval_start, interval_end in sorted(intervals):
+        if end is None or interval_start > end:
+            busy += 0 if end is None else end - start
+            start, end = interval_start, interval_end
+        else:
+            end = max(end, interval_end)
+    return busy if end is None else busy + end - start
+
+
+class LatencyHistory:
+    """Persistent latency and error statistics of API endpoint families from previous runs.
+
+    Requests of a run are observed while it makes them, see :attr:`porkbun_api_cli.api.PorkbunAPI.observer`,
+    and merged into moving averages by endpoint family when saved. The request rate of every run,
+    measured over the time its requests were in flight, is kept as the highest rate sustained
+    without any throttled responses and the lowest one that was throttled, so that plans can be
+    estimated and the number of concurrent requests chosen before the API is called.
+
+    :param state_dir: directory holding the history file
+    :type state_dir: str
+    :param clock: monotonic clock returning seconds
+    :type clock: callable"""
+
+    FILENAME = "history.json"
+
+    def __init__(self, state_dir, clock=time.monotonic):
+        self.path = os.path.join(state_dir, self.FILENAME)
+        self.clock = clock
+        try:
+            with open(self.path, "r", encoding="utf-8") as history_file:
+                history = json.load(history_file)
+            self.families = history["families"]
+            self.safe_rate = history["safe_rate"]
+            self.throttled_rate = history["throttled_rate"]
+        except FileNotFoundError:
+            self._reset()
+        except (ValueError, KeyError, TypeError):
+            # a corrupt history only costs estimates and the choice of concurrency
+            self._reset()
+        # requests, seconds, errors and throttled responses of this run by endpoint family
+        self._run = {}
+        # start and end of every request of this run, only the time requests are in flight counts
+        # towards the request rate, not planning, prompts or other idle time between them
+        self._intervals = []
+        self._lock = threading.Lock()
+
+    def _reset(self):
+        self.families = {}
+        self.safe_rate = None
+        self.throttled_rate = None
+
+    def observe(self, family, seconds, status):
+        """Record a request made in this run.
+
+        :param family: endpoint family, e.g., "dns/edit"
+        :type family: str
+        :param seconds: time the request took
+        :type seconds: float
+        :param status: HTTP status code of the response, None if the request raised an exception
+        :type status: int"""
+        now = self.clock()
+        with self._lock:
+            stats = self._run.setdefault(family, [0, 0.0, 0, 0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] += 1 if status is None or status >= 500 else 0
+            stats[3] += 1 if status == 429 else 0
+            self._intervals.append((now - seconds, now))
+
+    def latency(self, family=None):
+        """Get the average latency of an endpoint family or of all of them weighted by their requests.
+
+        :param family: endpoint family, all families if None
+        :type family: str
+        :returns: seconds, None if no requests of the family were made
+        :rtype: float"""
+        if family is not None:
+            entry = self.families.get(family)
+            return None if entry is None else entry["latency"]
+        requests = sum(x["requests"] for x in self.families.values())
+        if not requests:
+            return None
+        return sum(x["latency"] * x["requests"] for x in self.families.values()) / requests
+
+    def suggest_jobs(self, maximum=MAX_JOBS):
+        """Choose a number of concurrent requests from the history.
+
+        Concurrent requests sustain about as many requests per second as their number divided by
+        the latency. The number is chosen to stay below the lowest rate that was throttled, or to
+        double the highest rate sustained so far if none was, so that it grows over a few runs.
+
+        :param maximum: highest number chosen
+        :type maximum: int
+        :returns: number of concurrent requests, 1 without any history
+        :rtype: int"""
+        latency = self.latency()
+        if latency is None:
+            return 1
+        if self.throttled_rate is not None:
+            rate = self.throttled_rate * HEADROOM
+        elif self.safe_rate is not None:
+            rate = self.safe_rate * 2
+        else:
+            return 1
+        return max(1, min(maximum, int(rate * latency)))
+
+    def estimate(self, operations_plan, jobs, rate_limit=None):
+        """Estimate the API calls of a plan, their duration with a number of concurrent requests and
+        the risk of throttled responses.
+
+        :param operations_plan: planned operations by domain name
+        :type operations_plan: dict
+        :param jobs: number of concurrent requests
+        :type jobs: int
+        :param rate_limit: requests per second the client is limited to, if any
+        :type rate_limit: float
+        :rtype: Estimate"""
+        counts = {}
+        for operations in operations_plan.values():
+            for operation in operations or ():
+                family = _FAMILIES.get(operation["operation"])
+                if family is not None:
+                    counts[family] = counts.get(family, 0) + 1
+        calls = sum(counts.values())
+        average = self.latency()
+        if average is None:
+            return Estimate(calls, None, None, "unknown")
+
+        work = sum(count * (self.latency(family) or average) for family, count in counts.items())
+        concurrency = max(1, min(jobs, calls))
+        duration = work / concurrency
+        if rate_limit is not None:
+            duration = max(duration, calls / rate_limit)
+        failures = sum(count * self.families.get(family, {}).get("error_rate", 0.0) for family, count in counts.items())
+
+        rate = concurrency * calls / work if work else 0.0
+        if rate_limit is not None:
+            rate = min(rate, rate_limit)
+        if self.throttled_rate is not None and rate >= self.throttled_rate:
+            risk = "high"
+        elif self.safe_rate is not None and rate <= self.safe_rate:
+            risk = "low"
+        else:
+            risk = "unknown"
+        return Estimate(calls, duration, failures, risk)
+
+    def save(self):
+        """Merge the requests of this run into the history and write the history file."""
+        with self._lock:
+            run, intervals = self._run, self._intervals
+            self._run, self._intervals = {}, []
+        if not run:
+            return
+
+        for family, (requests, seconds, errors, throttled) in run.items():
+            current = {
+                "latency": seconds / requests,
+                "error_rate": errors / requests,
+                "throttle_rate": throttled / requests,
+            }
+            entry = self.families.get(family)
+            if entry is None:
+                self.families[family] = {**current, "requests": requests}
+                continue
+            for key, value in current.items():
+                entry[key] = (1 - WEIGHT) * entry[key] + WEIGHT * value
+            entry["requests"] += requests
+
+        busy = _busy_time(intervals)
+        if busy > 0:
+            rate = sum(x[0] for x in run.values()) / busy
+            if any(x[3] for x in run.values()):
+                self.throttled_rate = rate if self.throttled_rate is None else min(self.throttled_rate, rate)
+                if self.safe_rate is not None and self.safe_rate >= rate:
+                    self.safe_rate = None
+            else:
+                self.safe_rate = rate if self.safe_rate is None else max(self.safe_rate, rate)
+                if self.throttled_rate is not None and self.throttled_rate <= rate:
+                    self.throttled_rate = None
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as history_file:
+            json.dump(
+                {"families": self.families, "safe_rate": self.safe_rate, "throttled_rate": self.throttled_rate},
+                history_file,
+                sort_keys=True,
+            )
+        os.replace(temp_path, self.path)
@@ -0,0 +1,105 @@
+import json
+
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = ",:]}" + _WHITESPACE
+
+
+class _Reader:
+    """Text buffer over an iterable of chunks that drops consumed input."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        # share key strings among decoded objects, like a single ``json.loads`` call does
+        keys = {}
+        self._decoder = json.JSONDecoder(object_pairs_hook=lambda pairs: {keys.setdefault(k, k): v for k, v in pairs})
+        self._buffer = ""
+        self._pos = 0
+        self._exhausted = False
+
+    def _fill(self):
+        if self._exhausted:
+            return False
+        for chunk in self._chunks:
+            if chunk:
+                # keep only unconsumed input around
+                self._buffer = self._buffer[self._pos :] + chunk
+                self._pos = 0
+                return True
+        self._exhausted = True
+        return False
+
+    def peek(self):
+        """Skip whitespace and return the next character without consuming it."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                raise ValueError("unexpected end of JSON input")
+
+    def expect(self, chars):
+        char = self.peek()
+        if char not in chars:
+            raise ValueError(f"unexpected character '{char}' at offset {self._pos} of JSON input")
+        self._pos += 1
+        return char
+
+    def value(self):
+        """Decode the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # a value is always followed by a delimiter, otherwise a number may have been cut off
+            if (end < len(self._buffer) and self._buffer[end] in _DELIMITERS) or not self._fill():
+                self._pos = end
+                return value
+
+
+def iter_array_member(chunks, key, fields=None):
+    """Parse a JSON object from text chunks and yield items of its array member ``key`` one by one,
+    without holding the whole document in memory. Other members of the object are decoded as a whole
+    and stored in ``fields`` as soon as they are parsed.
+
+    >>> fields = {}
+    >>> list(iter_array_member(['{"status": "SUCC', 'ESS", "records": [{"id": 1}, ', '{"id": 2}]}'], "records", fields))
+    [{'id': 1}, {'id': 2}]
+    >>> fields
+    {'status': 'SUCCESS'}
+
+    :param chunks: chunks of JSON text
+    :type chunks: iterable
+    :param key: name of the array member to stream
+    :type key: str
+    :param fields: dictionary to store other members in
+    :type fields: dict
+    :returns: items of the array member
+    :rtype: generator"""
+    if fields is None:
+        fields = {}
+
+    reader = _Reader(chunks)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        name = reader.value()
+        reader.expect(":")
+        if name == key and reader.peek() == "[":
+            reader.expect("[")
+            if reader.peek() == "]":
+                reader.expect("]")
+            else:
+                while True:
+                    yield reader.value()
+                    if reader.expect(",]") == "]":
+                        break
+        else:
+            fields[name] = reader.value()
+        if reader.expect(",}") == "}":
+            return
@@ -0,0 +1,214 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+# seconds a lock is held without being renewed, renewed every third of it while held
+LEASE = 60.0
+
+# seconds between attempts to take a lock held by another run
+POLL_INTERVAL = 0.5
+
+# seconds after which the guard left behind by a run that crashed while breaking a stale lock is removed
+GUARD_TIMEOUT = 10.0
+
+
+class DomainLocked(RuntimeError):
+    """A domain is locked by another run."""
+
+    def __init__(self, domain_name, holder):
+        self.domain_name = domain_name
+        self.holder = holder
+        owner = "another run" if holder is None else f"{holder['host']} (pid {holder['pid']})"
+        super().__init__(f"domain '{domain_name}' is locked by {owner}")
+
+
+def _process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # owned by another user
+        return True
+    return True
+
+
+class DomainLocks:
+    """Advisory locks of domains shared by concurrent runs through lock files in a directory.
+
+    A lock file holds the owner of the lock and the expiry of its lease, which is renewed by a
+    background thread while the lock is held. A lock is stale once its lease expired or, on the
+    same host, its owner process is gone, and is then taken over. Runs breaking a stale lock are
+    serialized by a guard file, so that a lock is only removed while it is still stale.
+
+    Leases are compared with the wall clock, hosts sharing the directory must keep their clocks
+    in sync.
+
+    :param lock_dir: directory holding the lock files
+    :type lock_dir: str
+    :param lease: seconds a lock is held without being renewed
+    :type lease: float
+    :param clock: clock returning seconds since the epoch
+    :type clock: callable
+    :param sleep: function waiting for a number of seconds
+    :type sleep: callable"""
+
+    def __init__(self, lock_dir, lease=LEASE, clock=time.time, sleep=time.sleep):
+        self.lock_dir = lock_dir
+        self.lease = lease
+        self.clock = clock
+        self.sleep = sleep
+        self.owner = {"host": socket.gethostname(), "pid": os.getpid(), "token": uuid.uuid4().hex}
+        # domains locked by this run, and those whose lock was taken over by another run
+        self.held = set()
+        self.lost = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._renewer = None
+
+    def _path(self, domain_name):
+        if not domain_name or domain_name.startswith(".") or any(x in domain_name for x in "/\\"):
+            raise ValueError(f"invalid domain name '{domain_name}'")
+        return os.path.join(self.lock_dir, domain_name.lower() + ".lock")
+
+    def _entry(self):
+        return {**self.owner, "expires": self.clock() + self.lease}
+
+    def _read(self, path):
+        """Read a lock file, returning its entry (None if it is being written or invalid) and its modification time."""
+        with open(path, "r", encoding="utf-8") as lock_file:
+            mtime = os.fstat(lock_file.fileno()).st_mtime
+            try:
+                entry = json.load(lock_file)
+            except ValueError:
+                entry = None
+        if not isinstance(entry, dict) or any(x not in entry for x in ["host", "pid", "token", "expires"]):
+            entry = None
+        return entry, mtime
+
+    def _stale(self, entry, mtime):
+        if entry is None:
+            # created by a run that crashed before writing it
+            return self.clock() - mtime > self.lease
+        if entry["expires"] < self.clock():
+            return True
+        return os.name == "posix" and entry["host"] == self.owner["host"] and not _process_exists(entry["pid"])
+
+    def _create(self, path):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w", encoding="utf-8") as lock_file:
+            json.dump(self._entry(), lock_file)
+        return True
+
+    def _break(self, path):
+        """Remove a stale lock unless another run is breaking it.
+
+        :returns: True if the lock is gone, False if another run is breaking it"""
+        guard = path + ".break"
+        try:
+            os.close(os.open(guard, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+        except FileExistsError:
+            try:
+                if self.clock() - os.path.getmtime(guard) > GUARD_TIMEOUT:
+                    os.unlink(guard)
+            except FileNotFoundError:
+                pass
+            return False
+        try:
+            # the lock may have been broken and taken again since it was read
+            if self._stale(*self._read(path)):
+                os.unlink(path)
+        except FileNotFoundError:
+            pass
+        finally:
+            os.unlink(guard)
+        return True
+
+    def acquire(self, domain_name, timeout=0.0):
+        """Lock a domain, waiting for a lock held by another run to be released or go stale.
+
+        :param domain_name: domain name
+        :type domain_name: str
+        :param timeout: seconds to wait for a lock held by another run
+        :type timeout: float
+        :raises DomainLocked: if the domain is still locked by another run after the timeout
+        :raises OSError: if the lock file cannot be written"""
+        if domain_name in self.held:
+            return
+        path = self._path(domain_name)
+        os.makedirs(self.lock_dir, exist_ok=True)
+        end = self.clock() + timeout
+        while not self._create(path):
+            try:
+                entry, mtime = self._read(path)
+            except FileNotFoundError:
+                # released in the meantime
+                continue
+            if self._stale(entry, mtime) and self._break(path):
+                continue
+            remaining = end - self.clock()
+            if remaining <= 0:
+                raise DomainLocked(domain_name, entry)
+            self.sleep(min(POLL_INTERVAL, remaining))
+
+        with self._lock:
+            self.held.add(domain_name)
+            if self._renewer is None:
+                self._renewer = threading.Thread(target=self._renew_periodically, daemon=True)
+                self._renewer.start()
+
+    def renew(self):
+        """Extend the leases of all locks held, forgetting those taken over by another run."""
+        with self._lock:
+            for domain_name in sorted(self.held):
+                path = self._path(domain_name)
+                try:
+                    entry, _ = self._read(path)
+                except FileNotFoundError:
+                    entry = None
+                if entry is None or entry["token"] != self.owner["token"]:
+                    self.held.discard(domain_name)
+                    self.lost.add(domain_name)
+                    continue
+                temp_path = f"{path}.{self.owner['token']}.tmp"
+                with open(temp_path, "w", encoding="utf-8") as lock_file:
+                    json.dump(self._entry(), lock_file)
+                os.replace(temp_path, path)
+
+    def _renew_periodically(self):
+        while not self._stopped.wait(self.lease / 3):
+            try:
+                self.renew()
+            except OSError:
+                # tried again on the next round, before the lease expires
+                pass
+
+    def release(self, domain_name):
+        """Unlock a domain if it is still locked by this run.
+
+        :param domain_name: domain name
+        :type domain_name: str"""
+        with self._lock:
+            if domain_name not in self.held:
+                return
+            self.held.discard(domain_name)
+            path = self._path(domain_name)
+            try:
+                if self._read(path)[0]["token"] == self.owner["token"]:
+                    os.unlink(path)
+            except (FileNotFoundError, TypeError):
+                pass
+
+    def release_all(self):
+        """Unlock all domains locked by this run and stop renewing leases."""
+        self._stopped.set()
+        if self._renewer is not None:
+            self._renewer.join()
+        for domain_name in sorted(self.held):
+            self.release(domain_name)
@@ -0,0 +1,110 @@
+import json
+import sys
+import threading
+import time
+
+
+class EventLog:
+    """Buffered writer for structured log events.
+
+    Every event carries a verbosity level, a message template and optional
+    fields. The template is rendered with ``str.format`` using the fields only
+    when the event is actually written, so the caller never pays for formatting
+    of filtered events. Rendered events are collected in memory and written out
+    when the buffer grows past ``buffer_size``, when ``flush_interval`` seconds
+    passed since the last write, when the target stream changes or on an
+    explicit call to :meth:`flush`.
+
+    Two output formats are supported:
+
+    * text -- message is written as is, like ``click.echo`` would do
+    * json -- each event is written as a single JSON object per line
+
+    :param fmt: output format, either "text" or "json"
+    :type fmt: str
+    :param buffer_size: number of buffered characters that triggers a write
+    :type buffer_size: int
+    :param flush_interval: maximum time in seconds an event stays in the buffer
+    :type flush_interval: float
+    :param stream: name of the standard stream used when no file is given, "stdout" or "stderr"
+    :type stream: str"""
+
+    FORMATS = ["text", "json"]
+
+    def __init__(self, fmt="text", buffer_size=64 * 1024, flush_interval=0.5, stream="stdout"):
+        if fmt not in self.FORMATS:
+            raise ValueError(f"unsupported log format '{fmt}'")
+        self.fmt = fmt
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.stream = stream
+        self._lock = threading.Lock()
+        self._chunks = []
+        self._size = 0
+        self._file = None
+        self._flushed_at = time.monotonic()
+
+    def emit(self, level, message, file=None, nl=True, **fields):
+        """Render an event and add it to the buffer.
+
+        :param level: verbosity level of the event
+        :type level: int
+        :param message: message template, formatted with fields
+        :type message: str
+        :param file: target stream, default standard stream if None
+        :type file: file-like object
+        :param nl: append a new line after the message in text mode
+        :type nl: bool"""
+        if fields:
+            message = message.format(**fields)
+
+        if self.fmt == "json":
+            event = {
+                "time": time.time(),
+                "level": level,
+                "stream": self.stream if file is None else ("stderr" if file is sys.stderr else "stdout"),
+                "message": message.strip(),
+                **fields,
+            }
+            text = json.dumps(event, default=str) + "\n"
+        else:
+            text = message + "\n" if nl else message
+
+        with self._lock:
+            if file is not self._file:
+                self._write()
+                self._file = file
+            self._chunks.append(text)
+            self._size += len(text)
+            if self._size >= self.buffer_size or time.monotonic() - self._flushed_at >= self.flush_interval:
+                self._write()
+
+    def reset(self, fmt="text", stream="stdout"):
+        """Write out all buffered events and start over with an output format and stream, e.g., for
+        the next command run in the same process.
+
+        :param fmt: output format, either "text" or "json"
+        :type fmt: str
+        :param stream: name of the standard stream used when no file is given, "stdout" or "stderr"
+        :type stream: str"""
+        if fmt not in self.FORMATS:
+            raise ValueError(f"unsupported log format '{fmt}'")
+        with self._lock:
+            self._write()
+            self.fmt = fmt
+            self.stream = stream
+
+    def flush(self):
+        """Write out all buffered events."""
+        with self._lock:
+            self._write()
+
+    def _write(self):
+        if self._chunks:
+            # resolve standard streams at write time, they may be swapped, e.g., in tests
+            stream = getattr(sys, self.stream) if self._file is None else self._file
+            stream.write("".join(self._chunks))
+            stream.flush()
+            self._chunks = []
+            self._size = 0
+        self._flushed_at = time.monotonic()
@@ -0,0 +1,118 @@
+import contextlib
+import time
+
+
+class _Phase:
+    def __init__(self, name):
+        self.name = name
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.memory = 0
+        self.peak = 0
+        self.profile = None
+        self.allocations = []
+
+
+class Profiler:
+    """Profile phases of a run for CPU time and memory.
+
+    Every phase gets its own ``cProfile`` profile and a ``tracemalloc`` snapshot
+    taken before and after it. Besides hot functions and allocation sites, the
+    report shows wall clock and CPU time of every phase: the difference is time
+    spent waiting, e.g., for the network. Profiles of all phases are merged into
+    a single ``pstats`` file. Only the main thread is profiled for CPU time, while
+    CPU time of concurrent requests still counts towards their phase.
+
+    :param path: path of the pstats file, profiling is disabled if None
+    :type path: str
+    :param top: number of hot functions and allocation sites reported per phase
+    :type top: int"""
+
+    def __init__(self, path, top=10):
+        self.path = path
+        self.top = top
+        self.phases = []
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Profile a phase of the run.
+
+        :param name: phase name
+        :type name: str"""
+        if not self.enabled:
+            yield
+            return
+
+        import cProfile
+        import tracemalloc
+
+        phase = _Phase(name)
+        self.phases.append(phase)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        start_memory = tracemalloc.get_traced_memory()[0]
+        profile = cProfile.Profile()
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            phase.wall = time.perf_counter() - start_wall
+            phase.cpu = time.process_time() - start_cpu
+            current, phase.peak = tracemalloc.get_traced_memory()
+            phase.memory = current - start_memory
+            after = tracemalloc.take_snapshot()
+            filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+            phase.allocations = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")[
+                : self.top
+            ]
+            phase.profile = profile
+
+    def report(self, file):
+        """Write the pstats file and a summary of all phases.
+
+        :param file: stream to write the summary to
+        :type file: file-like object"""
+        if not self.enabled or not self.phases:
+            return
+
+        import pstats
+        import tracemalloc
+
+        tracemalloc.stop()
+        pstats.Stats(*[phase.profile for phase in self.phases]).dump_stats(self.path)
+
+        lines = ["", "\tPROFILE", ""]
+        lines.append(f"{'phase':<12} {'wall s':>9} {'cpu s':>9} {'wait s':>9} {'memory KiB':>11} {'peak KiB':>11}")
+        for phase in self.phases:
+            lines.append(
+                f"{phase.name:<12} {phase.wall:9.3f} {phase.cpu:9.3f} {max(0.0, phase.wall - phase.cpu):9.3f}"
+                f" {phase.memory / 1024:+11.1f} {phase.peak / 1024:11.1f}"
+            )
+        lines.append(f"CPU profile written to {self.path}")
+
+        for phase in self.phases:
+            lines.append("")
+            lines.append(f"{phase.name}: top {self.top} functions by own time")
+            lines.append(f"  {'own s':>8} {'total s':>8} {'calls':>8}  function")
+            stats = pstats.Stats(phase.profile).stats
+            entries = sorted(stats.items(), key=lambda x: x[1][2], reverse=True)[: self.top]
+            for (filename, lineno, function), (_, calls, own, total, _) in entries:
+                lines.append(f"  {own:8.3f} {total:8.3f} {calls:>8}  {function} ({filename}:{lineno})")
+            lines.append(f"{phase.name}: top {self.top} allocation sites")
+            for stat in phase.allocations:
+                frame = stat.traceback[0]
+                lines.append(
+                    f"  {stat.size_diff / 1024:+10.1f} KiB {stat.count_diff:+8} blocks  {frame.filename}:{frame.lineno}"
+                )
+
+        file.write("\n".join(lines) + "\n")
+        file.flush()
@@ -0,0 +1,382 @@
+import asyncio
+import ipaddress
+import os
+import socket
+import struct
+import time
+
+from . import utils
+
+# record types whose content is compared with answers of nameservers, other types are not
+# decoded and ALIAS records are served as A and AAAA records of their target
+TYPES = {"A": 1, "NS": 2, "CNAME": 5, "MX": 15, "TXT": 16, "AAAA": 28, "SRV": 33, "CAA": 257}
+
+# number of queries in flight at once
+CONCURRENCY = 64
+
+# seconds to wait for an answer, a query timing out is sent again after the interval
+QUERY_TIMEOUT = 2.0
+
+# seconds between queries for a record not yet served by a nameserver
+INTERVAL = 1.0
+
+# size of UDP responses advertised with EDNS, larger answers are truncated and asked for again over TCP
+UDP_PAYLOAD_SIZE = 1232
+
+_RCODES = {1: "FORMERR", 2: "SERVFAIL", 4: "NOTIMP", 5: "REFUSED"}
+
+_HEADER = struct.Struct("!HHHHHH")
+_RESOURCE = struct.Struct("!HHIH")
+
+# the query response and truncation flags and the response code in the header
+_QR = 0x8000
+_TC = 0x0200
+_NXDOMAIN = 3
+
+
+def _encode_name(name):
+    encoded = b""
+    for label in name.rstrip(".").split("."):
+        label = label.encode("ascii") if label.isascii() else label.encode("idna")
+        if not 0 < len(label) < 64:
+            raise ValueError(f"invalid domain name '{name}'")
+        encoded += bytes([len(label)]) + label
+    return encoded + b"\x00"
+
+
+def encode_query(name, record_type, query_id):
+    """Encode a query for records of a name and type, not asking for recursion and advertising
+    :data:`UDP_PAYLOAD_SIZE` with an EDNS record.
+
+    >>> encode_query("example.com", "A", 1).hex()
+    '000100000001000000000001076578616d706c6503636f6d000001000100002904d0000000000000'
+
+    :param name: fully qualified domain name
+    :type name: str
+    :param record_type: record type, one of :data:`TYPES`
+    :type record_type: str
+    :param query_id: query ID echoed in the response
+    :type query_id: int
+    :returns: query message
+    :rtype: bytes"""
+    header = _HEADER.pack(query_id, 0, 1, 0, 0, 1)
+    question = _encode_name(name) + struct.pack("!HH", TYPES[record_type], 1)
+    return header + question + b"\x00" + _RESOURCE.pack(41, UDP_PAYLOAD_SIZE, 0, 0)
+
+
+def _decode_name(message, offset):
+    labels = []
+    end = None
+    # compression pointers may only point backwards, bounding the number of jumps
+    for _ in range(len(message)):
+        length = message[offset]
+        if length >= 0xC0:
+            if end is None:
+                end = offset + 2
+            pointer = ((length & 0x3F) << 8) | message[offset + 1]
+            if pointer >= offset:
+                break
+            offset = pointer
+        elif length:
+            labels.append(message[offset + 1 : offset + 1 + length].decode("ascii", "replace").lower())
+            offset += 1 + length
+        else:
+            return ".".join(labels), offset + 1 if end is None else end
+    raise ValueError("malformed response: invalid name compression")
+
+
+def _decode_rdata(message, record_type, offset, length):
+    rdata = message[offset : offset + length]
+    if record_type == 1:
+        return ipaddress.IPv4Address(rdata).compressed, None
+    if record_type == 28:
+        return ipaddress.IPv6Address(rdata).compressed, None
+    if record_type in (2, 5):
+        return _decode_name(message, offset)[0], None
+    if record_type == 15:
+        return _decode_name(message, offset + 2)[0], struct.unpack_from("!H", message, offset)[0]
+    if record_type == 16:
+        strings, index = [], 0
+        while index < len(rdata):
+            strings.append(rdata[index + 1 : index + 1 + rdata[index]])
+            index += 1 + rdata[index]
+        return b"".join(strings).decode("utf-8", "replace"), None
+    if record_type == 33:
+        prio, weight, port = struct.unpack_from("!HHH", message, offset)
+        return f"{weight} {port} {_decode_name(message, offset + 6)[0]}", prio
+    if record_type == 257:
+        tag = rdata[2 : 2 + rdata[1]].decode("ascii", "replace").lower()
+        return f"{rdata[0]} {tag} {rdata[2 + rdata[1]:].decode('utf-8', 'replace')}", None
+    return None
+
+
+def decode_response(message, query_id, name, record_type):
+    """Decode the answers of a nameserver to a query, see :func:`encode_query`.
+
+    Answers are given like :func:`expected_answer` gives them for records from configuration,
+    only those for the name and type asked for are decoded.
+
+    :param message: response message
+    :type message: bytes
+    :param query_id: ID of the query
+    :type query_id: int
+    :param name: fully qualified domain name asked for
+    :type name: str
+    :param record_type: record type asked for
+    :type record_type: str
+    :returns: whether the response is truncated and the set of answers, empty if the name does not exist
+    :rtype: tuple
+    :raises ValueError: if the response is malformed, does not match the query or reports an error"""
+    try:
+        response_id, flags, questions, answers, _, _ = _HEADER.unpack_from(message)
+        if response_id != query_id or not flags & _QR:
+            raise ValueError("response does not match the query")
+        rcode = flags & 0x000F
+        if rcode not in (0, _NXDOMAIN):
+            raise ValueError(f"nameserver answered with {_RCODES.get(rcode, f'response code {rcode}')}")
+        offset = _HEADER.size
+        for _ in range(questions):
+            offset = _decode_name(message, offset)[1] + 4
+        name = name.rstrip(".").lower()
+        decoded = set()
+        for _ in range(answers):
+            owner, offset = _decode_name(message, offset)
+            answer_type, _, _, length = _RESOURCE.unpack_from(message, offset)
+            offset += _RESOURCE.size
+            if offset + length > len(message):
+                raise ValueError("malformed response: truncated record")
+            if owner == name and answer_type == TYPES[record_type]:
+                decoded.add(_decode_rdata(message, answer_type, offset, length))
+            offset += length
+    except (IndexError, struct.error) as e:
+        raise ValueError(f"malformed response: {e}") from None
+    return bool(flags & _TC), decoded
+
+
+def expected_answer(record):
+    """Get the answer a nameserver serving a record gives, comparable with those of :func:`decode_response`.
+
+    >>> expected_answer({"name": "", "type": "MX", "content": "Mail.example.com.", "prio": "10"})
+    ('mail.example.com', 10)
+    >>> expected_answer({"name": "", "type": "CAA", "content": '0 issue "letsencrypt.org"'})
+    ('0 issue letsencrypt.org', None)
+
+    :param record: record from configuration
+    :type record: dict
+    :returns: content and priority, None for types without one or if not configured
+    :rtype: tuple"""
+    record_type, content = record["type"], record["content"]
+    prio = int(record["prio"]) if record.get("prio") is not None and record_type in ("MX", "SRV") else None
+    if record_type in ("A", "AAAA"):
+        content = ipaddress.ip_address(content).compressed
+    elif record_type in ("CNAME", "MX", "NS"):
+        content = content.rstrip(".").lower()
+    elif record_type == "SRV":
+        weight, port, target = content.split()
+        content = f"{int(weight)} {int(port)} {target.rstrip('.').lower()}"
+    elif record_type == "CAA":
+        flags, tag, value = content.split(None, 2)
+        content = f"{int(flags)} {tag.lower()} {_unquote(value)}"
+    elif record_type == "TXT":
+        content = _unquote(content)
+    return content, prio
+
+
+def _unquote(value):
+    return value[1:-1] if len(value) > 1 and value[0] == value[-1] == '"' else value
+
+
+def _served(expected, answers):
+    content, prio = expected
+    return any(x[0] == content and (prio is None or x[1] == prio) for x in answers)
+
+
+class _Datagram(asyncio.DatagramProtocol):
+    def __init__(self, query, future):
+        self.query = query
+        self.future = future
+
+    def connection_made(self, transport):
+        transport.sendto(self.query)
+
+    def datagram_received(self, data, addr):
+        # responses to earlier queries from the same port are ignored
+        if not self.future.done() and data[:2] == self.query[:2]:
+            self.future.set_result(data)
+
+    def error_received(self, exc):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+
+async def _exchange_udp(address, query, timeout):
+    loop = asyncio.get_running_loop()
+    family, sockaddr = address
+    future = loop.create_future()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: _Datagram(query, future), family=family, remote_addr=sockaddr
+    )
+    try:
+        return await asyncio.wait_for(future, timeout)
+    finally:
+        transport.close()
+
+
+async def _exchange_tcp(address, query, timeout):
+    async def exchange():
+        reader, writer = await asyncio.open_connection(*address[1][:2])
+        try:
+            writer.write(struct.pack("!H", len(query)) + query)
+            (length,) = struct.unpack("!H", await reader.readexactly(2))
+            return await reader.readexactly(length)
+        finally:
+            writer.close()
+
+    return await asyncio.wait_for(exchange(), timeout)
+
+
+async def query(address, name, record_type, timeout=QUERY_TIMEOUT):
+    """Ask a nameserver for records of a name and type over UDP, over TCP if the answers do not fit.
+
+    :param address: address family and socket address of the nameserver
+    :type address: tuple
+    :param name: fully qualified domain name
+    :type name: str
+    :param record_type: record type, one of :data:`TYPES`
+    :type record_type: str
+    :param timeout: seconds to wait for each response
+    :type timeout: float
+    :returns: answers, see :func:`decode_response`
+    :rtype: set
+    :raises asyncio.TimeoutError: if the nameserver does not respond in time
+    :raises OSError: if the nameserver cannot be reached
+    :raises ValueError: if the response is malformed or reports an error"""
+    query_id = int.from_bytes(os.urandom(2), "big")
+    message = encode_query(name, record_type, query_id)
+    truncated, answers = decode_response(await _exchange_udp(address, message, timeout), query_id, name, record_type)
+    if truncated:
+        _, answers = decode_response(await _exchange_tcp(address, message, timeout), query_id, name, record_type)
+    return answers
+
+
+class PropagationResult:
+    """Propagation of a changed record to the authoritative nameservers of its domain.
+
+    :param domain: domain name
+    :type domain: str
+    :param record: record from configuration
+    :type record: dict
+    :param latencies: seconds from the start of the verification until each nameserver served
+                      the record, None for nameservers that did not serve it in time
+    :type latencies: dict
+    :param errors: last error by nameserver, for those that did not answer the last query
+    :type errors: dict"""
+
+    def __init__(self, domain, record, latencies, errors=None):
+        self.domain = domain
+        self.record = record
+        self.latencies = latencies
+        self.errors = {} if errors is None else errors
+
+    @property
+    def live(self):
+        """Whether all nameservers serve the record."""
+        return bool(self.latencies) and all(x is not None for x in self.latencies.values())
+
+    @property
+    def latency(self):
+        """Seconds until the last nameserver served the record, None if not all of them did."""
+        return max(self.latencies.values()) if self.live else None
+
+    @property
+    def pending(self):
+        """Nameservers that did not serve the record in time."""
+        return [name for name, latency in self.latencies.items() if latency is None]
+
+    def __repr__(self):
+        return (
+            f"PropagationResult({self.domain!r}, {self.record['type']}-record {self.record['name']!r},"
+            f" latency={self.latency!r}, pending={self.pending!r})"
+        )
+
+
+async def verify_records(
+    changes, nameservers, timeout, port=53, concurrency=CONCURRENCY, query_timeout=QUERY_TIMEOUT, interval=INTERVAL
+):
+    """Query every nameserver of a domain for each of its changed records until it serves them.
+
+    Each nameserver is asked again every ``interval`` seconds until it serves the record or the
+    timeout is reached, at most ``concurrency`` queries are in flight at once.
+
+    :param changes: domain names and records from configuration of types in :data:`TYPES`
+    :type changes: list
+    :param nameservers: host names or addresses of the authoritative nameservers by domain name
+    :type nameservers: dict
+    :param timeout: seconds to wait for all records to be served
+    :type timeout: float
+    :param port: port of the nameservers
+    :type port: int
+    :param concurrency: number of queries in flight at once
+    :type concurrency: int
+    :param query_timeout: seconds to wait for an answer
+    :type query_timeout: float
+    :param interval: seconds between queries to a nameserver not yet serving a record
+    :type interval: float
+    :returns: results in the order of changes
+    :rtype: list"""
+    loop = asyncio.get_running_loop()
+    start = time.monotonic()
+    end = start + timeout
+    semaphore = asyncio.Semaphore(concurrency)
+
+    # host names are resolved once, using the first address returned
+    addresses, resolve_errors = {}, {}
+
+    async def resolve(host):
+        try:
+            family, _, _, _, sockaddr = (await loop.getaddrinfo(host, port, type=socket.SOCK_DGRAM))[0]
+            addresses[host] = family, sockaddr
+        except OSError as e:
+            resolve_errors[host] = f"resolving nameserver failed: {e}"
+
+    hosts = {host for domain, _ in changes for host in nameservers.get(domain, ())}
+    await asyncio.gather(*(resolve(x) for x in sorted(hosts)))
+
+    async def poll(result, host):
+        if host in resolve_errors:
+            result.errors[host] = resolve_errors[host]
+            return
+        name = utils.get_record_fqdn(result.domain, result.record)
+        expected = expected_answer(result.record)
+        while time.monotonic() < end:
+            async with semaphore:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    answers = await query(addresses[host], name, result.record["type"], min(query_timeout, remaining))
+                except asyncio.TimeoutError:
+                    result.errors[host] = "timed out"
+                except (OSError, ValueError) as e:
+                    result.errors[host] = str(e)
+                else:
+                    result.errors.pop(host, None)
+                    if _served(expected, answers):
+                        result.latencies[host] = time.monotonic() - start
+                        return
+            await asyncio.sleep(max(0.0, min(interval, end - time.monotonic())))
+
+    results = [
+        PropagationResult(domain, record, {host: None for host in nameservers.get(domain, ())})
+        for domain, record in changes
+    ]
+    await asyncio.gather(*(poll(x, host) for x in results for host in x.latencies))
+    return results
+
+
+def verify(changes, nameservers, timeout, **kwargs):
+    """Run :func:`verify_records` in a new event loop.
+
+    :returns: results in the order of changes
+    :rtype: list"""
+    return asyncio.run(verify_records(changes, nameservers, timeout, **kwargs))
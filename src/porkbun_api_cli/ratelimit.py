@@ -0,0 +1,46 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """Limit the rate of requests shared by all threads using a client.
+
+    Every request takes a token from the bucket, which is refilled at ``rate`` tokens per
+    second up to ``burst`` tokens. Requests finding the bucket empty wait for their turn:
+    tokens are handed out in the order requests arrive.
+
+    :param rate: number of requests per second
+    :type rate: float
+    :param burst: number of requests that may be sent at once after a quiet period
+    :type burst: int
+    :param clock: monotonic clock returning seconds
+    :type clock: callable
+    :param sleep: function waiting for a number of seconds
+    :type sleep: callable"""
+
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be positive and burst at least 1")
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, waiting until one is available.
+
+        :returns: seconds waited
+        :rtype: float"""
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # tokens are taken ahead, later requests wait for those before them
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            self.sleep(wait)
+        return wait
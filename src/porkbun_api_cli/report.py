@@ -0,0 +1,98 @@
+import json
+import sys
+
+
+class PlanWriter:
+    """Stream planned operations in a machine-readable format.
+
+    Each planned operation is written as soon as the planner yields it,
+    followed by a summary for every domain once all of its operations
+    are known. Both entries are JSON objects distinguished by the
+    ``type`` field:
+
+    :: code_block::json
+       {"type": "operation", "domain": str, "op": str, "id": str, "old": dict, "new": dict}
+       {"type": "summary", "domain": str, "skipped": bool, "create": int, "update": int, "delete": int}
+
+    Supported formats:
+
+    * json -- a single JSON array holding all entries
+    * ndjson -- one JSON object per line
+
+    :param fmt: output format, either "json" or "ndjson"
+    :type fmt: str
+    :param file: output stream, standard output if None
+    :type file: file-like object"""
+
+    FORMATS = ["json", "ndjson"]
+
+    OPERATIONS = ["create", "update", "delete"]
+
+    def __init__(self, fmt, file=None):
+        if fmt not in self.FORMATS:
+            raise ValueError(f"unsupported output format '{fmt}'")
+        self.fmt = fmt
+        self._file = file
+        self._count = 0
+
+    def write(self, plan):
+        """Write out entries for a plan yielded by the planner and pass it through.
+
+        :param plan: pairs of domain name and planned operations or None for skipped domains
+        :type plan: iterable
+        :returns: same pairs as the input plan
+        :rtype: generator"""
+        for domain_name, operations in plan:
+            if operations is None:
+                self._write_summary(domain_name, None)
+                yield domain_name, None
+            else:
+                yield domain_name, self._write_operations(domain_name, operations)
+
+    def close(self):
+        """Finalize the output."""
+        if self.fmt == "json":
+            self._emit("[\n]\n" if self._count == 0 else "\n]\n")
+
+    def _write_operations(self, domain_name, operations):
+        counts = dict.fromkeys(self.OPERATIONS, 0)
+        for operation in operations:
+            op = operation["operation"]
+            counts[op] = counts.get(op, 0) + 1
+            existing = operation.get("existing")
+            self._write_entry(
+                {
+                    "type": "operation",
+                    "domain": domain_name,
+                    "op": op,
+                    "id": existing.get("id") if existing else None,
+                    "old": existing,
+                    "new": operation.get("new"),
+                }
+            )
+            yield operation
+        self._write_summary(domain_name, counts)
+
+    def _write_summary(self, domain_name, counts):
+        self._write_entry(
+            {
+                "type": "summary",
+                "domain": domain_name,
+                "skipped": counts is None,
+                **(counts or dict.fromkeys(self.OPERATIONS, 0)),
+            }
+        )
+
+    def _write_entry(self, entry):
+        text = json.dumps(entry, default=str)
+        if self.fmt == "json":
+            text = ("[\n" if self._count == 0 else ",\n") + text
+        else:
+            text += "\n"
+        self._count += 1
+        self._emit(text)
+
+    def _emit(self, text):
+        stream = sys.stdout if self._file is None else self._file
+        stream.write(text)
+        stream.flush()
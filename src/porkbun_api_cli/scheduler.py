@@ -0,0 +1,279 @@
+import heapq
+
+from . import budget
+from . import utils
+
+# record types whose content points at a host name
+_TARGET_TYPES = ["ALIAS", "CNAME", "MX", "NS"]
+# record types resolving a host name to addresses
+_ADDRESS_TYPES = ["A", "AAAA", "ALIAS", "CNAME"]
+
+
+def _normalize(name):
+    return name.rstrip(".").lower()
+
+
+def _target(record):
+    """Host name a record points at, e.g., the exchange of an MX record, or None."""
+    if record is None or not isinstance(record.get("content"), str):
+        return None
+    if record.get("type") in _TARGET_TYPES:
+        return _normalize(record["content"])
+    if record.get("type") == "SRV":
+        parts = record["content"].split()
+        return _normalize(parts[-1]) if len(parts) == 3 else None
+    return None
+
+
+# priority lanes, highest first
+LANES = ["critical", "normal", "bulk"]
+# record types changed in bulk, e.g., verification tokens
+_BULK_TYPES = ["CAA", "TLSA", "TXT"]
+
+
+def classify(domain_name, operation):
+    """Get the priority lane of an operation by its record type and name: address records of
+    a domain and its ``www`` subdomain are critical, TXT, CAA and TLSA records are bulk
+    changes and all other records are normal.
+
+    >>> classify("example.com", {"operation": "update", "new": {"name": "", "type": "A"}})
+    'critical'
+    >>> classify("example.com", {"operation": "delete", "existing": {"name": "example.com", "type": "TXT"}})
+    'bulk'
+
+    :param domain_name: domain name
+    :type domain_name: str
+    :param operation: planned operation
+    :type operation: dict
+    :returns: lane name
+    :rtype: str"""
+    new, existing = operation.get("new"), operation.get("existing")
+    if new is not None:
+        record, name = new, _normalize(utils.get_record_fqdn(domain_name, new))
+    elif existing is not None:
+        record, name = existing, _normalize(existing["name"])
+    else:
+        return "normal"
+    if record.get("type") in _ADDRESS_TYPES and name in [domain_name, "www." + domain_name]:
+        return "critical"
+    if record.get("type") in _BULK_TYPES:
+        return "bulk"
+    return "normal"
+
+
+class DependencyFailed(RuntimeError):
+    """Operation was not executed as an operation it depends on failed."""
+
+
+class OperationGraph:
+    """Dependencies between planned record operations of all domains derived from record content.
+
+    An operation waits for:
+
+    * creations and updates of address records of the host its new content points at, e.g.,
+      an MX or NS record for the address record of the mail or name server (glue records),
+    * deletions of records with the same name that a new CNAME record would conflict with,
+      and deletion of a CNAME record that a new record of another type would conflict with.
+
+    A deletion waits for updates that stop pointing at the deleted record. Operations that
+    depend on each other in a cycle are executed one after another in plan order.
+
+    Every operation is put in a priority lane, see :data:`LANES`, either the one given
+    for its domain or by :func:`classify`. Operations that others depend on are raised
+    to the highest lane of those, so that critical changes do not wait for bulk ones.
+
+    :param operations_plan: planned operations by domain name, None for skipped domains
+    :type operations_plan: dict
+    :param priorities: lane names by domain name, overriding the classification
+    :type priorities: dict"""
+
+    def __init__(self, operations_plan, priorities=None):
+        self.operations = [
+            (domain_name, operation)
+            for domain_name, operations in operations_plan.items()
+            if operations is not None
+            for operation in operations
+        ]
+        self.dependencies = [set() for _ in self.operations]
+
+        providers, deletions, leaving = {}, {}, {}
+        names = []
+        for i, (domain_name, operation) in enumerate(self.operations):
+            new, existing = operation.get("new"), operation.get("existing")
+            if new is not None:
+                name = _normalize(utils.get_record_fqdn(domain_name, new))
+                if new.get("type") in _ADDRESS_TYPES:
+                    providers.setdefault(name, []).append(i)
+                old_target, new_target = _target(existing), _target(new)
+                if old_target is not None and old_target != new_target:
+                    leaving.setdefault(old_target, []).append(i)
+            elif existing is not None:
+                name = _normalize(existing["name"])
+                deletions.setdefault(name, []).append(i)
+            else:
+                name = None
+            names.append(name)
+
+        for i, (_, operation) in enumerate(self.operations):
+            new = operation.get("new")
+            if new is not None:
+                self.dependencies[i].update(providers.get(_target(new), ()))
+                if operation.get("operation") == "create":
+                    for j in deletions.get(names[i], ()):
+                        # a CNAME record excludes any other record of the same name
+                        if new["type"] == "CNAME" or self.operations[j][1]["existing"]["type"] == "CNAME":
+                            self.dependencies[i].add(j)
+            elif names[i] is not None:
+                self.dependencies[i].update(leaving.get(names[i], ()))
+            self.dependencies[i].discard(i)
+
+        priorities = priorities or {}
+        self.lanes = [
+            LANES.index(priorities.get(domain_name) or classify(domain_name, operation))
+            for domain_name, operation in self.operations
+        ]
+
+        self._break_cycles()
+        self.dependents = [[] for _ in self.operations]
+        for i, dependencies in enumerate(self.dependencies):
+            for j in dependencies:
+                self.dependents[j].append(i)
+
+        # dependents come before their dependencies in reverse topological order
+        for i in reversed(self.order()):
+            for j in self.dependencies[i]:
+                self.lanes[j] = min(self.lanes[j], self.lanes[i])
+
+    def _break_cycles(self):
+        order = self._sort(self.dependencies)
+        if len(order) == len(self.operations):
+            return
+        # operations in cycles or depending on them only keep dependencies on earlier operations
+        sorted_ = set(order)
+        previous = None
+        for i in range(len(self.operations)):
+            if i not in sorted_:
+                self.dependencies[i] = {j for j in self.dependencies[i] if j in sorted_ or j < i}
+                if previous is not None:
+                    self.dependencies[i].add(previous)
+                previous = i
+
+    def _sort(self, dependencies):
+        # Kahn's algorithm, ready operations are taken by lane and in plan order
+        remaining = [len(x) for x in dependencies]
+        dependents = [[] for _ in dependencies]
+        for i, x in enumerate(dependencies):
+            for j in x:
+                dependents[j].append(i)
+        ready = [(self.lanes[i], i) for i, count in enumerate(remaining) if count == 0]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            _, i = heapq.heappop(ready)
+            order.append(i)
+            for j in dependents[i]:
+                remaining[j] -= 1
+                if remaining[j] == 0:
+                    heapq.heappush(ready, (self.lanes[j], j))
+        return order
+
+    def __len__(self):
+        return len(self.operations)
+
+    def order(self):
+        """Get operations in topological order, preferring higher lanes and plan order.
+
+        :returns: indices of operations
+        :rtype: list"""
+        return self._sort(self.dependencies)
+
+    def run(self, execute, jobs=1, deadline=None):
+        """Execute operations with up to ``jobs`` of them running concurrently, every one
+        as soon as all operations it depends on are done. Operations depending on a failed
+        one are not executed and fail with :class:`DependencyFailed`. A single job executes
+        operations in the calling thread in the order of :meth:`order`.
+
+        Ready operations of higher lanes are started first, but while operations of lower
+        lanes are ready, one of the jobs is left to them so that they keep going.
+
+        Once the deadline is exceeded no further operations are started, they fail with
+        :class:`porkbun_api_cli.budget.DeadlineExceeded`.
+
+        :param execute: function executing an operation, called with its domain name and the operation
+        :type execute: callable
+        :param jobs: number of concurrent operations
+        :type jobs: int
+        :param deadline: time budget of the run
+        :type deadline: porkbun_api_cli.budget.Deadline
+        :returns: generator of operation indices, results of ``execute`` and exceptions raised
+                  (None on success) in completion order
+        :rtype: generator"""
+        remaining = [len(x) for x in self.dependencies]
+        failed = set()
+        ready = [[] for _ in LANES]
+        for i, count in enumerate(remaining):
+            if count == 0:
+                ready[self.lanes[i]].append(i)
+        running = {}
+
+        def complete(i, error):
+            if error is not None:
+                failed.add(i)
+            for j in self.dependents[i]:
+                remaining[j] -= 1
+                if remaining[j] == 0:
+                    heapq.heappush(ready[self.lanes[j]], j)
+
+        def next_ready():
+            lanes = [lane for lane, x in enumerate(ready) if x]
+            lane = lanes[0]
+            if (
+                jobs > 1
+                and len(lanes) > 1
+                and len(running) == jobs - 1
+                and all(self.lanes[x] <= lane for x in running.values())
+            ):
+                lane = lanes[1]
+            i = heapq.heappop(ready[lane])
+            if deadline is not None and deadline.expired:
+                error = budget.DeadlineExceeded("not started before the deadline")
+            elif self.dependencies[i] & failed:
+                error = DependencyFailed("skipped as an operation it depends on failed")
+            else:
+                return i, None
+            complete(i, error)
+            return i, error
+
+        if jobs <= 1:
+            while any(ready):
+                i, error = next_ready()
+                result = None
+                if error is None:
+                    try:
+                        result = execute(*self.operations[i])
+                    except Exception as e:
+                        error = e
+                    complete(i, error)
+                yield i, result, error
+            return
+
+        from concurrent.futures import FIRST_COMPLETED
+        from concurrent.futures import ThreadPoolExecutor
+        from concurrent.futures import wait
+
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            while any(ready) or running:
+                while any(ready) and len(running) < jobs:
+                    i, error = next_ready()
+                    if error is not None:
+                        yield i, None, error
+                    else:
+                        running[executor.submit(execute, *self.operations[i])] = i
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in sorted(done, key=running.get):
+                    i = running.pop(future)
+                    error = future.exception()
+                    complete(i, error)
+                    yield i, None if error is not None else future.result(), error
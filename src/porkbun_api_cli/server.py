@@ -0,0 +1,395 @@
+import fnmatch
+import hmac
+import os
+import socketserver
+import stat
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+from . import codec
+from . import templates
+from . import utils
+from . import validate
+
+# largest request body accepted, a single record is far smaller
+MAX_BODY_SIZE = 64 * 1024
+
+# number of connections to the API kept open
+POOL_SIZE = 16
+
+
+def load_clients(config):
+    """Get clients allowed to set records from the ``server`` section of configuration:
+
+    :: code_block::yaml
+       server:
+         clients:
+           str: # client name, used in logs
+             token: str # secret sent by the client as ``Authorization: Bearer <token>``
+             records: list[str] # names the client may set records of, e.g., host.example.com, *.dyn.example.com
+         rate_limit: float # optional, API requests per second, 5 by default
+         cache_ttl: float # optional, seconds zones are cached for, 300 by default
+         coalesce_window: float # optional, seconds changes of the same record are coalesced for, 0 by default
+
+    :param config: configuration
+    :type config: dict
+    :returns: mapping of client names to their token and allowed name patterns
+    :rtype: dict"""
+    section = config.get("server")
+    if not isinstance(section, dict) or not isinstance(section.get("clients"), dict) or not section["clients"]:
+        raise ValueError("'server.clients' must be a mapping of client names to their 'token' and 'records'")
+
+    for field in ["rate_limit", "cache_ttl"]:
+        value = section.get(field, 1)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+            raise ValueError(f"'server.{field}' must be a positive number")
+    window = section.get("coalesce_window", 0)
+    if isinstance(window, bool) or not isinstance(window, (int, float)) or window < 0:
+        raise ValueError("'server.coalesce_window' must be a non-negative number of seconds")
+
+    clients = {}
+    tokens = set()
+    for name, client in section["clients"].items():
+        if not isinstance(client, dict) or not isinstance(client.get("token"), str) or len(client["token"]) < 16:
+            raise ValueError(f"client '{name}': 'token' must be a string of at least 16 characters")
+        if client["token"] in tokens:
+            raise ValueError(f"client '{name}': 'token' is already used by another client")
+        records = client.get("records")
+        if not isinstance(records, list) or not records or not all(isinstance(x, str) for x in records):
+            raise ValueError(f"client '{name}': 'records' must be a list of record names")
+        tokens.add(client["token"])
+        clients[name] = {"token": client["token"], "records": [x.rstrip(".").lower() for x in records]}
+    return clients
+
+
+class ZoneCache:
+    """Records of zones shared by all requests, retrieved once and kept up to date with the
+    changes made through the cache.
+
+    Concurrent requests for a zone that is not cached wait for a single retrieval. Changes
+    of records of the same name and type are serialized, so that concurrent requests do
+    not both create one, others are made concurrently. Zones are retrieved again once they
+    are older than ``max_age`` or a change failed, e.g., as a record was removed meanwhile.
+
+    :param api: API client
+    :type api: porkbun_api_cli.api.PorkbunAPI
+    :param max_age: seconds a retrieved zone is used for
+    :type max_age: float
+    :param clock: monotonic clock returning seconds
+    :type clock: callable"""
+
+    def __init__(self, api, max_age=300.0, clock=time.monotonic):
+        self.api = api
+        self.max_age = max_age
+        self.clock = clock
+        self._zones = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key):
+        with self._lock:
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+            return self._locks[key]
+
+    def _records(self, domain_name):
+        with self._key_lock(domain_name):
+            zone = self._zones.get(domain_name)
+            if zone is None or self.clock() - zone[0] > self.max_age:
+                zone = (self.clock(), list(self.api.iter_dns_records(domain_name)))
+                with self._lock:
+                    self._zones[domain_name] = zone
+            return zone[1]
+
+    def _apply(self, domain_name, record_id, fields):
+        # the zone may have been retrieved again meanwhile, changes go to the current one
+        with self._lock:
+            zone = self._zones.get(domain_name)
+            if zone is None:
+                return
+            entry = next((x for x in zone[1] if x["id"] == record_id), None)
+            if entry is None:
+                zone[1].append({"id": record_id, **fields})
+            else:
+                entry.update(fields)
+
+    def set_record(self, domain_name, record):
+        """Create a record or update the existing one of the same name and type unless it
+        already has the same content, TTL and priority.
+
+        :param domain_name: domain name
+        :type domain_name: str
+        :param record: DNS record with a subdomain name, TTL and priority as strings if given
+        :type record: dict
+        :returns: operation made: "create", "update" or "none"
+        :rtype: str
+        :raises RuntimeError: if the API fails"""
+        fqdn = utils.get_record_fqdn(domain_name, record)
+        with self._key_lock((domain_name, fqdn, record["type"])):
+            try:
+                records = self._records(domain_name)
+                with self._lock:
+                    existing = [dict(x) for x in records if x["name"] == fqdn and x["type"] == record["type"]]
+                if any(utils.compare_record_by_content_ttl_prio(record, x) for x in existing):
+                    return "none"
+
+                fields = {x: record[x] for x in ["content", "ttl", "prio"] if x in record}
+                if existing:
+                    self.api.update_record(domain_name, existing[0]["id"], record)
+                    self._apply(domain_name, existing[0]["id"], fields)
+                    return "update"
+                record_id = self.api.create_record(domain_name, record)
+                self._apply(domain_name, str(record_id), {"name": fqdn, "type": record["type"], **fields})
+                return "create"
+            except RuntimeError:
+                with self._lock:
+                    self._zones.pop(domain_name, None)
+                raise
+
+
+class _Batch:
+    def __init__(self, value):
+        self.value = value
+        self.version = 0
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class WriteCoalescer:
+    """Coalesce writes of the same key requested within a window of time into a single one.
+
+    The first request for a key waits for ``window`` seconds, requests for the same key
+    arriving meanwhile replace the value to write and wait along. Only the latest value is
+    then written, its request gets the result of the write and requests whose values were
+    replaced get "superseded". If the write fails, all requests fail with its exception.
+
+    :param write: function writing a value, called with the key and the value
+    :type write: callable
+    :param window: seconds requests for the same key are collected for
+    :type window: float
+    :param sleep: function waiting for a number of seconds
+    :type sleep: callable"""
+
+    def __init__(self, write, window, sleep=time.sleep):
+        self.write = write
+        self.window = window
+        self.sleep = sleep
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, value):
+        """Request a value to be written, waiting until it is.
+
+        :param key: key identifying what is written, e.g., domain, record name and type
+        :type key: hashable
+        :param value: value to write
+        :type value: any
+        :returns: result of the write or "superseded" if a later value was written instead
+        :rtype: any"""
+        with self._lock:
+            batch = self._pending.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._pending[key] = _Batch(value)
+            else:
+                batch.value = value
+                batch.version += 1
+            version = batch.version
+
+        if leader:
+            self.sleep(self.window)
+            with self._lock:
+                # later requests start a new batch, written after this one
+                del self._pending[key]
+            try:
+                batch.result = self.write(key, batch.value)
+            except Exception as e:
+                batch.error = e
+            batch.done.set()
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.result if version == batch.version else "superseded"
+
+
+class RecordService:
+    """Serve "set record" requests of local agents through a single API client.
+
+    Clients authenticate with a token and may only set records of names matching their
+    patterns, see :func:`load_clients`. Changes of the same record requested within
+    ``window`` seconds are coalesced, see :class:`WriteCoalescer`, and changes to the
+    content the record already has are not made at all, see :class:`ZoneCache`.
+
+    :param cache: zone cache making the changes
+    :type cache: ZoneCache
+    :param clients: clients by name
+    :type clients: dict
+    :param log: function called with the client name, the domain name, the record and the
+                operation made or the exception raised for every request
+    :type log: callable
+    :param window: seconds changes of the same record are coalesced for, 0 to make every change
+    :type window: float"""
+
+    def __init__(self, cache, clients, log=None, window=0.0):
+        self.cache = cache
+        self.clients = clients
+        self.log = log
+        self._coalescer = None
+        if window > 0:
+            self._coalescer = WriteCoalescer(lambda key, record: cache.set_record(key[0], record), window)
+
+    def authenticate(self, authorization):
+        """Get the name of the client sending a token.
+
+        :param authorization: value of the ``Authorization`` header
+        :type authorization: str
+        :returns: client name or None if the token is unknown
+        :rtype: str"""
+        scheme, _, token = (authorization or "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return None
+        result = None
+        # every token is compared to not give away which ones are close
+        for name, client in self.clients.items():
+            if hmac.compare_digest(client["token"].encode("utf-8"), token.strip().encode("utf-8")):
+                result = name
+        return result
+
+    def set_record(self, authorization, body):
+        """Handle a request setting a record, given as a JSON object with ``domain``, ``name``,
+        ``type``, ``content`` and optionally ``ttl`` and ``prio`` fields.
+
+        :param authorization: value of the ``Authorization`` header
+        :type authorization: str
+        :param body: request body
+        :type body: bytes
+        :returns: HTTP status code and response with ``status`` and ``operation`` ("create", "update",
+                  "none" or "superseded") or ``message`` fields
+        :rtype: tuple"""
+        client = self.authenticate(authorization)
+        if client is None:
+            return 401, {"status": "ERROR", "message": "invalid token"}
+
+        try:
+            request = codec.loads(body)
+        except ValueError:
+            return 400, {"status": "ERROR", "message": "malformed JSON"}
+        if not isinstance(request, dict):
+            return 400, {"status": "ERROR", "message": "request must be a JSON object"}
+
+        domain_name = request.get("domain")
+        if not validate.is_domain_name(domain_name):
+            return 400, {"status": "ERROR", "message": "'domain' must be a domain name"}
+        domain_name = domain_name.lower()
+        record = {x: request[x] for x in ["name", "type", "content", "ttl", "prio"] if request.get(x) is not None}
+        problems = validate.check_record(record)
+        if not problems and any(templates.has_placeholders(x) for x in record.values()):
+            problems = ["placeholders are not supported"]
+        if problems:
+            return 400, {"status": "ERROR", "message": "; ".join(problems)}
+        # the API returns TTL and priority as strings
+        record.update({x: str(record[x]) for x in ["ttl", "prio"] if x in record})
+        record["name"] = record["name"].lower()
+
+        fqdn = utils.get_record_fqdn(domain_name, record)
+        if not any(fnmatch.fnmatchcase(fqdn, x) for x in self.clients[client]["records"]):
+            return 403, {"status": "ERROR", "message": f"client '{client}' may not set records of '{fqdn}'"}
+
+        try:
+            if self._coalescer is not None:
+                operation = self._coalescer.submit((domain_name, fqdn, record["type"]), record)
+            else:
+                operation = self.cache.set_record(domain_name, record)
+        except RuntimeError as e:
+            if self.log is not None:
+                self.log(client, domain_name, record, e)
+            return 502, {"status": "ERROR", "message": str(e)}
+        if self.log is not None:
+            self.log(client, domain_name, record, operation)
+        return 200, {"status": "SUCCESS", "operation": operation}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # agents may keep their connection open for further requests
+    protocol_version = "HTTP/1.1"
+
+    def _respond(self, code, response):
+        data = codec.dumps(response)
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/records":
+            self._respond(404, {"status": "ERROR", "message": f"unknown path '{self.path}'"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            length = -1
+        if length < 0 or length > MAX_BODY_SIZE:
+            self.close_connection = True
+            self._respond(411 if length < 0 else 413, {"status": "ERROR", "message": "invalid request body size"})
+            return
+        body = self.rfile.read(length)
+        self._respond(*self.server.service.set_record(self.headers.get("Authorization"), body))
+
+    def log_message(self, format, *args):
+        # requests are logged by the service
+        pass
+
+
+class _TCPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def server_bind(self):
+        # a socket left behind by a previous server is replaced, any other file is not
+        try:
+            if stat.S_ISSOCK(os.stat(self.server_address).st_mode):
+                os.unlink(self.server_address)
+        except FileNotFoundError:
+            pass
+        super().server_bind()
+        # only the owner and their group may connect
+        os.chmod(self.server_address, 0o660)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.server_address)
+        except FileNotFoundError:
+            pass
+
+
+def create_server(service, port=None, socket_path=None):
+    """Create a server listening on a Unix socket or on a port of localhost, started with
+    ``serve_forever``. Requests ``POST /records`` are handled by
+    :meth:`RecordService.set_record`.
+
+    :param service: service handling requests
+    :type service: RecordService
+    :param port: port of localhost to listen on, 0 for any free one
+    :type port: int
+    :param socket_path: path of a Unix socket to listen on instead
+    :type socket_path: str
+    :returns: server
+    :rtype: socketserver.BaseServer"""
+    if socket_path is not None:
+        server = _UnixServer(socket_path, _Handler)
+    else:
+        server = _TCPServer(("127.0.0.1", port or 0), _Handler)
+    server.service = service
+    return server
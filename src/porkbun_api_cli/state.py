@@ -0,0 +1,64 @@
+import json
+import os
+
+
+class ZoneState:
+    """Persistent record of zones that were found in sync with the configuration.
+
+    For every domain the fingerprint of the retrieved zone is stored next to the
+    fingerprint of the desired state (configured records and operation mode). When
+    both fingerprints match on a later run, the domain needs no changes and
+    planning can be skipped.
+
+    :param state_dir: directory holding the state file
+    :type state_dir: str"""
+
+    FILENAME = "zones.json"
+
+    def __init__(self, state_dir):
+        self.path = os.path.join(state_dir, self.FILENAME)
+        try:
+            with open(self.path, "r", encoding="utf-8") as state_file:
+                self._zones = json.load(state_file)
+        except FileNotFoundError:
+            self._zones = {}
+        except ValueError:
+            # a corrupt state only costs a full planning run
+            self._zones = {}
+        self._dirty = False
+
+    def unchanged(self, domain_name, zone, desired):
+        """Check whether a zone and the desired state match the ones stored on a previous run.
+
+        :param domain_name: domain name
+        :type domain_name: str
+        :param zone: fingerprint of the retrieved zone
+        :type zone: str
+        :param desired: fingerprint of the desired state
+        :type desired: str
+        :returns: True if both fingerprints match the stored ones, False otherwise
+        :rtype: bool"""
+        return zone is not None and self._zones.get(domain_name) == {"zone": zone, "desired": desired}
+
+    def update(self, domain_name, zone, desired):
+        """Store fingerprints of a zone that is in sync with the desired state."""
+        entry = {"zone": zone, "desired": desired}
+        if self._zones.get(domain_name) != entry:
+            self._zones[domain_name] = entry
+            self._dirty = True
+
+    def discard(self, domain_name):
+        """Forget a domain, e.g., after its zone was found out of sync."""
+        if self._zones.pop(domain_name, None) is not None:
+            self._dirty = True
+
+    def save(self):
+        """Write the state file if anything has changed."""
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as state_file:
+            json.dump(self._zones, state_file, sort_keys=True)
+        os.replace(temp_path, self.path)
+        self._dirty = False
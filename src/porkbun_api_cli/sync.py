@@ -0,0 +1,184 @@
+import threading
+
+from . import budget
+from . import engine
+from . import templates
+from . import utils
+
+MODES = ["append", "replace", "update", "upgrade"]
+
+# log events are emitted at levels 0 and above only
+_QUIET = -1
+
+
+class OperationResult:
+    """Outcome of a planned record operation.
+
+    :param domain: domain name
+    :type domain: str
+    :param operation: "create", "update" or "delete"
+    :type operation: str
+    :param record: new record, the existing one for deletions
+    :type record: dict
+    :param status: "planned" in a dry run, otherwise "applied", "failed", "skipped" for operations
+                   that are not implemented or depend on a failed one or "not_attempted" for
+                   operations that can be resumed by running again
+    :type status: str
+    :param error: exception that made the operation fail or not be attempted
+    :type error: Exception"""
+
+    def __init__(self, domain, operation, record, status, error=None):
+        self.domain = domain
+        self.operation = operation
+        self.record = record
+        self.status = status
+        self.error = error
+
+    def __repr__(self):
+        return (
+            f"OperationResult({self.domain!r}, {self.operation!r}, {self.record.get('type')}-record"
+            f" {self.record.get('name')!r}, {self.status!r})"
+        )
+
+
+class SyncResult:
+    """Outcome of synchronizing DNS records with configuration.
+
+    :param operations: results of planned operations in plan order
+    :type operations: list
+    :param skipped: reasons by name of domains that were not synchronized, e.g., if their
+                    records could not be retrieved
+    :type skipped: dict"""
+
+    def __init__(self, operations, skipped):
+        self.operations = operations
+        self.skipped = skipped
+
+    def by_status(self, status):
+        """Get results of operations with a status.
+
+        :param status: operation status, see :class:`OperationResult`
+        :type status: str
+        :rtype: list"""
+        return [x for x in self.operations if x.status == status]
+
+    @property
+    def ok(self):
+        """True if all domains were retrieved and no operation failed or was left out."""
+        return not self.skipped and all(x.status in ["planned", "applied"] for x in self.operations)
+
+    def __repr__(self):
+        counts = {}
+        for x in self.operations:
+            counts[x.status] = counts.get(x.status, 0) + 1
+        return f"SyncResult({counts}, skipped={sorted(self.skipped)})"
+
+
+class _ReportedIP:
+    """IP address reported by the API for the ``{{ip}}`` variable, queried once on first use."""
+
+    def __init__(self, api):
+        self._api = api
+        self._lock = threading.Lock()
+        self._ip = None
+        self.error = None
+
+    def __str__(self):
+        with self._lock:
+            if self._ip is None and self.error is None:
+                try:
+                    self._ip = self._api.get_my_ip()
+                except RuntimeError as e:
+                    self.error = e
+            if self.error is not None:
+                raise self.error
+        return self._ip
+
+
+def sync(config, api, mode="append", dry_run=False, jobs=1, targeted_lookups=3, deadline=None, ip=None):
+    """Synchronize DNS records with configuration in-process, like the ``sync`` command but without
+    any output or confirmation.
+
+    The configuration is best loaded once with :func:`porkbun_api_cli.utils.load_config` and
+    passed in along with a long-lived API client: compiled templates memoize their expansion
+    and the client keeps its connections, so repeated calls are cheap. The client may be shared
+    by calls in concurrent threads, each call applies its deadline to its own requests only.
+
+    :param config: configuration loaded by :func:`porkbun_api_cli.utils.load_config` or path of its file
+    :type config: dict or str
+    :param api: API client
+    :type api: porkbun_api_cli.api.PorkbunAPI
+    :param mode: operation mode: "append", "replace", "update" or "upgrade"
+    :type mode: str
+    :param dry_run: only plan operations
+    :type dry_run: bool
+    :param jobs: number of concurrent API requests
+    :type jobs: int
+    :param targeted_lookups: retrieve records by name and type for domains configuring at most this
+                             many of them, 0 disables
+    :type targeted_lookups: int
+    :param deadline: time budget in seconds, no further requests are made once it is used up
+    :type deadline: float
+    :param ip: value of the ``{{ip}}`` variable, queried from the API when first used if None
+    :type ip: str
+    :returns: results of all planned operations
+    :rtype: SyncResult
+    :raises ValueError: if the mode or the configuration is invalid
+    :raises RuntimeError: if the API fails to report the IP address used by templates"""
+    if mode not in MODES:
+        raise ValueError(f"unsupported mode '{mode}', expected one of: {', '.join(MODES)}")
+    if isinstance(config, str):
+        config = utils.load_config(config)
+
+    domain_entries = config["domains"]
+    domain_names = [entry["name"] for entry in domain_entries]
+    run_deadline = None if deadline is None else budget.Deadline(deadline)
+    if run_deadline is not None:
+        api = api.with_deadline(run_deadline)
+    if ip is None:
+        ip = _ReportedIP(api)
+    config_domains = templates.ConfigDomains(
+        domain_entries, config.get("templates"), {**(config.get("vars") or {}), "ip": ip}
+    )
+
+    errors = {}
+    name_types = engine.select_targeted_lookups(mode, config_domains, targeted_lookups)
+    existing_domains = engine.collect_existing_dns_records(
+        api, domain_names, _QUIET, name_types=name_types, jobs=jobs, errors=errors
+    )
+    # an IP address that could not be reported fails every domain using it
+    if isinstance(ip, _ReportedIP) and ip.error is not None:
+        raise ip.error
+
+    operations_plan = engine.plan_operations(mode, _QUIET, existing_domains, config_domains)
+    skipped = {
+        name: f"querying existing records failed: {errors.get(name)}"
+        for name, operations in operations_plan.items()
+        if operations is None
+    }
+
+    if dry_run:
+        outcomes = [
+            (domain_name, operation, "planned", None)
+            for domain_name, operations in operations_plan.items()
+            if operations is not None
+            for operation in operations
+        ]
+    else:
+        priorities = {entry["name"]: entry["priority"] for entry in domain_entries if entry.get("priority")}
+        outcomes = engine.execute_operations_plan(
+            api, _QUIET, operations_plan, jobs=jobs, priorities=priorities, deadline=run_deadline
+        )
+
+    # report operations in plan order
+    order = {
+        id(operation): i
+        for i, operation in enumerate(
+            operation for operations in operations_plan.values() if operations is not None for operation in operations
+        )
+    }
+    operations = []
+    for domain_name, operation, status, error in sorted(outcomes, key=lambda x: order[id(x[1])]):
+        record, _ = engine.describe_operation(domain_name, operation)
+        operations.append(OperationResult(domain_name, operation["operation"], record, status, error))
+    return SyncResult(operations, skipped)
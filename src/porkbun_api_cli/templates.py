@@ -0,0 +1,184 @@
+import re
+from collections.abc import Mapping
+
+_PLACEHOLDER = re.compile(r"\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}")
+
+# variables provided for every domain
+BUILTIN_VARIABLES = ["domain", "ip"]
+
+
+def has_placeholders(value):
+    """Check if a value is a string with ``{{variable}}`` placeholders.
+
+    >>> has_placeholders("v=spf1 mx {{spf}}"), has_placeholders("v=spf1 mx -all"), has_placeholders(600)
+    (True, False, False)
+
+    :param value: value to check
+    :type value: object
+    :rtype: bool"""
+    return isinstance(value, str) and _PLACEHOLDER.search(value) is not None
+
+
+class _Text:
+    """String with placeholders split into literal parts and variable names."""
+
+    def __init__(self, value):
+        self.parts = []
+        pos = 0
+        for match in _PLACEHOLDER.finditer(value):
+            if match.start() > pos:
+                self.parts.append((value[pos : match.start()], None))
+            self.parts.append((None, match.group(1)))
+            pos = match.end()
+        if pos < len(value):
+            self.parts.append((value[pos:], None))
+
+    @property
+    def variables(self):
+        return {name for _, name in self.parts if name is not None}
+
+    def render(self, values):
+        return "".join(literal if name is None else str(values[name]) for literal, name in self.parts)
+
+
+class RecordTemplate:
+    """Named set of DNS records that may contain ``{{variable}}`` placeholders.
+
+    Records are compiled once: strings with placeholders are split up so that
+    expanding them only joins their parts. Expanded records are memoized by
+    the values of used variables, domains sharing these values share the
+    same expanded records.
+
+    :param name: template name
+    :type name: str
+    :param records: DNS records
+    :type records: list
+    :param defaults: default values of variables
+    :type defaults: dict"""
+
+    def __init__(self, name, records, defaults=None):
+        self.name = name
+        self.defaults = dict(defaults or {})
+        self._records = []
+        variables = set()
+        for record in records:
+            compiled = {}
+            for key, value in record.items():
+                if isinstance(value, str) and _PLACEHOLDER.search(value):
+                    value = _Text(value)
+                    variables |= value.variables
+                compiled[key] = value
+            self._records.append(compiled)
+        self.variables = sorted(variables)
+        self._cache = {}
+
+    def expand(self, variables):
+        """Expand placeholders in template records.
+
+        :param variables: values of variables, take precedence over template defaults
+        :type variables: dict
+        :returns: DNS records, must not be modified
+        :rtype: list"""
+        values = {}
+        for name in self.variables:
+            if name in variables:
+                values[name] = variables[name]
+            elif name in self.defaults:
+                values[name] = self.defaults[name]
+            else:
+                raise ValueError(f"template '{self.name}': variable '{name}' is not defined")
+
+        # placeholders render values as strings, so are the cache keys
+        key = tuple(str(values[name]) for name in self.variables)
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+
+        records = [
+            {field: value.render(values) if isinstance(value, _Text) else value for field, value in record.items()}
+            for record in self._records
+        ]
+        self._cache[key] = records
+        return records
+
+
+def compile_templates(config_templates):
+    """Compile and validate record-set templates from configuration.
+
+    :param config_templates: mapping of template names to templates with ``records`` and optional ``vars``
+    :type config_templates: dict
+    :returns: mapping of template names to compiled templates
+    :rtype: dict"""
+    if not isinstance(config_templates, dict):
+        raise ValueError("'templates' must be a mapping of template names to templates")
+
+    result = {}
+    for name, template in config_templates.items():
+        if not isinstance(template, dict) or not isinstance(template.get("records"), list):
+            raise ValueError(f"template '{name}': list of 'records' not found")
+        for record in template["records"]:
+            if not isinstance(record, dict) or any(x not in record for x in ["name", "type", "content"]):
+                raise ValueError(f"template '{name}': records require 'name', 'type' and 'content' fields")
+        result[name] = RecordTemplate(name, template["records"], template.get("vars"))
+    return result
+
+
+def check_includes(domains, templates, variables=None):
+    """Check that templates included by domains exist and all their variables are defined.
+
+    :param domains: domain entries from configuration
+    :type domains: list
+    :param templates: compiled templates
+    :type templates: dict
+    :param variables: names of variables defined for all domains
+    :type variables: iterable"""
+    defined = {*BUILTIN_VARIABLES, *(variables or [])}
+    for entry in domains:
+        for template_name in entry.get("include") or []:
+            if template_name not in templates:
+                raise ValueError(f"domain '{entry['name']}': template '{template_name}' not found")
+            template = templates[template_name]
+            missing = set(template.variables) - defined - set(template.defaults) - set(entry.get("vars") or {})
+            if missing:
+                raise ValueError(
+                    f"domain '{entry['name']}': template '{template_name}' requires undefined variables: "
+                    + ", ".join(sorted(missing))
+                )
+
+
+class ConfigDomains(Mapping):
+    """Read-only mapping of configured domain names to their DNS records.
+
+    Records of templates included by a domain are expanded on access and appended
+    to records listed for the domain explicitly, nothing is kept per domain.
+
+    :param domains: domain entries from configuration
+    :type domains: list
+    :param templates: compiled templates
+    :type templates: dict
+    :param variables: values of variables defined for all domains
+    :type variables: dict"""
+
+    def __init__(self, domains, templates=None, variables=None):
+        self._entries = {entry["name"]: entry for entry in domains}
+        self._templates = templates or {}
+        self._variables = variables or {}
+
+    def __getitem__(self, domain_name):
+        entry = self._entries[domain_name]
+        records = entry.get("records") or []
+        if not entry.get("include"):
+            return records
+
+        records = list(records)
+        variables = {**self._variables, "domain": domain_name, **(entry.get("vars") or {})}
+        for template_name in entry["include"]:
+            records.extend(self._templates[template_name].expand(variables))
+        return records
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
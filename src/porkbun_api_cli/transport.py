@@ -0,0 +1,341 @@
+import json
+import threading
+import time
+
+from . import codec
+
+
+class TransportError(Exception):
+    """Request failed on the transport level, e.g., the connection was lost."""
+
+
+class RequestsTransport:
+    """Default transport sending every request with ``requests``.
+
+    Connections are kept open in a session created on the first request and reused by
+    later ones, also across runs of a long-lived client, until the transport is closed.
+
+    :param pool_size: number of connections kept open per host, ``requests``' default if None
+    :type pool_size: int"""
+
+    def __init__(self, pool_size=None):
+        self.pool_size = pool_size
+        self._session = None
+        self._lock = threading.Lock()
+
+    def _get_session(self):
+        with self._lock:
+            if self._session is None:
+                import requests
+
+                self._session = requests.Session()
+                if self.pool_size is not None:
+                    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    self._session.mount("http://", adapter)
+                    self._session.mount("https://", adapter)
+            return self._session
+
+    def post(self, url, data, headers, stream=False, timeout=None):
+        """Send a POST request.
+
+        :param url: request URL
+        :type url: str
+        :param data: request body
+        :type data: bytes
+        :param headers: request headers
+        :type headers: dict
+        :param stream: do not read the response body before returning
+        :type stream: bool
+        :param timeout: connect and read timeouts in seconds, None to wait forever
+        :type timeout: tuple
+        :returns: response
+        :rtype: requests.Response"""
+        return self._get_session().post(url, data=data, headers=headers, stream=stream, timeout=timeout)
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+class _BufferedResponse:
+    """Response with a body held in memory, served in chunks when streamed."""
+
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+    def iter_content(self, chunk_size=None):
+        chunk_size = chunk_size or len(self.content) or 1
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i : i + chunk_size]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _wrap_error(error):
+    import httpx
+
+    if isinstance(error, httpx.HTTPError):
+        return TransportError(str(error) or type(error).__name__)
+    return error
+
+
+class _Response:
+    """Response of :class:`HTTP2Transport` with the parts of the ``requests.Response``
+    interface used by :class:`porkbun_api_cli.api.PorkbunAPI`."""
+
+    def __init__(self, transport, response):
+        self._transport = transport
+        self._response = response
+        self.status_code = response.status_code
+
+    @property
+    def content(self):
+        return self._transport._run(self._response.aread())
+
+    def iter_content(self, chunk_size=None):
+        chunks = self._response.aiter_bytes(chunk_size)
+        while True:
+            try:
+                yield self._transport._run(chunks.__anext__())
+            except StopAsyncIteration:
+                return
+
+    def close(self):
+        self._transport._run(self._response.aclose())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class HTTP2Transport:
+    """Transport multiplexing concurrent requests over a single HTTP/2 connection
+    per host, requires the ``http2`` extra (``httpx`` with ``h2``).
+
+    The connection state of HTTP/2 is shared by all requests, so it is only ever
+    touched by a single thread: requests made from any thread are handed over to
+    an event loop running in a background thread, started on the first request.
+    HTTP/2 is negotiated with TLS and servers without support fall back to
+    HTTP/1.1, plain ``http://`` servers, e.g., local ones, have to be spoken to
+    with prior knowledge.
+
+    :param prior_knowledge: speak HTTP/2 without negotiation, required for ``http://`` URLs
+    :type prior_knowledge: bool
+    :param max_connections: maximum number of connections to keep open
+    :type max_connections: int"""
+
+    def __init__(self, prior_knowledge=False, max_connections=1):
+        from importlib.util import find_spec
+
+        # fail early instead of on the first request
+        if find_spec("httpx") is None or find_spec("h2") is None:
+            raise ImportError("HTTP/2 transport requires 'httpx' and 'h2', install the 'http2' extra")
+        self.prior_knowledge = prior_knowledge
+        self.max_connections = max_connections
+        self._loop = None
+        self._thread = None
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._loop is None:
+                import asyncio
+
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="http2-transport", daemon=True)
+                self._thread.start()
+                self._client = self._run(self._create_client())
+
+    async def _create_client(self):
+        import socket
+
+        import httpx
+
+        return httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(
+                http1=not self.prior_knowledge,
+                http2=True,
+                limits=httpx.Limits(max_connections=self.max_connections),
+                # request headers and body go out in separate frames, do not let
+                # Nagle's algorithm hold back the latter, like ``urllib3`` does
+                socket_options=[(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)],
+            ),
+            timeout=None,
+        )
+
+    def _run(self, coroutine):
+        import asyncio
+
+        try:
+            return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+        except Exception as e:
+            error = _wrap_error(e)
+            # other errors are raised as they are, not as their own cause
+            if error is e:
+                raise
+            raise error from e
+
+    def post(self, url, data, headers, stream=False, timeout=None):
+        """Send a POST request.
+
+        :param url: request URL
+        :type url: str
+        :param data: request body
+        :type data: bytes
+        :param headers: request headers
+        :type headers: dict
+        :param stream: do not read the response body before returning
+        :type stream: bool
+        :param timeout: connect and read timeouts in seconds, None to wait forever
+        :type timeout: tuple
+        :returns: response
+        :rtype: _Response"""
+        import httpx
+
+        self._start()
+        if timeout is not None:
+            # waiting for a stream of the shared connection counts as connecting
+            timeout = httpx.Timeout(connect=timeout[0], read=timeout[1], write=timeout[1], pool=timeout[0])
+        request = self._client.build_request("POST", url, content=data, headers=headers, timeout=timeout)
+        response = _Response(self, self._run(self._client.send(request, stream=True)))
+        if not stream:
+            with response:
+                response.content
+        return response
+
+    def close(self):
+        """Close open connections and stop the event loop."""
+        with self._lock:
+            if self._loop is None:
+                return
+            try:
+                self._run(self._client.aclose())
+            finally:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join()
+                self._loop.close()
+                self._loop = self._thread = self._client = None
+
+
+# request fields that are never written to a cassette
+SCRUBBED_FIELDS = ["apikey", "secretapikey"]
+
+
+def _cassette_key(url, data):
+    """Identify a request by the path of its URL and its body without credentials, so that
+    a cassette can be replayed against any endpoint and with any credentials."""
+    from urllib.parse import urlsplit
+
+    try:
+        payload = codec.loads(data) if data else {}
+    except ValueError:
+        payload = {}
+    if isinstance(payload, dict):
+        payload = {k: v for k, v in payload.items() if k not in SCRUBBED_FIELDS}
+    return urlsplit(url).path, payload
+
+
+class RecordingTransport:
+    """Transport passing requests on to another one and recording them along with their
+    responses to a cassette, see :class:`ReplayTransport`.
+
+    A cassette is a gzip compressed file of JSON lines, one per request, holding the
+    path of the request URL, the request body without credentials, the status code,
+    the response body and the time it took. Responses are read as a whole before they
+    are handed out, even if streaming was requested.
+
+    :param inner: transport sending the requests
+    :type inner: object
+    :param path: path of the cassette file
+    :type path: str"""
+
+    def __init__(self, inner, path):
+        import gzip
+
+        self.inner = inner
+        self.path = path
+        self._file = gzip.open(path, "wb")
+        self._lock = threading.Lock()
+
+    def post(self, url, data, headers, stream=False, timeout=None):
+        start = time.perf_counter()
+        with self.inner.post(url, data, headers, stream=stream, timeout=timeout) as response:
+            status_code, content = response.status_code, response.content
+        elapsed = time.perf_counter() - start
+
+        endpoint, payload = _cassette_key(url, data)
+        entry = {
+            "endpoint": endpoint,
+            "payload": payload,
+            "status": status_code,
+            "body": content.decode("utf-8", errors="replace"),
+            "elapsed": round(elapsed, 6),
+        }
+        with self._lock:
+            self._file.write(codec.dumps(entry) + b"\n")
+        return _BufferedResponse(status_code, content)
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+        self.inner.close()
+
+
+class ReplayTransport:
+    """Transport serving responses from a cassette written by :class:`RecordingTransport`
+    without any network access.
+
+    Requests are matched by URL path and body without credentials. Responses recorded
+    for the same request are served in their recorded order, the last one is repeated
+    once they are used up. Requests that were not recorded fail with :class:`TransportError`.
+
+    :param path: path of the cassette file
+    :type path: str
+    :param latency: delay of every response: None for no delay, "recorded" for the
+                    recorded time or number of seconds
+    :type latency: None, str or float"""
+
+    def __init__(self, path, latency=None):
+        import gzip
+
+        if latency is not None and latency != "recorded" and not isinstance(latency, (int, float)):
+            raise ValueError(f"unsupported replay latency '{latency}'")
+        self.latency = latency
+        self._responses = {}
+        self._lock = threading.Lock()
+        with gzip.open(path, "rb") as cassette:
+            for line in cassette:
+                entry = codec.loads(line)
+                key = (entry["endpoint"], json.dumps(entry["payload"], sort_keys=True))
+                self._responses.setdefault(key, []).append(entry)
+
+    def post(self, url, data, headers, stream=False, timeout=None):
+        endpoint, payload = _cassette_key(url, data)
+        with self._lock:
+            entries = self._responses.get((endpoint, json.dumps(payload, sort_keys=True)))
+            if not entries:
+                raise TransportError(f"no recorded response for '{endpoint}'")
+            entry = entries.pop(0) if len(entries) > 1 else entries[0]
+
+        if self.latency == "recorded":
+            time.sleep(entry["elapsed"])
+        elif self.latency:
+            time.sleep(self.latency)
+        return _BufferedResponse(entry["status"], entry["body"].encode("utf-8"))
+
+    def close(self):
+        pass
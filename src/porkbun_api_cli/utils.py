@@ -1,4 +1,8 @@
-import yaml
+import hashlib
+import json
+
+from . import templates
+from . import validate
 
 
 def compare_record_by_content_ttl_prio(target, other):
@@ -32,8 +36,7 @@ def compare_record_by_name_type(domain_name, target, other):
     :type other: dict
     :returns: True if respective subfields are equal, False otherwise
     :rtype: bool"""
-    target_fqdn = f"{target['name']}.{domain_name}" if len(target["name"]) else domain_name
-    return target_fqdn == other["name"] and target["type"] == other["type"]
+    return get_record_fqdn(domain_name, target) == other["name"] and target["type"] == other["type"]
 
 
 def operation_allowed_by_mode(operation, mode):
@@ -61,7 +64,120 @@ def operation_allowed_by_mode(operation, mode):
     return False
 
 
-def load_config(config_file_path):
+class RecordsFingerprint:
+    """Incremental fingerprint of a set of DNS records that does not depend on their order.
+
+    Every record is hashed on its own and the hashes are summed up, so records can
+    be added one by one as they are received without keeping them around."""
+
+    def __init__(self, *extra):
+        self._sum = 0
+        self._count = 0
+        self._extra = hashlib.sha256("\0".join(extra).encode("utf-8")).hexdigest()
+
+    def add(self, record):
+        """Add a record to the fingerprint.
+
+        :param record: DNS record
+        :type record: dict"""
+        entry = json.dumps(record, sort_keys=True, default=str).encode("utf-8")
+        self._sum = (self._sum + int.from_bytes(hashlib.sha256(entry).digest(), "big")) % (1 << 256)
+        self._count += 1
+
+    def hexdigest(self):
+        """Get the fingerprint.
+
+        :returns: hex digest of the fingerprint
+        :rtype: str"""
+        return hashlib.sha256(f"{self._extra}:{self._count}:{self._sum:064x}".encode("utf-8")).hexdigest()
+
+
+def fingerprint_records(records, *extra):
+    """Compute a stable fingerprint of a set of DNS records that does not depend on their order.
+
+    :param records: DNS records
+    :type records: iterable
+    :param extra: additional values included in the fingerprint, e.g., operation mode
+    :type extra: str
+    :returns: hex digest of the fingerprint
+    :rtype: str"""
+    fingerprint = RecordsFingerprint(*extra)
+    for record in records:
+        fingerprint.add(record)
+    return fingerprint.hexdigest()
+
+
+def get_record_fqdn(domain_name, record):
+    """Get fully qualified domain name of a record from current configuration.
+
+    :param domain_name: domain name
+    :type domain_name: str
+    :param record: DNS record with a subdomain name
+    :type record: dict
+    :returns: fully qualified domain name
+    :rtype: str"""
+    return f"{record['name']}.{domain_name}" if len(record["name"]) else domain_name
+
+
+def get_record_subdomain(domain_name, record):
+    """Get subdomain name of an existing record returned by the API, the inverse of :func:`get_record_fqdn`.
+
+    >>> get_record_subdomain("example.com", {"name": "www.example.com"})
+    'www'
+
+    :param domain_name: domain name
+    :type domain_name: str
+    :param record: DNS record with a fully qualified domain name
+    :type record: dict
+    :returns: subdomain name, empty for the domain itself
+    :rtype: str"""
+    if record["name"] == domain_name:
+        return ""
+    suffix = "." + domain_name
+    if not record["name"].endswith(suffix):
+        raise ValueError(f"record name '{record['name']}' is not within domain '{domain_name}'")
+    return record["name"][: -len(suffix)]
+
+
+def export_domain_entry(domain_name, records):
+    """Convert existing DNS records returned by the API to a domain entry of the configuration,
+    see :func:`load_config`. Fields compared while planning are kept as returned by the API,
+    so that the entry matches the records it was created from.
+
+    :param domain_name: domain name
+    :type domain_name: str
+    :param records: existing DNS records
+    :type records: iterable
+    :returns: domain entry
+    :rtype: dict"""
+    config_records = []
+    for record in records:
+        entry = {
+            "name": get_record_subdomain(domain_name, record),
+            "type": record["type"],
+            "content": record["content"],
+        }
+        for field in ["ttl", "prio"]:
+            if record.get(field) is not None:
+                entry[field] = record[field]
+        config_records.append(entry)
+    return {"name": domain_name, "records": config_records}
+
+
+def index_records_by_name_type(records):
+    """Index existing DNS records returned by the API by their name and type.
+
+    :param records: existing DNS records
+    :type records: iterable
+    :returns: dictionary mapping pairs of fqdn and type to lists of records
+    :rtype: dict"""
+    index = {}
+    for record in records:
+        index.setdefault((record["name"], record["type"]), []).append(record)
+    return index
+
+
+def load_config(config_file_path, warnings=None):
     """Load configuration from a YAML file with following format:
 
     :: code_block::yaml
@@ -69,22 +185,72 @@ def load_config(config_file_path):
          endpoint: str # API endpoint URI
          apikey: str # API key
          secretapikey: str # secret API key
+         http2: bool # optional, multiplex requests over a single HTTP/2 connection
+         connect_timeout: float # optional, seconds to wait for a connection, 10 by default
+         read_timeout: float # optional, seconds to wait for response data, 60 by default
+
+       vars: # optional, variables available to all templates
+         str: str
+
+       templates: # optional, named record sets shared by domains
+         str:
+           vars: # optional, default values of variables
+             str: str
+           records:
+             - name: str
+               type: str
+               content: str # may contain placeholders, e.g., "{{ip}}"
+
+       server: # optional, clients of the serve command, see :func:`porkbun_api_cli.server.load_clients`
+         ...
+
+       defaults: # optional, records of domains not listed below, see --all-domains
+         include: list[str]
+         vars:
+           str: str
+         priority: str
+         records:
+           - ...
 
        domains:
          - name: str
+           include: list[str] # optional, names of templates to include
+           vars: # optional, values of template variables for this domain
+             str: str
+           priority: enum[critical, normal, bulk] # optional, lane of changes, by record type and name otherwise
            records:
              - name: str # subdomain name, e.g., "", www, mail, etc
-               type: enum[A, AAAA, CNAME, MX, NS, PTR, SRV, SOA, TXT, CAA, DS, DNSKEY]
+               type: enum[A, AAAA, ALIAS, CAA, CNAME, HTTPS, MX, NS, SRV, SVCB, TLSA, TXT]
                content: str # record value, e.g. IP address
+               ttl: int # optional, at least 600
+               prio: int # optional
+
+    Template placeholders ``{{name}}`` are replaced with values of variables defined
+    for the domain, globally or as template defaults, in that order of precedence.
+    Variables ``domain`` (domain name) and ``ip`` (IP address reported by the API)
+    are always defined. Templates are compiled and validated once while loading.
+
+    All records are validated before any request is made, every problem found is
+    reported at once with its location in the file, see :func:`porkbun_api_cli.validate.validate_config`.
+    Identical records are dropped with a warning.
 
     :param config_file_path: path to configuration file
     :type config_file_path: str
+    :param warnings: list to append warnings about dropped records to
+    :type warnings: list
     :returns: dictionary with configuration
     :rtype: dict"""
 
+    import yaml
+
     # Load the YAML configuration file
     with open(config_file_path, "r", encoding="utf-8") as config_file:
-        config = yaml.safe_load(config_file)
+        # prefer the faster LibYAML based loader when available
+        loader = validate.line_tracking_loader(getattr(yaml, "CSafeLoader", yaml.SafeLoader))(config_file)
+        try:
+            config = loader.get_single_data()
+        finally:
+            loader.dispose()
 
     if (
         config is None
@@ -94,7 +260,31 @@ def load_config(config_file_path):
     ):
         raise ValueError("required objects 'api' and/or 'domain' with all required fields not found")
 
+    if not isinstance(config["api"].get("http2", False), bool):
+        raise ValueError("'api.http2' must be a boolean")
+
+    for field in ["connect_timeout", "read_timeout"]:
+        value = config["api"].get(field, 1)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+            raise ValueError(f"'api.{field}' must be a positive number of seconds")
+
     if config["domains"] is None:
         config["domains"] = []
 
+    domain_entries = config["domains"]
+    if config.get("defaults") is not None:
+        if not isinstance(config["defaults"], dict):
+            raise ValueError("'defaults' must be a mapping with 'records' and/or 'include'")
+        domain_entries = [*domain_entries, {**config["defaults"], "name": "defaults"}]
+
+    dropped = validate.validate_config(config, config_file_path, loader.lines)
+    if warnings is not None:
+        warnings.extend(dropped)
+
+    if "templates" in config:
+        config["templates"] = templates.compile_templates(config["templates"] or {})
+        templates.check_includes(domain_entries, config["templates"], config.get("vars"))
+    elif any(entry.get("include") for entry in domain_entries):
+        raise ValueError("domains include templates but no 'templates' are defined")
+
     return config
@@ -0,0 +1,302 @@
+import ipaddress
+import re
+
+from . import scheduler
+from . import templates
+
+# record types supported by the Porkbun API
+RECORD_TYPES = ["A", "AAAA", "ALIAS", "CAA", "CNAME", "HTTPS", "MX", "NS", "SRV", "SVCB", "TLSA", "TXT"]
+
+# lower TTL values are raised by the API, so records would never match the configuration
+MIN_TTL = 600
+
+_LABEL = r"[A-Za-z0-9_](?:[A-Za-z0-9_-]{0,61}[A-Za-z0-9_])?"
+_SUBDOMAIN = re.compile(rf"(?:\*|{_LABEL})(?:\.{_LABEL})*")
+_HOSTNAME = re.compile(rf"{_LABEL}(?:\.{_LABEL})*\.?")
+_DOMAIN = re.compile(rf"{_LABEL}(?:\.{_LABEL})+")
+
+_loaders = {}
+
+
+def line_tracking_loader(base):
+    """Create a YAML loader class that records the line of every mapping it constructs.
+
+    Lines are stored in the ``lines`` attribute of the loader instance keyed by ``id``
+    of the constructed dictionaries, they stay valid as long as the loaded data is alive.
+
+    :param base: YAML loader class to extend, e.g., ``yaml.CSafeLoader``
+    :type base: type
+    :returns: loader class
+    :rtype: type"""
+    if base not in _loaders:
+
+        def construct_yaml_map(self, node):
+            data = {}
+            self.lines[id(data)] = node.start_mark.line + 1
+            yield data
+            data.update(self.construct_mapping(node))
+
+        def __init__(self, stream):
+            base.__init__(self, stream)
+            self.lines = {}
+
+        loader = type("LineTracking" + base.__name__, (base,), {"__init__": __init__})
+        loader.add_constructor("tag:yaml.org,2002:map", construct_yaml_map)
+        _loaders[base] = loader
+    return _loaders[base]
+
+
+def _check_content(record_type, content):
+    if not isinstance(content, str) or not content:
+        return "content must be a non-empty string"
+    if templates.has_placeholders(content):
+        # only known once the template is expanded
+        return None
+
+    if record_type == "A":
+        try:
+            ipaddress.IPv4Address(content)
+        except ValueError:
+            return f"invalid IPv4 address '{content}'"
+    elif record_type == "AAAA":
+        try:
+            ipaddress.IPv6Address(content)
+        except ValueError:
+            return f"invalid IPv6 address '{content}'"
+    elif record_type in ["ALIAS", "CNAME", "MX", "NS"]:
+        if not _HOSTNAME.fullmatch(content):
+            return f"invalid host name '{content}'"
+    elif record_type == "SRV":
+        parts = content.split()
+        if len(parts) != 3 or not parts[0].isdigit() or not parts[1].isdigit() or not _HOSTNAME.fullmatch(parts[2]):
+            return f"invalid SRV content '{content}', expected 'weight port target'"
+    elif record_type == "CAA":
+        parts = content.split(None, 2)
+        if len(parts) != 3 or not parts[0].isdigit() or int(parts[0]) > 255 or not parts[1].isalnum():
+            return f"invalid CAA content '{content}', expected 'flags tag value'"
+    return None
+
+
+def _check_integer(record, field, minimum):
+    value = record[field]
+    if isinstance(value, bool) or not isinstance(value, (int, str)) or not str(value).isdigit():
+        return f"'{field}' must be a non-negative integer"
+    if int(value) < minimum:
+        return f"'{field}' must be at least {minimum}"
+    return None
+
+
+def is_domain_name(name):
+    """Check if a value is a domain name with at least two labels.
+
+    >>> is_domain_name("example.com"), is_domain_name("com"), is_domain_name("-example.com")
+    (True, False, False)
+
+    :param name: value to check
+    :type name: object
+    :rtype: bool"""
+    return isinstance(name, str) and _DOMAIN.fullmatch(name) is not None
+
+
+def check_record(record):
+    """Check fields of a single record. Placeholders in its subdomain name and content are
+    accepted, they are only known once a template is expanded.
+
+    :param record: DNS record
+    :type record: dict
+    :returns: problems found
+    :rtype: list"""
+    if not isinstance(record, dict):
+        return ["record must be a mapping"]
+    missing = [x for x in ["name", "type", "content"] if x not in record]
+    if missing:
+        return [
+            "record requires " + ", ".join(f"'{x}'" for x in missing) + " field" + ("s" if len(missing) > 1 else "")
+        ]
+
+    problems = []
+    name, record_type = record["name"], record["type"]
+    if not isinstance(name, str):
+        problems.append("'name' must be a string")
+    elif name and not templates.has_placeholders(name) and not _SUBDOMAIN.fullmatch(name):
+        problems.append(f"invalid subdomain name '{name}'")
+    if record_type not in RECORD_TYPES:
+        problems.append(f"invalid record type '{record_type}', expected one of: " + ", ".join(RECORD_TYPES))
+    else:
+        problem = _check_content(record_type, record["content"])
+        if problem is not None:
+            problems.append(problem)
+        if record_type == "CNAME" and name == "":
+            problems.append("CNAME record is not allowed at the domain apex, use ALIAS")
+    if record.get("ttl") is not None:
+        problem = _check_integer(record, "ttl", MIN_TTL)
+        if problem is not None:
+            problems.append(problem)
+    if record.get("prio") is not None:
+        problem = _check_integer(record, "prio", 0)
+        if problem is not None:
+            problems.append(problem)
+    return problems
+
+
+def _record_key(record):
+    # YAML may give TTL and priority as numbers or strings, the API always returns strings
+    ttl, prio = record.get("ttl"), record.get("prio")
+    return (
+        record["name"],
+        record["type"],
+        record["content"],
+        None if ttl is None else str(ttl),
+        None if prio is None else str(prio),
+    )
+
+
+def _describe(record):
+    return f"{record['type']}-record '{record['name']}'"
+
+
+class _Validator:
+    def __init__(self, path, lines):
+        self.path = path
+        self.lines = lines or {}
+        self.errors = []
+        self.warnings = []
+
+    def location(self, obj):
+        line = self.lines.get(id(obj))
+        return f"{self.path}:{line}" if line is not None else self.path
+
+    def error(self, obj, message):
+        self.errors.append(f"{self.location(obj)}: {message}")
+
+    def warning(self, obj, message):
+        self.warnings.append(f"{self.location(obj)}: {message}")
+
+    def check_records(self, records, context):
+        """Check records of a single list, drop identical ones and return the valid records."""
+        if records is None:
+            return []
+        if not isinstance(records, list):
+            self.error(records, f"{context}: 'records' must be a list")
+            return []
+
+        result, seen = [], {}
+        for record in records:
+            problems = check_record(record)
+            for problem in problems:
+                self.error(record, f"{context}: {problem}")
+            if problems:
+                continue
+            key = _record_key(record)
+            if key in seen:
+                self.warning(
+                    record,
+                    f"{context}: duplicate {_describe(record)} dropped, first defined at {self.location(seen[key])}",
+                )
+                continue
+            seen[key] = record
+            result.append(record)
+        # keep only unique records, so they are not planned again and again
+        if len(result) != len(records):
+            records[:] = result
+        return result
+
+    def check_domain(self, entry, template_records, context):
+        records = self.check_records(entry.get("records"), context)
+
+        # records of included templates are shared, only those with fixed names and content can be compared
+        index, by_name = {}, {}
+        for template_name in entry.get("include") or []:
+            for record in template_records.get(template_name, ()):
+                if not templates.has_placeholders(record["name"]):
+                    by_name.setdefault(record["name"], []).append(record)
+                    if not templates.has_placeholders(record["content"]):
+                        index.setdefault(_record_key(record), record)
+
+        unique = []
+        for record in records:
+            key = _record_key(record)
+            if key in index:
+                self.warning(
+                    record,
+                    f"{context}: duplicate {_describe(record)} dropped, also included from a template"
+                    f" at {self.location(index[key])}",
+                )
+                continue
+            unique.append(record)
+            by_name.setdefault(record["name"], []).append(record)
+        if len(unique) != len(records):
+            entry["records"][:] = unique
+
+        # a CNAME record excludes any other record with the same name
+        for name, named in by_name.items():
+            if len(named) > 1 and any(x["type"] == "CNAME" for x in named):
+                for record in named:
+                    if record["type"] == "CNAME":
+                        types = sorted({x["type"] for x in named if x is not record})
+                        self.error(
+                            record,
+                            f"{context}: CNAME-record '{name}' conflicts with other records of the same name: "
+                            + ", ".join(types),
+                        )
+
+
+def validate_config(config, path="<config>", lines=None):
+    """Check all domains, defaults and templates of a configuration in a single pass before any
+    request is made, see :func:`porkbun_api_cli.utils.load_config`. Every record is checked for its
+    fields, type and content, records of a domain are indexed by name to find conflicts with CNAME
+    records. Identical records are dropped from the configuration in place.
+
+    :param config: configuration
+    :type config: dict
+    :param path: path of the configuration file reported with problems
+    :type path: str
+    :param lines: lines of mappings in the configuration file keyed by ``id``, see :func:`line_tracking_loader`
+    :type lines: dict
+    :returns: warnings about dropped records
+    :rtype: list
+    :raises ValueError: listing all problems found"""
+    validator = _Validator(path, lines)
+
+    template_records = {}
+    config_templates = config.get("templates")
+    if isinstance(config_templates, dict):
+        for name, template in config_templates.items():
+            if isinstance(template, dict):
+                template_records[name] = validator.check_records(template.get("records"), f"template '{name}'")
+
+    entries = []
+    if isinstance(config.get("defaults"), dict):
+        entries.append((config["defaults"], "defaults"))
+    names = {}
+    for entry in config["domains"]:
+        if not isinstance(entry, dict) or not isinstance(entry.get("name"), str):
+            validator.error(entry, "domain entry requires a 'name'")
+            continue
+        if not is_domain_name(entry["name"]):
+            validator.error(entry, f"invalid domain name '{entry['name']}'")
+        if entry["name"] in names:
+            validator.error(
+                entry, f"domain '{entry['name']}' is already defined at {validator.location(names[entry['name']])}"
+            )
+            continue
+        names[entry["name"]] = entry
+        entries.append((entry, f"domain '{entry['name']}'"))
+
+    for entry, context in entries:
+        include = entry.get("include")
+        if include is not None and (not isinstance(include, list) or not all(isinstance(x, str) for x in include)):
+            validator.error(entry, f"{context}: 'include' must be a list of template names")
+            continue
+        if entry.get("vars") is not None and not isinstance(entry["vars"], dict):
+            validator.error(entry, f"{context}: 'vars' must be a mapping")
+        if entry.get("priority") is not None and entry["priority"] not in scheduler.LANES:
+            validator.error(entry, f"{context}: 'priority' must be one of: " + ", ".join(scheduler.LANES))
+        validator.check_domain(entry, template_records, context)
+
+    if validator.errors:
+        raise ValueError(
+            f"{len(validator.errors)} problem{'s' if len(validator.errors) > 1 else ''} found:\n"
+            + "\n".join(validator.errors)
+        )
+    return validator.warnings
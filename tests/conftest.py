@@ -0,0 +1,55 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+
+class FakeAPIHandler(BaseHTTPRequestHandler):
+    """Porkbun API keeping records in memory, logging the requests and counting the connections
+    made to it."""
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        parts = self.path.strip("/").split("/")
+        with self.server.lock:
+            self.server.requests.append(self.path)
+            records = self.server.zones.setdefault(parts[2], [])
+            if parts[:2] == ["dns", "retrieve"]:
+                response = {"status": "SUCCESS", "records": list(records)}
+            elif parts[:2] == ["dns", "create"]:
+                name = f"{payload['name']}.{parts[2]}" if payload["name"] else parts[2]
+                records.append({"id": str(len(records) + 1), **payload, "name": name})
+                response = {"status": "SUCCESS", "id": len(records)}
+            else:
+                next(x for x in records if x["id"] == parts[3])["content"] = payload["content"]
+                response = {"status": "SUCCESS"}
+        body = json.dumps(response).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def fake_api():
+    api_server = ThreadingHTTPServer(("127.0.0.1", 0), FakeAPIHandler)
+    api_server.zones, api_server.requests, api_server.connections = {}, [], 0
+    api_server.lock = threading.Lock()
+    thread = threading.Thread(target=api_server.serve_forever, daemon=True)
+    thread.start()
+    yield api_server
+    api_server.shutdown()
+    api_server.server_close()
+    thread.join()
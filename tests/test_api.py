@@ -1,19 +1,32 @@
+import gzip
+import json
+import threading
+import time
+import tracemalloc
 import unittest
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
 from unittest.mock import Mock
+from unittest.mock import call
 from unittest.mock import patch
 
 from requests import RequestException
 
+from porkbun_api_cli import transport
 from porkbun_api_cli.api import PorkbunAPI
+from porkbun_api_cli.budget import Deadline
+from porkbun_api_cli.budget import DeadlineExceeded
+from porkbun_api_cli.circuit import CircuitOpenError
+from porkbun_api_cli.utils import fingerprint_records
 
 
 class TestPorkbunAPI(unittest.TestCase):
 
-    @patch("porkbun_api_cli.api.requests.post")
+    @patch("requests.Session.post")
     def test_query_api_success_no_datafield(self, mock_post):
         mock_response = Mock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {"status": "SUCCESS"}
+        mock_response.content = json.dumps({"status": "SUCCESS"}).encode("utf-8")
         mock_post.return_value = mock_response
 
         api = PorkbunAPI(apikey="apikey", secretapikey="secretapikey", endpoint="http://porkbun.com/api")
@@ -22,11 +35,11 @@ class TestPorkbunAPI(unittest.TestCase):
         self.assertEqual(result, None)
         self.assertTrue(success)
 
-    @patch("porkbun_api_cli.api.requests.post")
+    @patch("requests.Session.post")
     def test_query_api_success_with_datafield(self, mock_post):
         mock_response = Mock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {"status": "SUCCESS", "datafield": "value"}
+        mock_response.content = json.dumps({"status": "SUCCESS", "datafield": "value"}).encode("utf-8")
         mock_post.return_value = mock_response
 
         api = PorkbunAPI(apikey="apikey", secretapikey="secretapikey", endpoint="http://porkbun.com/api")
@@ -35,11 +48,11 @@ class TestPorkbunAPI(unittest.TestCase):
         self.assertEqual(result, "value")
         self.assertTrue(success)
 
-    @patch("porkbun_api_cli.api.requests.post")
+    @patch("requests.Session.post")
     def test_query_api_invalid_datafield(self, mock_post):
         mock_response = Mock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {"status": "SUCCESS"}
+        mock_response.content = json.dumps({"status": "SUCCESS"}).encode("utf-8")
         mock_post.return_value = mock_response
 
         api = PorkbunAPI(apikey="apikey", secretapikey="secretapikey", endpoint="http://porkbun.com/api")
@@ -48,7 +61,36 @@ class TestPorkbunAPI(unittest.TestCase):
         self.assertEqual(result, "invalid response from '/test_endpoint': 'datafield' field not found")
         self.assertFalse(success)
 
-    @patch("porkbun_api_cli.api.requests.post")
+    @patch("requests.Session.post")
+    def test_query_api_request_body(self, mock_post):
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.content = b'{"status": "SUCCESS"}'
+        mock_post.return_value = mock_response
+
+        api = PorkbunAPI(apikey="apikey", secretapikey="secretapikey", endpoint="http://porkbun.com/api")
+        api._query_api("/test_endpoint", payload={"name": "www", "type": "A"})
+
+        self.assertEqual(mock_post.call_args.args, ("http://porkbun.com/api/test_endpoint",))
+        self.assertEqual(
+            json.loads(mock_post.call_args.kwargs["data"]),
+            {"secretapikey": "secretapikey", "apikey": "apikey", "name": "www", "type": "A"},
+        )
+
+    @patch("requests.Session.post")
+    def test_query_api_malformed_response(self, mock_post):
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.content = b'<html>'
+        mock_post.return_value = mock_response
+
+        api = PorkbunAPI(apikey="apikey", secretapikey="secretapikey", endpoint="http://porkbun.com/api")
+        result, success = api._query_api("/test_endpoint")
+
+        self.assertEqual(result, "invalid response from '/test_endpoint': malformed JSON")
+        self.assertFalse(success)
+
+    @patch("requests.Session.post")
     def test_query_api_failed_request(self, mock_post):
         mock_post.side_effect = RequestException("Connection Error")
 
@@ -58,11 +100,11 @@ class TestPorkbunAPI(unittest.TestCase):
         self.assertEqual(result, "request raised an exception: Connection Error")
         self.assertFalse(success)
 
-    @patch("porkbun_api_cli.api.requests.post")
+    @patch("requests.Session.post")
     def test_query_api_failed_status(self, mock_post):
         mock_response = Mock()
         mock_response.status_code = 400
-        mock_response.json.return_value = {"status": "FAILURE", "message": "Invalid request"}
+        mock_response.content = json.dumps({"status": "FAILURE", "message": "Invalid request"}).encode("utf-8")
         mock_post.return_value = mock_response
 
         api = PorkbunAPI(apikey="apikey", secretapikey="secretapikey", endpoint="http://porkbun.com/api")
@@ -71,11 +113,11 @@ class TestPorkbunAPI(unittest.TestCase):
         self.assertEqual(result, "request to '/test_endpoint' failed with 400 HTTP status code")
         self.assertFalse(success)
 
-    @patch("porkbun_api_cli.api.requests.post")
+    @patch("requests.Session.post")
     def test_query_api_invalid_response_empty(self, mock_post):
         mock_response = Mock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {}
+        mock_response.content = json.dumps({}).encode("utf-8")
         mock_post.return_value = mock_response
 
         api = PorkbunAPI(apikey="apikey", secretapikey="secretapikey", endpoint="http://porkbun.com/api")
@@ -84,11 +126,11 @@ class TestPorkbunAPI(unittest.TestCase):
         self.assertEqual(result, "invalid response from '/test_endpoint': status field not found")
         self.assertFalse(success)
 
-    @patch("porkbun_api_cli.api.requests.post")
+    @patch("requests.Session.post")
     def test_query_api_invalid_response_no_message(self, mock_post):
         mock_response = Mock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {"status": "FAILURE"}
+        mock_response.content = json.dumps({"status": "FAILURE"}).encode("utf-8")
         mock_post.return_value = mock_response
 
         api = PorkbunAPI(apikey="apikey", secretapikey="secretapikey", endpoint="http://porkbun.com/api")
@@ -105,6 +147,19 @@ class TestPorkbunAPI(unittest.TestCase):
         result = api.list_dns_records("porkbun.com/api")
         self.assertEqual(result, {"record1": "value1", "record2": "value2"})
 
+    @patch("porkbun_api_cli.api.PorkbunAPI._query_api")
+    def test_list_dns_records_fingerprint(self, mock_query_api):
+        records = [{"name": "www.some.domain", "type": "A", "content": "127.0.0.1"}]
+        mock_query_api.return_value = (records, True)
+        api = PorkbunAPI(apikey="apikey", secretapikey="secretapikey", endpoint="http://porkbun.com/api")
+
+        api.list_dns_records("some.domain")
+        self.assertEqual(api.zone_fingerprints, {})
+
+        api.fingerprint_zones = True
+        api.list_dns_records("some.domain")
+        self.assertEqual(api.zone_fingerprints, {"some.domain": fingerprint_records(records)})
+
     # Mocking _query_api method for failure response
     @patch("porkbun_api_cli.api.PorkbunAPI._query_api")
     def test_list_dns_records_failure(self, mock_query_api):
@@ -115,6 +170,77 @@ class TestPorkbunAPI(unittest.TestCase):
 
         self.assertTrue("list_dns_records failed: error message" in str(context.exception))
 
+    @patch("porkbun_api_cli.api.PorkbunAPI._query_api")
+    def test_list_dns_records_by_name_types(self, mock_query_api):
+        mock_query_api.side_effect = [([{"name": "some.domain"}], True), ([{"name": "www.some.domain"}], True)]
+        api = PorkbunAPI(apikey="apikey", secretapikey="secretapikey", endpoint="http://porkbun.com/api")
+        result = api.list_dns_records("some.domain", [("", "A"), ("www", "A")])
+        self.assertEqual(result, [{"name": "some.domain"}, {"name": "www.some.domain"}])
+        self.assertListEqual(
+            [
+                call(endpoint="dns/retrieveByNameType/some.domain/A", datafield="records"),
+                call(endpoint="dns/retrieveByNameType/some.domain/A/www", datafield="records"),
+            ],
+            mock_query_api.mock_calls,
+        )
+
+    @patch("porkbun_api_cli.api.PorkbunAPI._query_api")
+    def test_list_dns_records_by_name_types_failure(self, mock_query_api):
+        mock_query_api.side_effect = [([{"name": "some.domain"}], True), ("error message", False)]
+        api = PorkbunAPI(apikey="apikey", secretapikey="secretapikey", endpoint="http://porkbun.com/api")
+        with self.assertRaises(RuntimeError) as context:
+            api.list_dns_records("some.domain", [("", "A"), ("www", "A")])
+
+        self.assertTrue(
+            "list_dns_records failed: list_dns_records_by_name_type failed: error message" in str(context.exception)
+        )
+
+    def test_list_dns_records_by_name_type_invalid_payload(self):
+        for name, args in [
+            ('invalid domain', (None, "A", "www")),
+            ('empty domain', ("", "A", "www")),
+            ('invalid type', ("some.domain", None, "www")),
+        ]:
+            with self.subTest(name):
+                with self.assertRaises(RuntimeError) as context:
+                    PorkbunAPI.list_dns_records_by_name_type(None, *args)
+
+                self.assertTrue("list_dns_records_by_name_type failed: invalid input values" in str(context.exception))
+
+    @patch("porkbun_api_cli.api.PorkbunAPI._query_api")
+    def test_update_records_by_name_type_success(self, mock_query_api):
+        mock_query_api.return_value = (None, True)
+        api = PorkbunAPI(apikey="apikey", secretapikey="secretapikey", endpoint="http://porkbun.com/api")
+        result = api.update_records_by_name_type(
+            "some.domain", "A", "www", {"name": "www", "type": "A", "content": "127.0.0.1", "ttl": 600}
+        )
+        self.assertIsNone(result)
+        mock_query_api.assert_called_once_with(
+            endpoint="dns/editByNameType/some.domain/A/www", payload={"content": "127.0.0.1", "ttl": 600}
+        )
+
+    def test_update_records_by_name_type_invalid_payload(self):
+        for name, args in [
+            ('invalid domain', (None, "A", "www", {"content": "127.0.0.1"})),
+            ('invalid type', ("some.domain", "", "www", {"content": "127.0.0.1"})),
+            ('invalid subdomain', ("some.domain", "A", None, {"content": "127.0.0.1"})),
+            ('invalid record', ("some.domain", "A", "www", {"magick": "42"})),
+        ]:
+            with self.subTest(name):
+                with self.assertRaises(RuntimeError) as context:
+                    PorkbunAPI.update_records_by_name_type(None, *args)
+
+                self.assertTrue("update_records_by_name_type failed: invalid input values" in str(context.exception))
+
+    @patch("porkbun_api_cli.api.PorkbunAPI._query_api")
+    def test_update_records_by_name_type_failure(self, mock_query_api):
+        mock_query_api.return_value = ("error message", False)
+        api = PorkbunAPI(apikey="apikey", secretapikey="secretapikey", endpoint="http://porkbun.com/api")
+        with self.assertRaises(RuntimeError) as context:
+            api.update_records_by_name_type("some.domain", "A", "", {"content": "127.0.0.1"})
+
+        self.assertTrue("update_records_by_name_type failed: error message" in str(context.exception))
+
     # Mocking _query_api method for success response
     @patch("porkbun_api_cli.api.PorkbunAPI._query_api")
     def test_create_record_success(self, mock_query_api):
@@ -178,6 +304,139 @@ class TestPorkbunAPI(unittest.TestCase):
 
         self.assertTrue("update_record failed: error message" in str(context.exception))
 
+    @patch("importlib.util.find_spec")
+    def test_http2_requires_extra(self, mock_find_spec):
+        mock_find_spec.return_value = None
+        with self.assertRaises(ImportError) as context:
+            PorkbunAPI(apikey="apikey", secretapikey="secretapikey", endpoint="http://porkbun.com/api", http2=True)
+
+        self.assertTrue("install the 'http2' extra" in str(context.exception))
+
+    @patch("porkbun_api_cli.api.PorkbunAPI._query_api")
+    def test_list_domains(self, mock_query_api):
+        mock_query_api.return_value = ([{"domain": "some.domain"}], True)
+        api = PorkbunAPI(apikey="apikey", secretapikey="secretapikey", endpoint="http://porkbun.com/api")
+        result = api.list_domains(1000)
+        self.assertEqual(result, [{"domain": "some.domain"}])
+        mock_query_api.assert_called_once_with(
+            endpoint="domain/listAll", payload={"start": "1000"}, datafield="domains"
+        )
+
+    @patch("porkbun_api_cli.api.PorkbunAPI._query_api")
+    def test_list_domains_failure(self, mock_query_api):
+        mock_query_api.return_value = ("error message", False)
+        api = PorkbunAPI(apikey="apikey", secretapikey="secretapikey", endpoint="http://porkbun.com/api")
+        for name, start, message in [
+            ("api error", 0, "list_domains failed: error message"),
+            ("invalid start", -1, "list_domains failed: invalid input values"),
+        ]:
+            with self.subTest(name):
+                with self.assertRaises(RuntimeError) as context:
+                    api.list_domains(start)
+
+                self.assertTrue(message in str(context.exception))
+
+    @patch("porkbun_api_cli.api.PorkbunAPI.list_domains")
+    def test_list_all_domains(self, mock_list_domains):
+        pages = {0: ["a", "b"], 2: ["c", "d"], 4: ["e", "f"], 6: ["g"], 8: []}
+        mock_list_domains.side_effect = lambda start: [{"domain": x} for x in pages[start]]
+        api = PorkbunAPI(apikey="apikey", secretapikey="secretapikey", endpoint="http://porkbun.com/api")
+        api.DOMAINS_PAGE_SIZE = 2
+
+        for jobs in [1, 2, 3]:
+            with self.subTest(jobs=jobs):
+                result = api.list_all_domains(jobs)
+                self.assertEqual([x["domain"] for x in result], ["a", "b", "c", "d", "e", "f", "g"])
+
+    @patch("porkbun_api_cli.api.PorkbunAPI.list_domains")
+    def test_list_all_domains_failure(self, mock_list_domains):
+        mock_list_domains.side_effect = RuntimeError("list_domains failed: error message")
+        api = PorkbunAPI(apikey="apikey", secretapikey="secretapikey", endpoint="http://porkbun.com/api")
+        with self.assertRaises(RuntimeError) as context:
+            api.list_all_domains(2)
+
+        self.assertTrue("list_domains failed: error message" in str(context.exception))
+
+    def test_circuit_breaker(self):
+        def post(url, data, headers, stream=False, timeout=None):
+            if "/dns/create/" in url:
+                return transport._BufferedResponse(503, b"")
+            return transport._BufferedResponse(200, b'{"status": "SUCCESS", "yourIp": "10.0.0.1"}')
+
+        mock_transport = Mock()
+        mock_transport.post.side_effect = post
+        api = PorkbunAPI(
+            apikey="apikey", secretapikey="secretapikey", endpoint="http://porkbun.com/api/", transport=mock_transport
+        )
+        record = {"name": "www", "type": "A", "content": "10.0.0.1"}
+        for _ in range(5):
+            with self.assertRaises(RuntimeError) as context:
+                api.create_record("some.domain", record)
+            self.assertTrue("failed with 503 HTTP status code" in str(context.exception))
+
+        # further requests to the failing endpoint are not sent, others are
+        with self.assertRaises(CircuitOpenError) as context:
+            api.create_record("other.domain", record)
+        self.assertTrue("circuit open for 'dns/create' after 5 of 5 recent requests failed" in str(context.exception))
+        self.assertEqual(mock_transport.post.call_count, 5)
+        self.assertEqual(api.get_my_ip(), "10.0.0.1")
+        self.assertEqual(api.circuit_breaker.state("dns/create"), "open")
+        self.assertEqual(api.circuit_breaker.state("ping"), "closed")
+
+    def test_rate_limiter(self):
+        mock_transport = Mock()
+        mock_transport.post.return_value = transport._BufferedResponse(200, b'{"status": "SUCCESS", "yourIp": "1"}')
+        api = PorkbunAPI(
+            apikey="apikey", secretapikey="secretapikey", endpoint="http://porkbun.com/api/", transport=mock_transport
+        )
+        api.rate_limiter = Mock()
+
+        api.get_my_ip()
+        api.get_my_ip()
+
+        self.assertEqual(api.rate_limiter.acquire.call_count, 2)
+
+    def test_observer(self):
+        mock_transport = Mock()
+        mock_transport.post.side_effect = [
+            transport._BufferedResponse(429, b""),
+            transport.TransportError("connection reset"),
+        ]
+        api = PorkbunAPI(
+            apikey="apikey", secretapikey="secretapikey", endpoint="http://porkbun.com/api/", transport=mock_transport
+        )
+        api.observer = Mock()
+
+        for _ in range(2):
+            with self.assertRaises(RuntimeError):
+                api.get_my_ip()
+
+        self.assertEqual([x.args[0] for x in api.observer.call_args_list], ["ping", "ping"])
+        self.assertEqual([x.args[2] for x in api.observer.call_args_list], [429, None])
+        self.assertTrue(all(x.args[1] >= 0 for x in api.observer.call_args_list))
+
+    @patch("porkbun_api_cli.api.PorkbunAPI._query_api")
+    def test_get_nameservers(self, mock_query_api):
+        mock_query_api.return_value = (["curitiba.ns.porkbun.com", "fortaleza.ns.porkbun.com"], True)
+        api = PorkbunAPI(apikey="apikey", secretapikey="secretapikey", endpoint="http://porkbun.com/api")
+        result = api.get_nameservers("some.domain")
+        self.assertEqual(result, ["curitiba.ns.porkbun.com", "fortaleza.ns.porkbun.com"])
+        mock_query_api.assert_called_once_with(endpoint="domain/getNs/some.domain", datafield="ns")
+
+    @patch("porkbun_api_cli.api.PorkbunAPI._query_api")
+    def test_get_nameservers_failure(self, mock_query_api):
+        mock_query_api.return_value = ("error message", False)
+        api = PorkbunAPI(apikey="apikey", secretapikey="secretapikey", endpoint="http://porkbun.com/api")
+        for name, domain, message in [
+            ("api error", "some.domain", "get_nameservers failed: error message"),
+            ("invalid domain", "", "get_nameservers failed: invalid input values"),
+        ]:
+            with self.subTest(name):
+                with self.assertRaises(RuntimeError) as context:
+                    api.get_nameservers(domain)
+
+                self.assertTrue(message in str(context.exception))
+
     # Mocking _query_api method for success response
     @patch("porkbun_api_cli.api.PorkbunAPI._query_api")
     def test_get_my_ip_success(self, mock_query_api):
@@ -197,5 +456,139 @@ class TestPorkbunAPI(unittest.TestCase):
         self.assertTrue("get_my_ip failed: error message" in str(context.exception))
 
 
+def _zone_response(size):
+    records = [
+        {"id": str(i), "name": f"host{i}.some.domain", "type": "A", "content": "127.0.0.1", "ttl": "600", "prio": None}
+        for i in range(size)
+    ]
+    return json.dumps({"status": "SUCCESS", "cloudflare": "enabled", "records": records}).encode("utf-8")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serve canned responses keyed by request path, gzip compressed if the client accepts it."""
+
+    responses = {}
+    # seconds to wait before responding keyed by request path
+    delays = {}
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        time.sleep(self.delays.get(self.path, 0))
+        status, body = self.responses.get(self.path, (404, b""))
+        headers = {"Content-Type": "application/json"}
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestPorkbunAPIStreaming(unittest.TestCase):
+
+    ZONE_SIZE = 20000
+
+    @classmethod
+    def setUpClass(cls):
+        StubHandler.responses = {
+            "/dns/retrieve/some.domain": (200, _zone_response(cls.ZONE_SIZE)),
+            "/dns/retrieve/error.domain": (200, b'{"status": "ERROR", "message": "Invalid domain."}'),
+            "/dns/retrieve/nostatus.domain": (200, b'{"records": []}'),
+            "/dns/retrieve/broken.domain": (200, b'{"status": "SUCCESS", "records": [{"id": '),
+            "/dns/retrieve/failed.domain": (500, b''),
+            "/ping": (200, b'{"status": "SUCCESS", "yourIp": "127.0.0.1"}'),
+        }
+        StubHandler.delays = {"/ping": 2}
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.thread.join()
+
+    def setUp(self):
+        self.api = PorkbunAPI(
+            apikey="apikey", secretapikey="secretapikey", endpoint=f"http://127.0.0.1:{self.server.server_port}/"
+        )
+
+    def test_iter_dns_records(self):
+        self.api.fingerprint_zones = True
+        records = list(self.api.iter_dns_records("some.domain"))
+
+        self.assertEqual(records, self.api.list_dns_records("some.domain"))
+        self.assertEqual(len(records), self.ZONE_SIZE)
+        self.assertEqual(self.api.zone_fingerprints["some.domain"], fingerprint_records(records))
+
+    def test_read_timeout(self):
+        self.api.read_timeout = 0.2
+        start = time.perf_counter()
+        with self.assertRaises(RuntimeError) as context:
+            self.api.get_my_ip()
+
+        self.assertTrue("get_my_ip failed: request raised an exception: " in str(context.exception))
+        self.assertLess(time.perf_counter() - start, 1)
+
+    def test_deadline(self):
+        # timeouts of requests are limited to the remaining budget
+        self.api.deadline = Deadline(0.3)
+        start = time.perf_counter()
+        with self.assertRaises(RuntimeError) as context:
+            self.api.get_my_ip()
+
+        self.assertTrue("get_my_ip failed: request raised an exception: " in str(context.exception))
+        self.assertLess(time.perf_counter() - start, 1)
+
+        # no requests are made once the budget is used up
+        time.sleep(0.3)
+        for method in [self.api.get_my_ip, lambda: list(self.api.iter_dns_records("some.domain"))]:
+            with self.subTest(method=method):
+                with self.assertRaises(DeadlineExceeded):
+                    method()
+
+    def test_iter_dns_records_failure(self):
+        for domain, message in [
+            ("error.domain", "iter_dns_records failed: Invalid domain."),
+            ("nostatus.domain", "iter_dns_records failed: invalid response from 'dns/retrieve/nostatus.domain'"),
+            ("broken.domain", "iter_dns_records failed: invalid response from 'dns/retrieve/broken.domain'"),
+            ("failed.domain", "request to 'dns/retrieve/failed.domain' failed with 500 HTTP status code"),
+        ]:
+            with self.subTest(domain):
+                with self.assertRaises(RuntimeError) as context:
+                    list(self.api.iter_dns_records(domain))
+
+                self.assertIn(message, str(context.exception))
+
+    def test_iter_dns_records_connection_error(self):
+        api = PorkbunAPI(apikey="apikey", secretapikey="secretapikey", endpoint="http://127.0.0.1:1/")
+        with self.assertRaises(RuntimeError) as context:
+            list(api.iter_dns_records("some.domain"))
+
+        self.assertIn("iter_dns_records failed: request raised an exception", str(context.exception))
+
+    def test_iter_dns_records_memory(self):
+        def peak(func):
+            tracemalloc.start()
+            try:
+                func()
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        full = peak(lambda: self.api.list_dns_records("some.domain"))
+        streamed = peak(lambda: sum(1 for _ in self.api.iter_dns_records("some.domain")))
+
+        # streaming never holds the whole response, neither raw nor parsed
+        self.assertLess(streamed * 5, full)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,24 @@
+import pytest
+
+from porkbun_api_cli.budget import Deadline
+from porkbun_api_cli.budget import DeadlineExceeded
+
+
+def test_deadline():
+    now = [0.0]
+    deadline = Deadline(30, clock=lambda: now[0])
+
+    assert deadline.remaining() == 30
+    assert deadline.timeout(10, 60) == (10, 30)
+    assert not deadline.expired
+
+    now[0] = 25.0
+    assert deadline.timeout(10, 60) == (5, 5)
+
+    now[0] = 30.0
+    assert deadline.expired
+    assert deadline.remaining() == 0
+    with pytest.raises(DeadlineExceeded, match="deadline of 30 s exceeded"):
+        deadline.timeout(10, 60)
+    with pytest.raises(DeadlineExceeded):
+        deadline.check()
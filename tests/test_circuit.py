@@ -0,0 +1,79 @@
+import pytest
+
+from porkbun_api_cli.circuit import CircuitBreaker
+from porkbun_api_cli.circuit import CircuitOpenError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(threshold=0.5, min_requests=4, window=6, reset_timeout=10, clock=clock)
+
+
+def test_circuit_breaker_opens_on_error_rate(breaker):
+    for success in [True, True, False, True, False]:
+        breaker.before("dns/edit")
+        breaker.record("dns/edit", success)
+    assert breaker.state("dns/edit") == "closed"
+
+    breaker.before("dns/edit")
+    breaker.record("dns/edit", False)
+    assert breaker.state("dns/edit") == "open"
+    with pytest.raises(CircuitOpenError, match="circuit open for 'dns/edit' after 3 of 6 recent requests failed"):
+        breaker.before("dns/edit")
+
+    # endpoint families have their own circuits
+    breaker.before("dns/create")
+    assert breaker.state("dns/create") == "closed"
+
+
+def test_circuit_breaker_needs_min_requests(breaker):
+    for _ in range(3):
+        breaker.record("ping", False)
+    assert breaker.state("ping") == "closed"
+    breaker.record("ping", False)
+    assert breaker.state("ping") == "open"
+
+
+def test_circuit_breaker_half_open(breaker, clock):
+    for _ in range(4):
+        breaker.record("ping", False)
+
+    clock.now += 9.5
+    with pytest.raises(CircuitOpenError, match="next attempt in 0.5 s"):
+        breaker.before("ping")
+
+    # a single probe is let through once the timeout passed
+    clock.now += 0.5
+    breaker.before("ping")
+    assert breaker.state("ping") == "half-open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before("ping")
+
+    # a failed probe keeps the circuit open for another timeout
+    breaker.record("ping", False)
+    assert breaker.state("ping") == "open"
+    clock.now += 5
+    with pytest.raises(CircuitOpenError):
+        breaker.before("ping")
+
+    # a successful probe closes it
+    clock.now += 5
+    breaker.before("ping")
+    breaker.record("ping", True)
+    assert breaker.state("ping") == "closed"
+    breaker.before("ping")
+    breaker.record("ping", False)
+    assert breaker.state("ping") == "closed"
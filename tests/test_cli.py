@@ -1,5 +1,9 @@
+import json
+import subprocess
 import sys
+import time
 from unittest import TestCase
+from unittest.mock import ANY
 from unittest.mock import Mock
 from unittest.mock import call
 from unittest.mock import patch
@@ -10,18 +14,89 @@ from click.testing import CliRunner
 from porkbun_api_cli import __version__
 from porkbun_api_cli import api
 from porkbun_api_cli import cli
+from porkbun_api_cli import engine
+from porkbun_api_cli import log
+from porkbun_api_cli import transport
+from porkbun_api_cli import utils
+from porkbun_api_cli.circuit import CircuitOpenError
+
+# import time budget of the entry point relative to that of click, its largest dependency, both
+# measured in the same process so that a slow or busy machine does not matter
+IMPORT_TIME_RATIO = 4
+
+# modules that must not be imported before an API call or a config load
+HEAVY_MODULES = ["requests", "urllib3", "ssl", "socket", "yaml", "httpx", "h2"]
 
 
 @pytest.fixture
 def runner():
-    return CliRunner()
+    # standard error is captured separately by default since click 8.2, which dropped ``mix_stderr``
+    try:
+        return CliRunner(mix_stderr=False)
+    except TypeError:
+        return CliRunner()
+
+
+def _render_log_calls(mock_calls):
+    """Format message templates passed to a mocked ``_log_if_level``."""
+    rendered = []
+    for _, args, kwargs in mock_calls:
+        level, verbosity, message = args
+        options = {k: v for k, v in kwargs.items() if k in ["file", "nl"]}
+        fields = {k: v for k, v in kwargs.items() if k not in options}
+        rendered.append(call(level, verbosity, message.format(**fields), **options))
+    return rendered
+
+
+def _imported_modules(code):
+    result = subprocess.run(
+        [sys.executable, "-c", f"{code}\nimport sys\nprint(' '.join(sys.modules), file=sys.stderr)"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return set(result.stderr.split())
+
+
+def _import_times(code):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_cli_import_time():
+    times = _import_times("import porkbun_api_cli.cli")
+
+    assert times["porkbun_api_cli.cli"] < IMPORT_TIME_RATIO * times["click"]
+
+
+def test_cli_import():
+    modules = _imported_modules("import porkbun_api_cli.cli")
+
+    assert "porkbun_api_cli.cli" in modules
+    assert not [x for x in HEAVY_MODULES if x in modules]
+
+
+def test_cli_version_import():
+    modules = _imported_modules(
+        "from porkbun_api_cli import cli\n" "try:\n" "    cli.main(['--version'])\n" "except SystemExit:\n" "    pass\n"
+    )
+
+    assert not [x for x in HEAVY_MODULES if x in modules]
 
 
 def test_cli_no_args(runner):
     result = runner.invoke(cli.main)
     assert result.exit_code == 2
     assert result.exception
-    assert result.output.strip().startswith('Usage: ')
+    assert result.stderr.strip().startswith('Usage: ')
 
 
 def test_cli_usage(runner):
@@ -44,14 +119,14 @@ def test_cli_dry_run(runner, monkeypatch):
     mock_api().get_my_ip.return_value = "some-ip-address"
 
     mock_collect_existing_dns_records = Mock()
-    monkeypatch.setattr(cli, '_collect_existing_dns_records', mock_collect_existing_dns_records)
+    monkeypatch.setattr(engine, 'collect_existing_dns_records', mock_collect_existing_dns_records)
     mock_collect_existing_dns_records.return_value = "existing-records"
 
     mock_plan_operations = Mock()
-    monkeypatch.setattr(cli, '_plan_operations', mock_plan_operations)
+    monkeypatch.setattr(engine, 'plan_operations', mock_plan_operations)
 
     mock_execute_operations_plan = Mock()
-    monkeypatch.setattr(cli, '_execute_operations_plan', mock_execute_operations_plan)
+    monkeypatch.setattr(engine, 'execute_operations_plan', mock_execute_operations_plan)
 
     result = runner.invoke(cli.main, ['tests/config.yml', '--dry-run'])
 
@@ -68,7 +143,9 @@ def test_cli_dry_run(runner, monkeypatch):
     )
 
     # Assertions on calls
-    mock_collect_existing_dns_records.assert_called_once_with(mock_api(), ["example.com"], 2)
+    mock_collect_existing_dns_records.assert_called_once_with(
+        mock_api(), ["example.com"], 2, name_types={}, jobs=1, verify=ANY
+    )
     mock_plan_operations.assert_called_once_with(
         "append",
         2,
@@ -90,10 +167,494 @@ def test_cli_dry_run(runner, monkeypatch):
                 {'name': 'www', 'type': 'AAAA', 'content': 'fe80::1'},
             ]
         },
+        plan_writer=None,
+        keep=True,
+        unchanged_domains=set(),
+    )
+    mock_execute_operations_plan.assert_not_called()
+
+
+def test_cli_templates(runner, monkeypatch):
+    mock_api = Mock()
+    monkeypatch.setattr(api, "PorkbunAPI", mock_api)
+    mock_api().get_my_ip.return_value = "10.0.0.1"
+    monkeypatch.setattr(engine, 'collect_existing_dns_records', Mock())
+    mock_plan_operations = Mock()
+    monkeypatch.setattr(engine, 'plan_operations', mock_plan_operations)
+
+    result = runner.invoke(cli.main, ['tests/config_templates.yml', '--dry-run'])
+
+    assert result.exit_code == 0
+    config_domains = mock_plan_operations.call_args.args[3]
+    assert dict(config_domains) == {
+        "example.com": [
+            {"name": "test", "type": "TXT", "content": "mock entry"},
+            {"name": "", "type": "A", "content": "10.0.0.1"},
+            {"name": "www", "type": "CNAME", "content": "example.com"},
+            {"name": "", "type": "MX", "content": "mail.example.com", "prio": 10},
+            {"name": "", "type": "TXT", "content": "v=spf1 mx -all"},
+        ],
+        "example.org": [
+            {"name": "", "type": "MX", "content": "mail.example.com", "prio": 10},
+            {"name": "", "type": "TXT", "content": "v=spf1 mx ~all"},
+        ],
+    }
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_cli_startup_overlaps_ping(runner, monkeypatch, jobs):
+    mock_api = Mock()
+    monkeypatch.setattr(api, "PorkbunAPI", mock_api)
+
+    def get_my_ip():
+        time.sleep(0.2)
+        return "some-ip-address"
+
+    def iter_dns_records(domain_name):
+        time.sleep(0.2)
+        return iter([])
+
+    mock_api().get_my_ip.side_effect = get_my_ip
+    mock_api().iter_dns_records.side_effect = iter_dns_records
+    monkeypatch.setattr(engine, 'plan_operations', Mock())
+
+    start = time.perf_counter()
+    result = runner.invoke(cli.main, ['tests/config.yml', '--dry-run', '--jobs', jobs])
+    elapsed = time.perf_counter() - start
+
+    assert result.exit_code == 0
+    # the first zone is retrieved while the credentials are checked, results are reported after
+    assert elapsed < 0.35
+    assert result.output.splitlines()[1:3] == [
+        "IP address reported by API 'some-ip-address'",
+        "- querying records for 'example.com' .. done",
+    ]
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_cli_startup_invalid_credentials(runner, monkeypatch, jobs):
+    mock_api = Mock()
+    monkeypatch.setattr(api, "PorkbunAPI", mock_api)
+    mock_api().get_my_ip.side_effect = RuntimeError("get_my_ip failed: Invalid API key.")
+    mock_api().iter_dns_records.side_effect = RuntimeError("iter_dns_records failed: Invalid API key.")
+    mock_plan_operations = Mock()
+    monkeypatch.setattr(engine, 'plan_operations', mock_plan_operations)
+
+    result = runner.invoke(cli.main, ['tests/config.yml', '--dry-run', '--jobs', jobs])
+
+    assert result.exit_code == 1
+    assert "querying Porkbun API failed: get_my_ip failed: Invalid API key." in result.output
+    # retrieval results are thrown away
+    assert "querying records" not in result.output
+    mock_plan_operations.assert_not_called()
+
+
+def test_cli_startup_ip_template(runner, monkeypatch, tmp_path):
+    config_file = tmp_path / "config.yml"
+    config_file.write_text(
+        "api:\n  apikey: key\n  secretapikey: secret\n"
+        "templates:\n  web:\n    records:\n      - {name: '', type: A, content: '{{ip}}'}\n"
+        "domains:\n  - name: example.com\n    include: [web]\n"
+    )
+    mock_api = Mock()
+    monkeypatch.setattr(api, "PorkbunAPI", mock_api)
+    mock_api().get_my_ip.return_value = "10.0.0.1"
+    mock_api().list_dns_records.return_value = []
+    mock_plan_operations = Mock()
+    monkeypatch.setattr(engine, 'plan_operations', mock_plan_operations)
+
+    result = runner.invoke(cli.main, [str(config_file), '--dry-run', '--targeted-lookups', '2'])
+
+    assert result.exit_code == 0
+    # records are expanded with the IP address once it is reported
+    mock_api().list_dns_records.assert_called_once_with("example.com", [("", "A")])
+    assert dict(mock_plan_operations.call_args.args[3]) == {
+        "example.com": [{"name": "", "type": "A", "content": "10.0.0.1"}]
+    }
+
+
+def test_cli_all_domains_drift(runner, monkeypatch, tmp_path):
+    config_file = tmp_path / "config.yml"
+    config_file.write_text(
+        "api:\n  apikey: key\n  secretapikey: secret\n"
+        "defaults:\n  records:\n    - {name: '', type: A, content: 1.2.3.4}\n"
+        "domains:\n  - name: example.com\n    records: []\n"
     )
+    mock_api = Mock()
+    monkeypatch.setattr(api, "PorkbunAPI", mock_api)
+    mock_api().get_my_ip.return_value = "10.0.0.1"
+    mock_api().list_all_domains.return_value = [{"domain": "example.com"}, {"domain": "other.com"}]
+    mock_collect_existing_dns_records = Mock()
+    monkeypatch.setattr(engine, 'collect_existing_dns_records', mock_collect_existing_dns_records)
+    mock_plan_operations = Mock()
+    monkeypatch.setattr(engine, 'plan_operations', mock_plan_operations)
+    mock_execute_operations_plan = Mock()
+    monkeypatch.setattr(engine, 'execute_operations_plan', mock_execute_operations_plan)
+
+    result = runner.invoke(cli.main, [str(config_file), '--all-domains', 'drift', '--jobs', '3'])
+
+    assert result.exit_code == 0
+    assert "found 1 domains in the account not included in current configuration" in result.output
+    mock_api().list_all_domains.assert_called_once_with(3)
+    mock_collect_existing_dns_records.assert_called_once_with(
+        mock_api(),
+        ["example.com", "other.com"],
+        2,
+        name_types={"example.com": [], "other.com": [("", "A")]},
+        jobs=3,
+        verify=ANY,
+    )
+    assert dict(mock_plan_operations.call_args.args[3]) == {
+        "example.com": [],
+        "other.com": [{"name": "", "type": "A", "content": "1.2.3.4"}],
+    }
     mock_execute_operations_plan.assert_not_called()
 
 
+@pytest.mark.parametrize("all_domains", ["apply", "drift"])
+def test_cli_all_domains_without_defaults(runner, monkeypatch, tmp_path, all_domains):
+    config_file = tmp_path / "config.yml"
+    config_file.write_text(
+        "api:\n  apikey: key\n  secretapikey: secret\n" "domains:\n  - name: example.com\n    records: []\n"
+    )
+    mock_api = Mock()
+    monkeypatch.setattr(api, "PorkbunAPI", mock_api)
+
+    result = runner.invoke(cli.main, [str(config_file), '--all-domains', all_domains, '--mode', 'replace'])
+
+    assert result.exit_code == 1
+    assert result.stdout == f"--all-domains requires a 'defaults' section in {config_file}\n"
+    # other domains are not emptied
+    mock_api.assert_not_called()
+
+
+EXPORTED_RECORDS = {
+    "example.com": [
+        {"id": "1", "name": "example.com", "type": "A", "content": "1.2.3.4", "ttl": "600", "prio": "0", "notes": ""},
+        {"id": "2", "name": "www.example.com", "type": "CNAME", "content": "example.com", "ttl": "600", "prio": None},
+        {"id": "3", "name": "example.com", "type": "MX", "content": "mx1.example.com", "ttl": "600", "prio": "10"},
+        {"id": "4", "name": "example.com", "type": "MX", "content": "mx2.example.com", "ttl": "600", "prio": "20"},
+        {"id": "5", "name": "example.com", "type": "TXT", "content": "v=spf1 mx -all", "ttl": "3600", "prio": None},
+    ],
+    "other.com": [
+        {"id": "6", "name": "*.other.com", "type": "A", "content": "10.0.0.1", "ttl": "600", "prio": None},
+    ],
+    "fail.com": RuntimeError("API Error"),
+}
+
+
+def _list_exported_records(domain_name):
+    records = EXPORTED_RECORDS[domain_name]
+    if isinstance(records, Exception):
+        raise records
+    return records
+
+
+def test_cli_export_round_trip(runner, monkeypatch, tmp_path):
+    mock_api = Mock()
+    monkeypatch.setattr(api, "PorkbunAPI", mock_api)
+    mock_api().list_all_domains.return_value = [{"domain": x} for x in EXPORTED_RECORDS]
+    mock_api().list_dns_records.side_effect = _list_exported_records
+
+    output_file = tmp_path / "exported.yml"
+    result = runner.invoke(cli.main, ['export', 'tests/config.yml', '-o', str(output_file), '-j', '2', '-v'])
+
+    assert result.exit_code == 0
+    mock_api().list_all_domains.assert_called_once_with(2)
+    assert "exported 5 records of 'example.com'" in result.stderr
+    assert "exporting records of 'fail.com' failed: API Error" in result.stderr
+
+    config = utils.load_config(str(output_file))
+    assert config["api"] == {
+        **utils.load_config("tests/config.yml")["api"],
+        "apikey": "<your API key>",
+        "secretapikey": "<your secret API key>",
+    }
+    assert [x["name"] for x in config["domains"]] == ["example.com", "other.com"]
+    config_domains = {entry["name"]: entry["records"] for entry in config["domains"]}
+    existing_domains = {name: EXPORTED_RECORDS[name] for name in config_domains}
+    for mode in ["append", "replace", "update", "upgrade"]:
+        plan = engine.plan_operations(mode, 0, existing_domains, config_domains)
+        assert plan == {"example.com": [], "other.com": []}, mode
+
+
+def test_cli_export_domains(runner, monkeypatch):
+    mock_api = Mock()
+    monkeypatch.setattr(api, "PorkbunAPI", mock_api)
+    mock_api().list_dns_records.side_effect = _list_exported_records
+
+    result = runner.invoke(cli.main, ['export', 'tests/config.yml', 'other.com'])
+
+    assert result.exit_code == 0
+    mock_api().list_all_domains.assert_not_called()
+    assert result.output.endswith(
+        "domains:\n- name: other.com\n  records:\n  - name: '*'\n    type: A\n    content: 10.0.0.1\n    ttl: '600'\n"
+    )
+
+
+def test_cli_export_credentials(runner, monkeypatch):
+    mock_api = Mock()
+    monkeypatch.setattr(api, "PorkbunAPI", mock_api)
+    mock_api().list_dns_records.side_effect = _list_exported_records
+    api_config = utils.load_config("tests/config.yml")["api"]
+
+    result = runner.invoke(cli.main, ['export', 'tests/config.yml', 'other.com'])
+
+    assert result.exit_code == 0
+    # the API keys are not written out by default
+    assert api_config["apikey"] not in result.output
+    assert api_config["secretapikey"] not in result.output
+
+    result = runner.invoke(cli.main, ['export', 'tests/config.yml', 'other.com', '--include-credentials'])
+
+    assert result.exit_code == 0
+    assert f"apikey: {api_config['apikey']}\n" in result.output
+    assert f"secretapikey: {api_config['secretapikey']}\n" in result.output
+
+
+def _fake_post(url, data=None, headers=None, stream=False, timeout=None):
+    path = url[len("https://porkbun.com/api/json/v3/") :]
+    bodies = {
+        "ping": {"status": "SUCCESS", "yourIp": "10.0.0.1"},
+        "dns/retrieve/example.com": {
+            "status": "SUCCESS",
+            "records": [
+                {"id": "1", "name": "example.com", "type": "A", "content": "192.168.192.168", "ttl": "600"},
+                {"id": "2", "name": "www.example.com", "type": "A", "content": "10.0.0.1", "ttl": "600"},
+            ],
+        },
+    }
+    return transport._BufferedResponse(200, json.dumps(bodies[path]).encode("utf-8"))
+
+
+def test_cli_record_replay(runner, monkeypatch, tmp_path):
+    import requests
+
+    cassette = str(tmp_path / "cassette.jsonl.gz")
+    mock_post = Mock(side_effect=_fake_post)
+    monkeypatch.setattr(requests.Session, "post", mock_post)
+
+    recorded = runner.invoke(cli.main, ['tests/config.yml', '--dry-run', '--mode', 'upgrade', '--record', cassette])
+    assert recorded.exit_code == 0
+    assert mock_post.call_count == 2
+    assert "update A-record 'www.example.com'" in recorded.output
+
+    # no network access while replaying
+    mock_post.reset_mock()
+    replayed = runner.invoke(cli.main, ['tests/config.yml', '--dry-run', '--mode', 'upgrade', '--replay', cassette])
+    assert replayed.exit_code == 0
+    mock_post.assert_not_called()
+    assert replayed.output == recorded.output
+
+
+def test_cli_record_replay_invalid(runner, tmp_path):
+    cassette = tmp_path / "cassette.jsonl.gz"
+    cassette.write_bytes(b"")
+
+    result = runner.invoke(cli.main, ['tests/config.yml', '--record', str(cassette), '--replay', str(cassette)])
+    assert result.exit_code == 2
+    assert "--record and --replay are mutually exclusive" in result.stderr
+
+    result = runner.invoke(cli.main, ['tests/config.yml', '--replay', str(cassette), '--replay-latency', 'slow'])
+    assert result.exit_code == 2
+    assert "expected 'none', 'recorded' or a number of seconds" in result.stderr
+
+
+def test_cli_profile(runner, monkeypatch, tmp_path):
+    import requests
+
+    monkeypatch.setattr(requests.Session, "post", Mock(side_effect=_fake_post))
+    path = tmp_path / "profile.pstats"
+
+    result = runner.invoke(cli.main, ['tests/config.yml', '--dry-run', '--profile', str(path), '--profile-top', '2'])
+
+    assert result.exit_code == 0
+    assert path.exists()
+    assert "\tPROFILE" not in result.stdout
+    # phases up to the end of a dry run are reported after all log messages
+    assert result.stderr.startswith("\n\tPROFILE\n")
+    for phase in ["load_config", "collect", "plan"]:
+        assert f"{phase}: top 2 functions by own time" in result.stderr
+    assert "execute:" not in result.stderr
+
+
+def test_cli_log_format_json(runner, monkeypatch):
+    mock_api = Mock()
+    monkeypatch.setattr(api, "PorkbunAPI", mock_api)
+    mock_api().get_my_ip.return_value = "some-ip-address"
+    monkeypatch.setattr(engine, 'collect_existing_dns_records', Mock())
+    monkeypatch.setattr(engine, 'plan_operations', Mock())
+
+    result = runner.invoke(cli.main, ['tests/config.yml', '--dry-run', '--log-format', 'json'])
+
+    assert result.exit_code == 0
+    events = [json.loads(line) for line in result.output.splitlines()]
+    assert [x["message"] for x in events] == [
+        "dry run requested, enable verbose output",
+        "IP address reported by API 'some-ip-address'",
+        "dry run requested, skipping execution",
+    ]
+    assert events[1]["ip"] == "some-ip-address"
+
+
+def test_json_events_per_operation(monkeypatch, capsys):
+    monkeypatch.setattr(engine, "event_log", log.EventLog(fmt="json"))
+    mock_api = Mock()
+    mock_api.iter_dns_records.return_value = iter([])
+    mock_api.create_record.side_effect = [None, RuntimeError("create_record failed: Invalid content.")]
+    operations_plan = {
+        "example.com": [
+            {"operation": "create", "new": {"name": "", "type": "A", "content": "10.0.0.1"}},
+            {"operation": "create", "new": {"name": "www", "type": "A", "content": "10.0.0.1"}},
+            {"operation": "delete", "existing": {"name": "old.example.com", "type": "A", "content": "10.0.0.2"}},
+        ]
+    }
+
+    engine.collect_existing_dns_records(mock_api, ["example.com"], 1)
+    engine.execute_operations_plan(mock_api, 1, operations_plan)
+    engine.event_log.flush()
+
+    # one event for every domain retrieved and every operation, not the fragments of text output
+    events = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [x["message"] for x in events if "result" in x] == [
+        "- querying records for 'example.com' .. done",
+        "create A-record 'example.com' ... done",
+        "create A-record 'www.example.com' ... failed",
+        "delete A-record 'old.example.com' ... not implemented - skipped",
+    ]
+    assert [(x["domain"], x["op"], x["name"], x["status"]) for x in events if "status" in x] == [
+        ("example.com", "create", "example.com", "applied"),
+        ("example.com", "create", "www.example.com", "failed"),
+        ("example.com", "delete", "old.example.com", "skipped"),
+    ]
+    assert not [x for x in events if x["message"] in ["done", "failed"]]
+
+
+def test_cli_log_settings_reset(runner, monkeypatch):
+    mock_api = Mock()
+    monkeypatch.setattr(api, "PorkbunAPI", mock_api)
+    mock_api().get_my_ip.return_value = "some-ip-address"
+    mock_api().list_dns_records.side_effect = _list_exported_records
+    monkeypatch.setattr(engine, 'collect_existing_dns_records', Mock())
+    monkeypatch.setattr(engine, 'plan_operations', Mock())
+
+    result = runner.invoke(cli.main, ['tests/config.yml', '--dry-run', '--log-format', 'json'])
+    assert result.exit_code == 0
+    result = runner.invoke(cli.main, ['export', 'tests/config.yml', 'other.com', '-v'])
+
+    # the log format of the previous command does not carry over
+    assert result.exit_code == 0
+    assert result.stderr == "- exported 1 records of 'other.com'\n"
+
+
+def test_cli_output_ndjson(runner, monkeypatch):
+    mock_api = Mock()
+    monkeypatch.setattr(api, "PorkbunAPI", mock_api)
+    mock_api().get_my_ip.return_value = "some-ip-address"
+    mock_api().iter_dns_records.return_value = [
+        {"id": "1", "name": "example.com", "type": "A", "content": "192.168.192.168"},
+        {"id": "2", "name": "www.example.com", "type": "A", "content": "10.0.0.1"},
+    ]
+
+    result = runner.invoke(cli.main, ['tests/config.yml', '--dry-run', '--mode', 'upgrade', '--output', 'ndjson'])
+
+    assert result.exit_code == 0
+    entries = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [(x["type"], x.get("op"), x.get("new", {}).get("name")) for x in entries[:4]] == [
+        ("operation", "create", "autoconfig"),
+        ("operation", "create", "git"),
+        ("operation", "create", "mail"),
+        ("operation", "update", "www"),
+    ]
+    assert entries[-1] == {
+        "type": "summary",
+        "domain": "example.com",
+        "skipped": False,
+        "create": 11,
+        "update": 1,
+        "delete": 0,
+    }
+    assert "dry run requested, skipping execution" in result.stderr
+
+
+def test_cli_state_dir(runner, monkeypatch, tmp_path):
+    mock_api = Mock()
+    monkeypatch.setattr(api, "PorkbunAPI", mock_api)
+    mock_api().get_my_ip.return_value = "some-ip-address"
+    records = [
+        {"id": str(i), "name": f"{name}.example.com" if name else "example.com", "type": rtype, "content": content}
+        for i, (name, rtype, content) in enumerate(
+            [
+                ("", "A", "192.168.192.168"),
+                ("autoconfig", "A", "192.168.192.168"),
+                ("git", "A", "192.168.192.168"),
+                ("mail", "A", "192.168.192.168"),
+                ("www", "A", "192.168.192.168"),
+                ("", "MX", "mail.example.com"),
+                ("", "TXT", "mock entry 1"),
+                ("test", "TXT", "mock entry 2"),
+                ("", "AAAA", "fe80::1"),
+                ("autoconfig", "AAAA", "fe80::1"),
+                ("git", "AAAA", "fe80::1"),
+                ("mail", "AAAA", "fe80::1"),
+                ("www", "AAAA", "fe80::1"),
+            ]
+        )
+    ]
+    mock_api().iter_dns_records.return_value = records
+    mock_api().zone_fingerprints = {"example.com": "zone-fingerprint"}
+
+    args = ['tests/config.yml', '--dry-run', '-vvv', '--state-dir', str(tmp_path)]
+
+    # first run compares all records and stores the fingerprints
+    result = runner.invoke(cli.main, args)
+    assert result.exit_code == 0
+    assert "found matching" in result.output
+    assert (tmp_path / "zones.json").exists()
+
+    # second run skips planning for the unchanged zone
+    mock_index = Mock()
+    monkeypatch.setattr(cli.utils, "index_records_by_name_type", mock_index)
+    result = runner.invoke(cli.main, args)
+    assert result.exit_code == 0
+    assert "no changes in 'example.com' since last run" in result.output
+    mock_index.assert_not_called()
+
+
+def test_cli_latency_history(runner, monkeypatch, tmp_path):
+    mock_api = Mock()
+    monkeypatch.setattr(api, "PorkbunAPI", mock_api)
+    mock_api().get_my_ip.return_value = "some-ip-address"
+    mock_api().zone_fingerprints = {}
+    mock_api().rate_limiter = None
+    monkeypatch.setattr(engine, "collect_existing_dns_records", Mock(return_value="existing-records"))
+    monkeypatch.setattr(engine, "plan_operations", Mock(return_value={"example.com": [{"operation": "update"}] * 24}))
+    mock_execute_operations_plan = Mock(return_value=[])
+    monkeypatch.setattr(engine, "execute_operations_plan", mock_execute_operations_plan)
+    (tmp_path / "history.json").write_text(
+        json.dumps(
+            {
+                "families": {"dns/edit": {"latency": 0.5, "error_rate": 0.05, "throttle_rate": 0.0, "requests": 40}},
+                "safe_rate": 4.0,
+                "throttled_rate": None,
+            }
+        )
+    )
+
+    result = runner.invoke(cli.main, ["tests/config.yml", "--state-dir", str(tmp_path), "-v"], input="y")
+
+    assert result.exit_code == 0
+    lines = result.output.splitlines()
+    assert "4 concurrent API requests chosen from latency history" in lines
+    assert lines[-3:-1] == [
+        "estimated 24 API calls taking 3 s with 4 concurrent requests, throttling risk unknown",
+        "about 1 of them may fail judging by errors of previous runs",
+    ]
+    assert mock_execute_operations_plan.call_args.kwargs["jobs"] == 4
+    # requests of the run are observed
+    assert mock_api().observer.__name__ == "observe"
+
+
 @pytest.mark.parametrize(
     "data",
     [
@@ -109,28 +670,29 @@ def test_cli_abort(runner, monkeypatch, data):
     mock_api().get_my_ip.return_value = "some-ip-address"
 
     mock_collect_existing_dns_records = Mock()
-    monkeypatch.setattr(cli, '_collect_existing_dns_records', mock_collect_existing_dns_records)
+    monkeypatch.setattr(engine, 'collect_existing_dns_records', mock_collect_existing_dns_records)
     mock_collect_existing_dns_records.return_value = "existing-records"
 
     mock_plan_operations = Mock()
-    monkeypatch.setattr(cli, '_plan_operations', mock_plan_operations)
+    monkeypatch.setattr(engine, 'plan_operations', mock_plan_operations)
     mock_plan_operations.return_value = "operations-plan"
 
     mock_execute_operations_plan = Mock()
-    monkeypatch.setattr(cli, '_execute_operations_plan', mock_execute_operations_plan)
+    monkeypatch.setattr(engine, 'execute_operations_plan', mock_execute_operations_plan)
 
     result = runner.invoke(cli.main, ['tests/config.yml', '--mode', 'replace', '--verbose'], input=data)
 
-    print(f"output : '{result.output.strip()}'")
-
     assert result.exit_code == 0
     assert not result.exception
-    assert result.output.strip() == '\n'.join(
-        ["IP address reported by API 'some-ip-address'", "Would you like to proceed? [yN]: ", "Operation aborted."]
+    assert result.stdout.strip() == '\n'.join(
+        ["IP address reported by API 'some-ip-address'", "Would you like to proceed? [yN]:"]
     )
+    assert result.stderr == "Operation aborted.\n"
 
     # Assertions on calls
-    mock_collect_existing_dns_records.assert_called_once_with(mock_api(), ["example.com"], 1)
+    mock_collect_existing_dns_records.assert_called_once_with(
+        mock_api(), ["example.com"], 1, name_types={}, jobs=1, verify=ANY
+    )
     mock_plan_operations.assert_called_once_with(
         "replace",
         1,
@@ -152,6 +714,9 @@ def test_cli_abort(runner, monkeypatch, data):
                 {'name': 'www', 'type': 'AAAA', 'content': 'fe80::1'},
             ]
         },
+        plan_writer=None,
+        keep=True,
+        unchanged_domains=set(),
     )
     mock_execute_operations_plan.assert_not_called()
 
@@ -162,15 +727,15 @@ def test_cli(runner, monkeypatch):
     mock_api().get_my_ip.return_value = "some-ip-address"
 
     mock_collect_existing_dns_records = Mock()
-    monkeypatch.setattr(cli, '_collect_existing_dns_records', mock_collect_existing_dns_records)
+    monkeypatch.setattr(engine, 'collect_existing_dns_records', mock_collect_existing_dns_records)
     mock_collect_existing_dns_records.return_value = "existing-records"
 
     mock_plan_operations = Mock()
-    monkeypatch.setattr(cli, '_plan_operations', mock_plan_operations)
+    monkeypatch.setattr(engine, 'plan_operations', mock_plan_operations)
     mock_plan_operations.return_value = "operations-plan"
 
     mock_execute_operations_plan = Mock()
-    monkeypatch.setattr(cli, '_execute_operations_plan', mock_execute_operations_plan)
+    monkeypatch.setattr(engine, 'execute_operations_plan', mock_execute_operations_plan)
 
     result = runner.invoke(cli.main, ['tests/config.yml', '--mode', 'replace', '--verbose'], input='y')
 
@@ -183,7 +748,9 @@ def test_cli(runner, monkeypatch):
     )
 
     # Assertions on calls
-    mock_collect_existing_dns_records.assert_called_once_with(mock_api(), ["example.com"], 1)
+    mock_collect_existing_dns_records.assert_called_once_with(
+        mock_api(), ["example.com"], 1, name_types={}, jobs=1, verify=ANY
+    )
     mock_plan_operations.assert_called_once_with(
         "replace",
         1,
@@ -205,29 +772,34 @@ def test_cli(runner, monkeypatch):
                 {'name': 'www', 'type': 'AAAA', 'content': 'fe80::1'},
             ]
         },
+        plan_writer=None,
+        keep=True,
+        unchanged_domains=set(),
+    )
+    mock_execute_operations_plan.assert_called_once_with(
+        mock_api(), 1, "operations-plan", jobs=1, priorities={}, deadline=None
     )
-    mock_execute_operations_plan.assert_called_once_with(mock_api(), 1, "operations-plan")
 
 
 class TestHelpers(TestCase):
 
-    @patch('porkbun_api_cli.cli._log_if_level')
+    @patch('porkbun_api_cli.engine.log_if_level')
     def test_collect_existing_dns_records(self, mock_log_if_level):
         mock_api = Mock()
 
-        def list_dns_records_side_effect(domain_name):
+        def iter_dns_records_side_effect(domain_name):
             if domain_name == "fail.com":
                 raise RuntimeError("API Error")
-            return {"record1": "value1", "record2": "value2"}
+            return iter([{"record1": "value1"}, {"record2": "value2"}])
 
-        mock_api.list_dns_records.side_effect = list_dns_records_side_effect
+        mock_api.iter_dns_records.side_effect = iter_dns_records_side_effect
 
         domain_names = ["pass.com", "fail.com"]
         verbose = 2
-        result = cli._collect_existing_dns_records(mock_api, domain_names, verbose)
+        result = engine.collect_existing_dns_records(mock_api, domain_names, verbose)
 
         # Assertions on result
-        self.assertEqual(result, {"pass.com": {"record1": "value1", "record2": "value2"}, "fail.com": None})
+        self.assertEqual(result, {"pass.com": [{"record1": "value1"}, {"record2": "value2"}], "fail.com": None})
 
         # Assertions on log calls
         expected_calls = [
@@ -238,9 +810,64 @@ class TestHelpers(TestCase):
             call(0, 2, "Querying records for 'fail.com' failed: API Error", file=sys.stderr),
         ]
 
-        self.assertListEqual(expected_calls, mock_log_if_level.mock_calls)
+        self.assertListEqual(expected_calls, _render_log_calls(mock_log_if_level.mock_calls))
+
+    @patch('porkbun_api_cli.engine.log_if_level')
+    def test_collect_existing_dns_records_concurrently(self, mock_log_if_level):
+        mock_api = Mock()
+
+        def iter_dns_records_side_effect(domain_name):
+            if domain_name == "fail.com":
+                raise RuntimeError("API Error")
+            return iter([{"name": domain_name}])
+
+        mock_api.iter_dns_records.side_effect = iter_dns_records_side_effect
+
+        domain_names = [f"domain{i}.com" for i in range(10)] + ["fail.com"]
+        result = engine.collect_existing_dns_records(mock_api, domain_names, 2, jobs=4)
+
+        # Assertions on result
+        self.assertEqual(list(result), domain_names)
+        self.assertEqual(result["domain3.com"], [{"name": "domain3.com"}])
+        self.assertIsNone(result["fail.com"])
+
+        # Assertions on log calls, reported in order
+        expected_calls = [call(0, 2, f"- querying records for '{x}' .. done") for x in domain_names[:-1]] + [
+            call(0, 2, "- querying records for 'fail.com' .. failed"),
+            call(0, 2, "Querying records for 'fail.com' failed: API Error", file=sys.stderr),
+        ]
+        self.assertListEqual(expected_calls, _render_log_calls(mock_log_if_level.mock_calls))
+
+    def test_select_targeted_lookups(self):
+        config_domains = {
+            "small.com": [
+                {"name": "", "type": "A", "content": "127.0.0.1"},
+                {"name": "", "type": "A", "content": "127.0.0.2"},
+                {"name": "www", "type": "A", "content": "127.0.0.1"},
+            ],
+            "large.com": [{"name": f"host{i}", "type": "A", "content": "127.0.0.1"} for i in range(4)],
+        }
+
+        self.assertEqual(
+            engine.select_targeted_lookups("upgrade", config_domains, 3), {"small.com": [("", "A"), ("www", "A")]}
+        )
+        self.assertEqual(engine.select_targeted_lookups("upgrade", config_domains, 0), {})
+        self.assertEqual(engine.select_targeted_lookups("replace", config_domains, 3), {})
+
+    @patch('porkbun_api_cli.engine.log_if_level')
+    def test_collect_existing_dns_records_name_types(self, mock_log_if_level):
+        mock_api = Mock()
+        mock_api.list_dns_records.return_value = []
+        mock_api.iter_dns_records.return_value = iter([])
+
+        engine.collect_existing_dns_records(
+            mock_api, ["small.com", "large.com"], 0, name_types={"small.com": [("", "A")]}
+        )
+
+        mock_api.list_dns_records.assert_called_once_with("small.com", [("", "A")])
+        mock_api.iter_dns_records.assert_called_once_with("large.com")
 
-    @patch('porkbun_api_cli.cli._log_if_level')
+    @patch('porkbun_api_cli.engine.log_if_level')
     def test_plan_operations_replace_mode(self, mock_log_if_level):
         mode = "replace"
         verbose = 2
@@ -273,7 +900,7 @@ class TestHelpers(TestCase):
         }
 
         # Calling the function
-        result = cli._plan_operations(mode, verbose, existing_domains, config_domains)
+        result = engine.plan_operations(mode, verbose, existing_domains, config_domains)
 
         # Assertions on result
         self.assertEqual(len(result), 4)  # Four domains processed
@@ -307,9 +934,45 @@ class TestHelpers(TestCase):
             call(2, 2, "\t- delete MX-record 'mail.replace.com'"),
         ]
 
-        self.assertListEqual(expected_calls, mock_log_if_level.mock_calls)
+        self.assertListEqual(expected_calls, _render_log_calls(mock_log_if_level.mock_calls))
 
-    @patch('porkbun_api_cli.cli._log_if_level')
+    @patch('porkbun_api_cli.engine.log_if_level')
+    def test_plan_operations_shared_name_type(self, mock_log_if_level):
+        existing_domains = {
+            "mx.com": [
+                {"name": "mx.com", "type": "MX", "content": "mx1.mx.com", "ttl": 600},
+                {"name": "mx.com", "type": "MX", "content": "mx2.mx.com", "ttl": 600},
+            ],
+        }
+        config_domains = {
+            "mx.com": [
+                {"name": "", "type": "MX", "content": "mx3.mx.com", "ttl": 600},
+                {"name": "", "type": "MX", "content": "mx1.mx.com", "ttl": 600},
+                {"name": "", "type": "MX", "content": "mx4.mx.com", "ttl": 600},
+            ],
+        }
+
+        result = engine.plan_operations("replace", 0, existing_domains, config_domains)
+        # exact matches are kept, remaining records update remaining existing ones or are created
+        self.assertEqual(
+            [(x["operation"], x["new"]["content"], (x["existing"] or {}).get("content")) for x in result["mx.com"]],
+            [("update", "mx3.mx.com", "mx2.mx.com"), ("create", "mx4.mx.com", None)],
+        )
+
+        result = engine.plan_operations("append", 0, existing_domains, {"mx.com": config_domains["mx.com"][1:2]})
+        self.assertEqual(result, {"mx.com": []})
+
+        config_domains["mx.com"] = config_domains["mx.com"][1:2] + [{**existing_domains["mx.com"][1], "name": ""}]
+        for mode in ["append", "replace"]:
+            result = engine.plan_operations(mode, 0, existing_domains, config_domains)
+            self.assertEqual(result, {"mx.com": []})
+
+        # a record is created when all records with its name and type match others exactly
+        existing_domains["mx.com"].pop()
+        result = engine.plan_operations("append", 0, existing_domains, config_domains)
+        self.assertEqual([(x["operation"], x["new"]["content"]) for x in result["mx.com"]], [("create", "mx2.mx.com")])
+
+    @patch('porkbun_api_cli.engine.log_if_level')
     def test_plan_operations_append_mode(self, mock_log_if_level):
         mode = "append"
         verbose = 2
@@ -333,7 +996,7 @@ class TestHelpers(TestCase):
         }
 
         # Calling the function
-        result = cli._plan_operations(mode, verbose, existing_domains, config_domains)
+        result = engine.plan_operations(mode, verbose, existing_domains, config_domains)
 
         # Assertions on result
         self.assertEqual(len(result), 3)  # Three domains processed
@@ -353,9 +1016,9 @@ class TestHelpers(TestCase):
             call(0, 2, "skipping 'fail.com': querying existing records failed"),
         ]
 
-        self.assertListEqual(expected_calls, mock_log_if_level.mock_calls)
+        self.assertListEqual(expected_calls, _render_log_calls(mock_log_if_level.mock_calls))
 
-    @patch('porkbun_api_cli.cli._log_if_level')
+    @patch('porkbun_api_cli.engine.log_if_level')
     def test_plan_operations_update_mode(self, mock_log_if_level):
         mode = "update"
         verbose = 2
@@ -379,7 +1042,7 @@ class TestHelpers(TestCase):
         }
 
         # Calling the function
-        result = cli._plan_operations(mode, verbose, existing_domains, config_domains)
+        result = engine.plan_operations(mode, verbose, existing_domains, config_domains)
 
         # Assertions on result
         self.assertEqual(len(result), 3)  # Three domains processed
@@ -399,9 +1062,9 @@ class TestHelpers(TestCase):
             call(3, 2, "\t- found matching MX-record 'mail.update.com'"),
         ]
 
-        self.assertListEqual(expected_calls, mock_log_if_level.mock_calls)
+        self.assertListEqual(expected_calls, _render_log_calls(mock_log_if_level.mock_calls))
 
-    @patch('porkbun_api_cli.cli._log_if_level')
+    @patch('porkbun_api_cli.engine.log_if_level')
     def test_plan_operations_upgrade_mode(self, mock_log_if_level):
         mode = "upgrade"
         verbose = 2
@@ -425,7 +1088,7 @@ class TestHelpers(TestCase):
         }
 
         # Calling the function
-        result = cli._plan_operations(mode, verbose, existing_domains, config_domains)
+        result = engine.plan_operations(mode, verbose, existing_domains, config_domains)
 
         # Assertions on result
         self.assertEqual(len(result), 3)  # Three domains processed
@@ -448,9 +1111,9 @@ class TestHelpers(TestCase):
             call(3, 2, "\t- found matching MX-record 'mail.upgrade.com'"),
         ]
 
-        self.assertListEqual(expected_calls, mock_log_if_level.mock_calls)
+        self.assertListEqual(expected_calls, _render_log_calls(mock_log_if_level.mock_calls))
 
-    @patch('porkbun_api_cli.cli._log_if_level')
+    @patch('porkbun_api_cli.engine.log_if_level')
     def test_execute_operations_plan(self, mock_log_if_level):
         # Mocking API and input arguments
         mock_api = Mock()
@@ -498,11 +1161,13 @@ class TestHelpers(TestCase):
         mock_api.update_record.side_effect = update_record_side_effect
 
         # Calling the function
-        cli._execute_operations_plan(mock_api, verbose, operations_plan)
+        engine.execute_operations_plan(mock_api, verbose, operations_plan)
 
         # Assertions on log calls
         expected_calls = [
             call(1, 2, '\n\tEXECUTION\n'),
+            call(2, 2, 'scheduling 8 operations with 0 dependencies (critical: 5, normal: 3, bulk: 0)'),
+            # address records of domains are critical and go first
             call(1, 2, "- altering domain 'pass.com'"),
             call(1, 2, "\tcreate A-record 'pass.com' ... ", nl=False),
             call(1, 2, 'done'),
@@ -510,17 +1175,268 @@ class TestHelpers(TestCase):
             call(1, 2, 'done'),
             call(1, 2, "\tupdate A-record 'www.pass.com' ... ", nl=False),
             call(1, 2, 'done'),
-            call(1, 2, "\tdelete MX-record 'mail.pass.com' ... ", nl=False),
-            call(0, 2, 'delete operation is not implemented - skipped'),
             call(1, 2, "- altering domain 'fail.com'"),
             call(1, 2, "\tcreate A-record 'www.fail.com' ... ", nl=False),
             call(0, 2, "querying Porkbun API for domain 'fail.com' failed: create_record error"),
             call(1, 2, "\tupdate A-record 'www.fail.com' ... ", nl=False),
             call(0, 2, "querying Porkbun API for domain 'fail.com' failed: update_record error"),
+            call(1, 2, "- altering domain 'pass.com'"),
+            call(1, 2, "\tdelete MX-record 'mail.pass.com' ... ", nl=False),
+            call(0, 2, 'delete operation is not implemented - skipped'),
+            call(1, 2, "- altering domain 'fail.com'"),
             call(1, 2, "\tdelete MX-record 'mail.fail.com' ... ", nl=False),
             call(0, 2, 'delete operation is not implemented - skipped'),
             call(1, 2, "- altering domain 'invalid.com'"),
             call(0, 2, "unknown operation 'invalid'"),
         ]
 
-        self.assertListEqual(expected_calls, mock_log_if_level.mock_calls)
+        self.assertListEqual(expected_calls, _render_log_calls(mock_log_if_level.mock_calls))
+
+    @patch('porkbun_api_cli.engine.log_if_level')
+    def test_execute_operations_plan_concurrently(self, mock_log_if_level):
+        calls = []
+        mock_api = Mock()
+        mock_api.create_record.side_effect = lambda domain_name, record: calls.append(record["name"])
+        operations_plan = {
+            "example.com": [
+                {"operation": "create", "new": {"name": "", "type": "MX", "content": "mail.example.com"}},
+                {"operation": "create", "new": {"name": "mail", "type": "A", "content": "10.0.0.1"}},
+                {"operation": "delete", "existing": {"id": "456", "name": "old.example.com", "type": "A"}},
+            ],
+            "skipped.com": None,
+        }
+
+        engine.execute_operations_plan(mock_api, 1, operations_plan, jobs=4)
+
+        # the MX record is created after its mail server
+        self.assertListEqual(["mail", ""], calls)
+        self.assertCountEqual(
+            [
+                call(1, 1, '\n\tEXECUTION\n'),
+                call(2, 1, 'scheduling 3 operations with 1 dependencies (critical: 0, normal: 3, bulk: 0)'),
+                call(1, 1, "\tcreate A-record 'mail.example.com' ... done"),
+                call(1, 1, "\tdelete A-record 'old.example.com' ... not implemented - skipped"),
+                call(1, 1, "\tcreate MX-record 'example.com' ... done"),
+            ],
+            _render_log_calls(mock_log_if_level.mock_calls),
+        )
+
+    @patch('porkbun_api_cli.engine.log_if_level')
+    def test_execute_operations_plan_short_circuited(self, mock_log_if_level):
+        mock_api = Mock()
+        mock_api.create_record.side_effect = CircuitOpenError("dns/create", 5, 5, 30)
+        operations_plan = {
+            "example.com": [
+                {"operation": "create", "new": {"name": "", "type": "MX", "content": "mail.example.com"}},
+                {"operation": "create", "new": {"name": "mail", "type": "A", "content": "10.0.0.1"}},
+                {"operation": "create", "new": {"name": "txt", "type": "TXT", "content": "token"}},
+            ],
+        }
+
+        engine.execute_operations_plan(mock_api, 1, operations_plan)
+
+        expected_calls = [
+            call(1, 1, '\n\tEXECUTION\n'),
+            call(2, 1, 'scheduling 3 operations with 1 dependencies (critical: 0, normal: 2, bulk: 1)'),
+            call(1, 1, "- altering domain 'example.com'"),
+            call(1, 1, "\tcreate A-record 'mail.example.com' ... ", nl=False),
+            call(1, 1, 'short-circuited'),
+            call(
+                0,
+                1,
+                "Porkbun API is failing: circuit open for 'dns/create' after 5 of 5 recent requests failed,"
+                " next attempt in 30.0 s",
+            ),
+            call(1, 1, "\tcreate MX-record 'example.com' ... ", nl=False),
+            call(1, 1, 'short-circuited'),
+            call(1, 1, "\tcreate TXT-record 'txt.example.com' ... ", nl=False),
+            call(1, 1, 'short-circuited'),
+            call(0, 1, '3 operations were not attempted while the Porkbun API was failing, run again to resume them:'),
+            call(0, 1, "\tcreate MX-record 'example.com'"),
+            call(0, 1, "\tcreate A-record 'mail.example.com'"),
+            call(0, 1, "\tcreate TXT-record 'txt.example.com'"),
+        ]
+        self.assertListEqual(expected_calls, _render_log_calls(mock_log_if_level.mock_calls))
+
+    @patch('porkbun_api_cli.engine.log_if_level')
+    def test_execute_operations_plan_deadline(self, mock_log_if_level):
+        deadline = Mock(expired=False)
+
+        def create_record(domain_name, record):
+            deadline.expired = True
+
+        mock_api = Mock()
+        mock_api.create_record.side_effect = create_record
+        operations_plan = {
+            "example.com": [
+                {"operation": "create", "new": {"name": "mail", "type": "A", "content": "10.0.0.1"}},
+                {"operation": "create", "new": {"name": "", "type": "MX", "content": "mail.example.com"}},
+            ],
+        }
+
+        engine.execute_operations_plan(mock_api, 1, operations_plan, deadline=deadline)
+
+        mock_api.create_record.assert_called_once_with("example.com", operations_plan["example.com"][0]["new"])
+        expected_calls = [
+            call(1, 1, '\n\tEXECUTION\n'),
+            call(2, 1, 'scheduling 2 operations with 1 dependencies (critical: 0, normal: 2, bulk: 0)'),
+            call(1, 1, "- altering domain 'example.com'"),
+            call(1, 1, "\tcreate A-record 'mail.example.com' ... ", nl=False),
+            call(1, 1, 'done'),
+            call(1, 1, "\tcreate MX-record 'example.com' ... ", nl=False),
+            call(1, 1, 'deadline exceeded'),
+            call(
+                0,
+                1,
+                'deadline exceeded with 1 operations applied, 1 operations were not attempted, run again to resume them:',
+            ),
+            call(0, 1, "\tcreate MX-record 'example.com'"),
+        ]
+        self.assertListEqual(expected_calls, _render_log_calls(mock_log_if_level.mock_calls))
+
+
+def test_cli_verify(runner, monkeypatch):
+    mock_api = Mock()
+    monkeypatch.setattr(api, "PorkbunAPI", mock_api)
+    mock_api().get_my_ip.return_value = "some-ip-address"
+    mock_api().get_nameservers.return_value = ["ns1.example.net", "ns2.example.net"]
+    monkeypatch.setattr(engine, "collect_existing_dns_records", Mock(return_value="existing-records"))
+    monkeypatch.setattr(engine, "plan_operations", Mock(return_value="operations-plan"))
+
+    a_record = {"name": "", "type": "A", "content": "10.0.0.1"}
+    mx_record = {"name": "", "type": "MX", "content": "mail.example.com"}
+    results = [
+        ("example.com", {"operation": "create", "new": a_record}, "applied", None),
+        (
+            "example.com",
+            {"operation": "create", "new": {"name": "", "type": "ALIAS", "content": "x.net"}},
+            "applied",
+            None,
+        ),
+        ("example.com", {"operation": "update", "new": mx_record}, "applied", None),
+        ("example.com", {"operation": "create", "new": {"name": "www", "type": "A", "content": "x"}}, "failed", None),
+    ]
+    monkeypatch.setattr(engine, "execute_operations_plan", Mock(return_value=results))
+
+    from porkbun_api_cli import propagation
+
+    mock_verify = Mock(
+        return_value=[
+            propagation.PropagationResult("example.com", a_record, {"ns1.example.net": 1.25, "ns2.example.net": 3.5}),
+            propagation.PropagationResult(
+                "example.com",
+                mx_record,
+                {"ns1.example.net": 2.0, "ns2.example.net": None},
+                {"ns2.example.net": "timed out"},
+            ),
+        ]
+    )
+    monkeypatch.setattr(propagation, "verify", mock_verify)
+
+    result = runner.invoke(cli.main, ["tests/config.yml", "--verify", "--verify-timeout", "30", "--verbose"], input="y")
+
+    assert result.exit_code == 0
+    mock_api().get_nameservers.assert_called_once_with("example.com")
+    mock_verify.assert_called_once_with(
+        [("example.com", a_record), ("example.com", mx_record)],
+        {"example.com": ["ns1.example.net", "ns2.example.net"]},
+        30.0,
+    )
+    assert result.output.split("\n\tVERIFICATION\n\n")[1].splitlines() == [
+        "\tALIAS-record 'example.com' cannot be verified",
+        "waiting up to 30 s for 2 records to be served by 2 nameservers",
+        "\tA-record 'example.com' live after 3.5 s",
+        "\tMX-record 'example.com' not live after 30 s on: ns2.example.net (timed out)",
+        "1 of 2 records live on all nameservers",
+    ]
+
+
+def test_cli_verify_nameservers_failure(runner, monkeypatch):
+    mock_api = Mock()
+    monkeypatch.setattr(api, "PorkbunAPI", mock_api)
+    mock_api().get_my_ip.return_value = "some-ip-address"
+    mock_api().get_nameservers.side_effect = RuntimeError("get_nameservers failed: Invalid domain.")
+    monkeypatch.setattr(engine, "collect_existing_dns_records", Mock(return_value="existing-records"))
+    monkeypatch.setattr(engine, "plan_operations", Mock(return_value="operations-plan"))
+    record = {"name": "", "type": "A", "content": "10.0.0.1"}
+    monkeypatch.setattr(
+        engine,
+        "execute_operations_plan",
+        Mock(return_value=[("example.com", {"operation": "create", "new": record}, "applied", None)]),
+    )
+
+    result = runner.invoke(cli.main, ["tests/config.yml", "--verify"], input="y")
+
+    assert result.exit_code == 0
+    assert result.output.splitlines()[-1] == (
+        "querying nameservers of domain 'example.com' failed: get_nameservers failed: Invalid domain."
+    )
+
+
+def test_cli_lock_dir(runner, monkeypatch, tmp_path):
+    from porkbun_api_cli import locks
+
+    mock_api = Mock()
+    monkeypatch.setattr(api, "PorkbunAPI", mock_api)
+    mock_api().get_my_ip.return_value = "some-ip-address"
+    mock_collect_existing_dns_records = Mock(return_value={})
+    monkeypatch.setattr(engine, "collect_existing_dns_records", mock_collect_existing_dns_records)
+    monkeypatch.setattr(engine, "plan_operations", Mock(return_value={}))
+    monkeypatch.setattr(engine, "execute_operations_plan", Mock(return_value=[]))
+    other_run = locks.DomainLocks(str(tmp_path))
+    other_run.acquire("example.com")
+
+    try:
+        result = runner.invoke(cli.main, ["tests/config.yml", "--lock-dir", str(tmp_path)], input="y")
+
+        assert result.exit_code == 0
+        assert f"domain 'example.com' is locked by {other_run.owner['host']}" in result.output
+        assert mock_collect_existing_dns_records.call_args.args[1] == []
+
+        # dry runs make no changes and take no locks
+        result = runner.invoke(cli.main, ["tests/config.yml", "--lock-dir", str(tmp_path), "--dry-run"])
+        assert result.exit_code == 0
+        assert mock_collect_existing_dns_records.call_args.args[1] == ["example.com"]
+    finally:
+        other_run.release_all()
+
+    result = runner.invoke(cli.main, ["tests/config.yml", "--lock-dir", str(tmp_path)], input="y")
+    assert result.exit_code == 0
+    assert mock_collect_existing_dns_records.call_args.args[1] == ["example.com"]
+    # released when the run finishes
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_cli_serve(runner, monkeypatch, tmp_path):
+    from porkbun_api_cli import ratelimit
+    from porkbun_api_cli import server
+
+    config_file = tmp_path / "config.yml"
+    config_file.write_text(
+        "api:\n  apikey: key\n  secretapikey: secret\n  endpoint: https://porkbun.com/api/json/v3/\n"
+        "domains: []\n"
+        "server:\n  rate_limit: 2\n  clients:\n    host1: {token: 0123456789abcdef, records: [host1.example.com]}\n"
+    )
+    mock_create_server = Mock()
+    mock_create_server.return_value.server_port = 8053
+    mock_create_server.return_value.serve_forever.side_effect = KeyboardInterrupt
+    monkeypatch.setattr(server, "create_server", mock_create_server)
+
+    result = runner.invoke(cli.main, ["serve", str(config_file), "-v"])
+
+    assert result.exit_code == 0
+    assert result.output.splitlines() == ["serving 1 clients on http://127.0.0.1:8053/", "stopped"]
+    service = mock_create_server.call_args.args[0]
+    api = service.cache.api
+    assert isinstance(api.rate_limiter, ratelimit.TokenBucket)
+    assert api.rate_limiter.rate == 2
+    assert api.transport.pool_size == server.POOL_SIZE
+    assert mock_create_server.call_args.kwargs == {"port": 8053, "socket_path": None}
+    mock_create_server.return_value.server_close.assert_called_once_with()
+
+
+def test_cli_serve_invalid_config(runner):
+    result = runner.invoke(cli.main, ["serve", "tests/config.yml"])
+
+    assert result.exit_code == 1
+    assert "'server.clients' must be a mapping" in result.output
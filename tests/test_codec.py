@@ -0,0 +1,55 @@
+import importlib
+import json
+import sys
+
+import pytest
+
+from porkbun_api_cli import codec
+
+
+@pytest.fixture(params=["default", "json"])
+def backend(request, monkeypatch):
+    if request.param == "json":
+        # reload the module as if no faster JSON library was installed
+        monkeypatch.setitem(sys.modules, "orjson", None)
+        importlib.reload(codec)
+        yield codec
+        monkeypatch.undo()
+        importlib.reload(codec)
+    else:
+        yield codec
+
+
+def test_dumps_loads(backend):
+    obj = {"name": "www", "type": "TXT", "content": "v=spf1 \"ünïcode\"", "ttl": 600, "prio": None}
+
+    encoded = backend.dumps(obj)
+    assert isinstance(encoded, bytes)
+    assert json.loads(encoded) == obj
+    assert backend.loads(encoded) == obj
+    assert backend.loads(encoded.decode("utf-8")) == obj
+
+
+def test_loads_invalid(backend):
+    with pytest.raises(ValueError):  # noqa: PT011
+        backend.loads(b"{not json")
+
+
+@pytest.mark.parametrize(
+    ("envelope", "payload", "expected"),
+    [
+        ({"secretapikey": "secret", "apikey": "key"}, None, {"secretapikey": "secret", "apikey": "key"}),
+        ({"secretapikey": "secret", "apikey": "key"}, {}, {"secretapikey": "secret", "apikey": "key"}),
+        (
+            {"secretapikey": "secret", "apikey": "key"},
+            {"name": "www", "ttl": 600},
+            {"secretapikey": "secret", "apikey": "key", "name": "www", "ttl": 600},
+        ),
+        ({}, {"name": "www"}, {"name": "www"}),
+        ({}, None, {}),
+    ],
+)
+def test_encode_with_envelope(backend, envelope, payload, expected):
+    encoded = backend.encode_with_envelope(backend.encode_envelope(envelope), payload)
+
+    assert json.loads(encoded) == expected
@@ -0,0 +1,131 @@
+import json
+
+import pytest
+
+from porkbun_api_cli import history
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def _run(state_dir, clock, requests, jobs=1, latency=0.5, status=200, family="dns/edit"):
+    """Observe a run of requests made ``jobs`` at a time and save the history."""
+    recorder = history.LatencyHistory(state_dir, clock=clock)
+    for i in range(requests):
+        if i % jobs == 0:
+            clock.now += latency
+        recorder.observe(family, latency, status)
+    recorder.save()
+    return history.LatencyHistory(state_dir, clock=clock)
+
+
+def _plan(creates, updates):
+    return {
+        "example.com": [{"operation": "create"}] * creates + [{"operation": "update"}] * updates,
+        "example.org": None,
+        "example.net": [{"operation": "delete"}],
+    }
+
+
+def test_empty_history(tmp_path):
+    recorder = history.LatencyHistory(str(tmp_path))
+
+    assert recorder.suggest_jobs() == 1
+    estimate = recorder.estimate(_plan(2, 3), jobs=4)
+    assert (estimate.calls, estimate.duration, estimate.risk) == (5, None, "unknown")
+    # nothing observed, nothing written
+    recorder.save()
+    assert not (tmp_path / "history.json").exists()
+
+
+def test_observe_and_save(tmp_path):
+    clock = FakeClock()
+
+    recorder = _run(str(tmp_path), clock, 10, jobs=2, latency=0.5)
+    recorder.observe("dns/edit", 1.0, 502)
+
+    assert recorder.latency("dns/edit") == 0.5
+    assert recorder.latency("dns/create") is None
+    # 10 requests in 2.5 s
+    assert recorder.safe_rate == pytest.approx(4.0)
+    assert recorder.throttled_rate is None
+    # requests of a run are merged as moving averages when saved
+    recorder.save()
+    merged = history.LatencyHistory(str(tmp_path))
+    assert merged.families["dns/edit"]["requests"] == 11
+    assert merged.families["dns/edit"]["latency"] == pytest.approx(0.7 * 0.5 + 0.3 * 1.0)
+    assert merged.families["dns/edit"]["error_rate"] == pytest.approx(0.3)
+
+
+def test_idle_time_between_requests(tmp_path):
+    clock = FakeClock()
+    recorder = history.LatencyHistory(str(tmp_path), clock=clock)
+
+    # requests while collecting, a long confirmation prompt, then requests while executing
+    for _ in range(2):
+        for _ in range(5):
+            clock.now += 0.5
+            recorder.observe("dns/edit", 0.5, 200)
+        clock.now += 300
+    recorder.save()
+
+    # 10 requests in flight for 5 s
+    assert history.LatencyHistory(str(tmp_path)).safe_rate == pytest.approx(2.0)
+
+
+def test_suggest_jobs(tmp_path):
+    clock = FakeClock()
+
+    # the sustained rate doubles with every run without throttled responses
+    assert _run(str(tmp_path), clock, 10, jobs=1).suggest_jobs() == 2
+    assert _run(str(tmp_path), clock, 10, jobs=2).suggest_jobs() == 4
+    assert _run(str(tmp_path), clock, 16, jobs=4).suggest_jobs() == 8
+    assert _run(str(tmp_path), clock, 16, jobs=8).suggest_jobs() == history.MAX_JOBS
+
+    # a throttled run caps the number below its rate
+    recorder = _run(str(tmp_path), clock, 16, jobs=8, status=429)
+    assert recorder.throttled_rate == pytest.approx(16.0)
+    assert recorder.safe_rate is None
+    assert recorder.suggest_jobs() == 6
+    # a later run sustaining that rate lifts the cap
+    recorder = _run(str(tmp_path), clock, 20, jobs=10)
+    assert recorder.throttled_rate is None
+    assert recorder.suggest_jobs() == history.MAX_JOBS
+
+
+def test_estimate(tmp_path):
+    clock = FakeClock()
+    _run(str(tmp_path), clock, 10, jobs=2, latency=0.5, family="dns/edit")
+    recorder = _run(str(tmp_path), clock, 10, jobs=2, latency=2.0, family="dns/create")
+
+    estimate = recorder.estimate(_plan(10, 20), jobs=5)
+
+    assert estimate.calls == 30
+    assert estimate.duration == pytest.approx((10 * 2.0 + 20 * 0.5) / 5)
+    assert estimate.failures == 0
+    # 5 concurrent requests at 1 s on average
+    assert estimate.risk == "unknown"
+    assert recorder.estimate(_plan(10, 20), jobs=1).risk == "low"
+    # a rate limit bounds the duration
+    assert recorder.estimate(_plan(10, 20), jobs=5, rate_limit=2).duration == pytest.approx(15.0)
+
+
+def test_estimate_throttling_risk(tmp_path):
+    clock = FakeClock()
+    recorder = _run(str(tmp_path), clock, 16, jobs=8, latency=0.5, status=429)
+
+    assert recorder.estimate(_plan(0, 20), jobs=8).risk == "high"
+    assert recorder.estimate(_plan(0, 20), jobs=2).risk == "unknown"
+    # throttled responses are not counted as errors
+    assert recorder.estimate(_plan(0, 20), jobs=8).failures == 0
+
+
+def test_corrupt_history(tmp_path):
+    (tmp_path / "history.json").write_text(json.dumps({"families": {}}))
+
+    assert history.LatencyHistory(str(tmp_path)).suggest_jobs() == 1
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from porkbun_api_cli import jsonstream
+
+DOCUMENT = {
+    "status": "SUCCESS",
+    "cloudflare": "enabled",
+    "records": [
+        {"id": "1", "name": "example.com", "type": "A", "content": "127.0.0.1", "ttl": "600", "prio": None},
+        {"id": "2", "name": "example.com", "type": "TXT", "content": "v=spf1 [a] {b} \"c\"", "ttl": 600},
+        {"id": "3", "name": "example.com", "type": "MX", "content": "mail.example.com", "prio": 10},
+    ],
+    "count": 12345,
+}
+
+
+def _chunks(text, size):
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 100000])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_iter_array_member(size, indent):
+    text = json.dumps(DOCUMENT, indent=indent)
+    fields = {}
+
+    records = list(jsonstream.iter_array_member(_chunks(text, size), "records", fields))
+
+    assert records == DOCUMENT["records"]
+    assert fields == {"status": "SUCCESS", "cloudflare": "enabled", "count": 12345}
+
+
+@pytest.mark.parametrize(
+    ("text", "expected", "fields"),
+    [
+        ('{}', [], {}),
+        ('{"records": []}', [], {}),
+        ('{"status": "ERROR", "message": "Invalid domain."}', [], {"status": "ERROR", "message": "Invalid domain."}),
+        ('{"records": {"id": 1}}', [], {"records": {"id": 1}}),
+        (' { "records" : [ 1 , 2.5 , -3e2 ] } ', [1, 2.5, -300.0], {}),
+    ],
+)
+def test_iter_array_member_shapes(text, expected, fields):
+    actual_fields = {}
+
+    assert list(jsonstream.iter_array_member(_chunks(text, 1), "records", actual_fields)) == expected
+    assert actual_fields == fields
+
+
+def test_iter_array_member_lazy():
+    def chunks():
+        yield '{"records": [{"id": 1}, '
+        raise AssertionError("first item must be yielded before reading on")
+
+    assert next(jsonstream.iter_array_member(chunks(), "records")) == {"id": 1}
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        '',
+        '[]',
+        '{"records": [{"id": 1}',
+        '{"records": [{"id": 1}}',
+        '{"records": [{"id": 1} {"id": 2}]}',
+        '{"status" "SUCCESS"}',
+        '{"status": SUCCESS}',
+    ],
+)
+def test_iter_array_member_invalid(text):
+    with pytest.raises(ValueError):  # noqa: PT011
+        list(jsonstream.iter_array_member(_chunks(text, 3), "records"))
@@ -0,0 +1,196 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from porkbun_api_cli import locks
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def _locks(path, clock, **kwargs):
+    return locks.DomainLocks(str(path), clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def _entry(path, domain_name):
+    return json.loads((path / f"{domain_name}.lock").read_text())
+
+
+def test_acquire_release(tmp_path, clock):
+    first, second = _locks(tmp_path, clock), _locks(tmp_path, clock)
+
+    first.acquire("example.com")
+    # locking again is a no-op
+    first.acquire("example.com")
+    second.acquire("example.org")
+
+    assert _entry(tmp_path, "example.com")["token"] == first.owner["token"]
+    assert _entry(tmp_path, "example.com")["expires"] == clock.now + locks.LEASE
+    with pytest.raises(locks.DomainLocked, match=r"domain 'example.com' is locked by .+ \(pid \d+\)"):
+        second.acquire("example.com")
+
+    first.release_all()
+    assert not (tmp_path / "example.com.lock").exists()
+    second.acquire("example.com")
+    second.release_all()
+    assert os.listdir(tmp_path) == []
+
+
+def test_acquire_waits(tmp_path, clock):
+    first, second = _locks(tmp_path, clock), _locks(tmp_path, clock)
+    first.acquire("example.com")
+
+    sleep = clock.sleep
+
+    def release_while_waiting(seconds):
+        sleep(seconds)
+        if clock.now - start >= 2:
+            first.release("example.com")
+
+    second.sleep = release_while_waiting
+    start = clock.now
+    second.acquire("example.com", timeout=5)
+
+    assert second.held == {"example.com"}
+    assert 2 <= clock.now - start < 3
+    second.release_all()
+    first.release_all()
+
+
+def test_acquire_timeout(tmp_path, clock):
+    first, second = _locks(tmp_path, clock), _locks(tmp_path, clock)
+    first.acquire("example.com")
+    start = clock.now
+
+    with pytest.raises(locks.DomainLocked, match="domain 'example.com' is locked"):
+        second.acquire("example.com", timeout=3)
+
+    assert clock.now - start == pytest.approx(3)
+    first.release_all()
+
+
+def test_expired_lease(tmp_path, clock):
+    first, second = _locks(tmp_path, clock), _locks(tmp_path, clock)
+    first.acquire("example.com")
+
+    clock.now += locks.LEASE + 1
+    second.acquire("example.com")
+
+    assert _entry(tmp_path, "example.com")["token"] == second.owner["token"]
+    # the previous owner finds out when renewing its lease and leaves the new lock alone
+    first.renew()
+    assert first.held == set()
+    assert first.lost == {"example.com"}
+    first.release_all()
+    assert _entry(tmp_path, "example.com")["token"] == second.owner["token"]
+    second.release_all()
+
+
+def test_renew(tmp_path, clock):
+    first, second = _locks(tmp_path, clock), _locks(tmp_path, clock)
+    first.acquire("example.com")
+
+    clock.now += locks.LEASE - 1
+    first.renew()
+    clock.now += 2
+
+    with pytest.raises(locks.DomainLocked, match="domain 'example.com' is locked"):
+        second.acquire("example.com")
+    assert first.lost == set()
+    first.release_all()
+
+
+@pytest.mark.skipif(os.name != "posix", reason="owner processes are only checked on POSIX")
+def test_owner_gone(tmp_path, clock):
+    process = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+    dead = _locks(tmp_path, clock)
+    dead.owner["pid"] = int(process.stdout)
+    dead.acquire("example.com")
+
+    second = _locks(tmp_path, clock)
+    second.acquire("example.com")
+
+    assert _entry(tmp_path, "example.com")["token"] == second.owner["token"]
+    second.release_all()
+
+
+def test_invalid_lock_file(tmp_path, clock):
+    (tmp_path / "example.com.lock").write_text("{")
+    second = _locks(tmp_path, clock)
+
+    # a run may be writing it
+    with pytest.raises(locks.DomainLocked, match="domain 'example.com' is locked by another run"):
+        second.acquire("example.com")
+
+    # left behind by a run that crashed
+    clock.now += locks.LEASE + 1
+    second.acquire("example.com")
+    second.release_all()
+
+
+def test_breaking_stale_lock_is_guarded(tmp_path, clock):
+    first, second = _locks(tmp_path, clock), _locks(tmp_path, clock)
+    first.acquire("example.com")
+    clock.now += locks.LEASE + 1
+    # another run is breaking the stale lock
+    guard = tmp_path / "example.com.lock.break"
+    guard.touch()
+    os.utime(guard, (clock.now, clock.now))
+
+    with pytest.raises(locks.DomainLocked, match="domain 'example.com' is locked"):
+        second.acquire("example.com", timeout=1)
+
+    # the guard of a run that crashed is removed
+    clock.now += locks.GUARD_TIMEOUT
+    second.acquire("example.com", timeout=1)
+    assert not guard.exists()
+    second.release_all()
+
+
+def test_invalid_domain_name(tmp_path, clock):
+    with pytest.raises(ValueError, match="invalid domain name '../example.com'"):
+        _locks(tmp_path, clock).acquire("../example.com")
+
+
+def test_concurrent_runs(tmp_path):
+    # runs of their own in threads, taking turns on the same domain
+    holders, overlaps = [], []
+
+    def run(index):
+        domain_locks = locks.DomainLocks(str(tmp_path))
+        for _ in range(5):
+            domain_locks.acquire("example.com", timeout=10)
+            holders.append(index)
+            if len(holders) > 1:
+                overlaps.append(list(holders))
+            time.sleep(0.001)
+            holders.remove(index)
+            domain_locks.release("example.com")
+        domain_locks.release_all()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert overlaps == []
+    assert os.listdir(tmp_path) == []
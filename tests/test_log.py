@@ -0,0 +1,107 @@
+import io
+import json
+import sys
+
+import pytest
+
+from porkbun_api_cli import engine
+from porkbun_api_cli import log
+
+
+class Unformattable:
+    def __format__(self, spec):
+        raise AssertionError("filtered events must not be formatted")
+
+
+def test_event_log_text():
+    stream = io.StringIO()
+    event_log = log.EventLog()
+    event_log.emit(0, "querying '{domain}' .. ", file=stream, nl=False, domain="example.com")
+    event_log.emit(0, "done", file=stream)
+
+    # events are buffered until flushed
+    assert stream.getvalue() == ""
+
+    event_log.flush()
+    assert stream.getvalue() == "querying 'example.com' .. done\n"
+
+
+def test_event_log_json():
+    stream = io.StringIO()
+    event_log = log.EventLog(fmt="json")
+    event_log.emit(2, "\t- create {type}-record '{name}'", file=stream, type="A", name="www")
+    event_log.emit(0, "failed: {error}", file=stream, error=RuntimeError("API Error"))
+    event_log.flush()
+
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [(x["level"], x["message"]) for x in events] == [(2, "- create A-record 'www'"), (0, "failed: API Error")]
+    assert events[0]["type"] == "A"
+    assert events[0]["name"] == "www"
+    assert events[1]["error"] == "API Error"
+
+
+def test_event_log_json_stream_name(capsys):
+    event_log = log.EventLog(fmt="json")
+    event_log.emit(0, "message", file=sys.stderr)
+    event_log.flush()
+
+    assert json.loads(capsys.readouterr().err)["stream"] == "stderr"
+
+
+def test_event_log_buffer_size():
+    stream = io.StringIO()
+    event_log = log.EventLog(buffer_size=10, flush_interval=60)
+    event_log.emit(0, "short", file=stream)
+    assert stream.getvalue() == ""
+
+    event_log.emit(0, "long enough", file=stream)
+    assert stream.getvalue() == "short\nlong enough\n"
+
+
+def test_event_log_preserves_stream_order():
+    out, err = io.StringIO(), io.StringIO()
+    event_log = log.EventLog(flush_interval=60)
+    event_log.emit(0, "first", file=out)
+    event_log.emit(0, "second", file=err)
+
+    # switching streams writes out the events buffered for the previous one
+    assert out.getvalue() == "first\n"
+    assert err.getvalue() == ""
+
+
+def test_event_log_reset(capsys):
+    event_log = log.EventLog(fmt="json", flush_interval=60, stream="stderr")
+    event_log.emit(0, "first")
+
+    event_log.reset()
+    event_log.emit(0, "second")
+    event_log.flush()
+
+    # events buffered before are written out with the previous settings
+    out, err = capsys.readouterr()
+    assert json.loads(err)["message"] == "first"
+    assert out == "second\n"
+    with pytest.raises(ValueError, match="unsupported log format 'xml'"):
+        event_log.reset(fmt="xml")
+
+
+def test_event_log_invalid_format():
+    with pytest.raises(ValueError, match="unsupported log format 'xml'"):
+        log.EventLog(fmt="xml")
+
+
+def test_event_log_no_fields_no_format():
+    stream = io.StringIO()
+    event_log = log.EventLog()
+    event_log.emit(0, "literal {braces}", file=stream)
+    event_log.flush()
+
+    assert stream.getvalue() == "literal {braces}\n"
+
+
+def test_log_if_level_filtered(monkeypatch):
+    event_log = log.EventLog()
+    monkeypatch.setattr(engine, "event_log", event_log)
+
+    engine.log_if_level(3, 2, "found {record}", record=Unformattable())
+    assert event_log._chunks == []
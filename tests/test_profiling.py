@@ -0,0 +1,59 @@
+import io
+import pstats
+import time
+import tracemalloc
+
+from porkbun_api_cli import profiling
+
+
+def test_profiler_disabled():
+    profiler = profiling.Profiler(None)
+    with profiler.phase("load_config"):
+        pass
+
+    assert not profiler.enabled
+    assert profiler.phases == []
+    assert not tracemalloc.is_tracing()
+    output = io.StringIO()
+    profiler.report(output)
+    assert output.getvalue() == ""
+
+
+def _build_records(count):
+    return [{"name": f"host{i}", "type": "A", "content": "10.0.0.1"} for i in range(count)]
+
+
+def test_profiler(tmp_path):
+    path = tmp_path / "profile.pstats"
+    profiler = profiling.Profiler(str(path), top=3)
+    with profiler.phase("collect"):
+        time.sleep(0.1)
+    with profiler.phase("plan"):
+        records = _build_records(10000)
+
+    output = io.StringIO()
+    profiler.report(output)
+    assert not tracemalloc.is_tracing()
+
+    collect, plan = profiler.phases
+    assert [collect.name, plan.name] == ["collect", "plan"]
+    # waiting shows up as wall clock time without CPU time
+    assert collect.wall >= 0.1
+    assert collect.wall - collect.cpu >= 0.05
+    assert plan.memory > 10000 * 100
+    assert plan.peak >= plan.memory
+    assert len(plan.allocations) == 3
+    del records
+
+    # merged CPU profile of all phases
+    functions = {x[2] for x in pstats.Stats(str(path)).stats}
+    assert "_build_records" in functions
+    assert "<built-in method time.sleep>" in functions
+
+    report = output.getvalue()
+    assert "\tPROFILE" in report
+    assert f"CPU profile written to {path}" in report
+    assert "collect: top 3 functions by own time" in report
+    assert "plan: top 3 allocation sites" in report
+    assert report.index("<built-in method time.sleep>") < report.index("plan: top 3 functions by own time")
+    assert "test_profiling.py" in report.split("plan: top 3 functions by own time")[1]
@@ -0,0 +1,253 @@
+import asyncio
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+import pytest
+
+from porkbun_api_cli import propagation
+
+
+def _name(name):
+    return b"".join(bytes([len(x)]) + x.encode("ascii") for x in name.split(".")) + b"\x00"
+
+
+def _rdata(record_type, content, prio=None):
+    if record_type == "A":
+        return socket.inet_pton(socket.AF_INET, content)
+    if record_type == "AAAA":
+        return socket.inet_pton(socket.AF_INET6, content)
+    if record_type in ("CNAME", "NS"):
+        return _name(content)
+    if record_type == "MX":
+        return struct.pack("!H", prio) + _name(content)
+    if record_type == "TXT":
+        data = content.encode("utf-8")
+        return b"".join(bytes([len(data[i : i + 255])]) + data[i : i + 255] for i in range(0, len(data), 255))
+    if record_type == "SRV":
+        weight, port, target = content.split()
+        return struct.pack("!HHH", prio, int(weight), int(port)) + _name(target)
+    flags, tag, value = content.split(None, 2)
+    return bytes([int(flags), len(tag)]) + tag.encode("ascii") + value.encode("utf-8")
+
+
+class StubDNSServer:
+    """Authoritative nameserver answering UDP and TCP queries on a loopback address, on an ephemeral
+    port unless given.
+
+    Records are given as (name, type) -> [(content, prio, seconds until served)]. Names without
+    records are answered with NXDOMAIN, names listed in ``refused`` with REFUSED, and queries for
+    types in ``truncated`` are answered with an empty truncated response over UDP."""
+
+    def __init__(self, records, refused=(), truncated=(), silent=False, host="127.0.0.1", port=0):
+        self.records = records
+        self.refused = refused
+        self.truncated = truncated
+        self.silent = silent
+        self.queries = []
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        stub = self
+
+        class UDPHandler(socketserver.BaseRequestHandler):
+            def handle(self):
+                data, sock = self.request
+                response = stub.respond(data, "udp")
+                if response is not None:
+                    sock.sendto(response, self.client_address)
+
+        class TCPHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                (length,) = struct.unpack("!H", self.rfile.read(2))
+                response = stub.respond(self.rfile.read(length), "tcp")
+                self.wfile.write(struct.pack("!H", len(response)) + response)
+
+        self.host = host
+        self.udp = socketserver.ThreadingUDPServer((host, port), UDPHandler)
+        self.port = self.udp.server_address[1]
+        self.tcp = socketserver.ThreadingTCPServer((host, self.port), TCPHandler)
+        self.udp.daemon_threads = self.tcp.daemon_threads = True
+        for server in (self.udp, self.tcp):
+            threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def close(self):
+        for server in (self.udp, self.tcp):
+            server.shutdown()
+            server.server_close()
+
+    def respond(self, data, protocol):
+        query_id, _, _, _, _, _ = struct.unpack_from("!HHHHHH", data)
+        offset, labels = 12, []
+        while data[offset]:
+            labels.append(data[offset + 1 : offset + 1 + data[offset]].decode("ascii"))
+            offset += 1 + data[offset]
+        question = data[12 : offset + 5]
+        (type_code,) = struct.unpack_from("!H", data, offset + 1)
+        name = ".".join(labels)
+        record_type = next(k for k, v in propagation.TYPES.items() if v == type_code)
+        with self.lock:
+            self.queries.append((name, record_type, protocol))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        # queries overlap while the answer is prepared
+        time.sleep(0.01)
+        with self.lock:
+            self.in_flight -= 1
+        if self.silent:
+            return None
+
+        flags, answers = 0x8400, []
+        elapsed = time.monotonic() - self.started
+        if name in self.refused:
+            flags |= 5
+        elif protocol == "udp" and record_type in self.truncated:
+            flags |= 0x0200
+        elif not any(x[0] == name for x in self.records):
+            flags |= 3
+        else:
+            answers = [
+                (content, prio)
+                for content, prio, delay in self.records.get((name, record_type), [])
+                if delay <= elapsed
+            ]
+        body = b"".join(
+            b"\xc0\x0c" + struct.pack("!HHIH", type_code, 1, 600, len(x)) + x
+            for x in (_rdata(record_type, content, prio) for content, prio in answers)
+        )
+        return struct.pack("!HHHHHH", query_id, flags, 1, len(answers), 0, 0) + question + body
+
+
+@pytest.fixture
+def stub_server():
+    servers = []
+
+    def start(records, **kwargs):
+        servers.append(StubDNSServer(records, **kwargs))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def _query(server, name, record_type, timeout=1.0):
+    return asyncio.run(propagation.query((socket.AF_INET, ("127.0.0.1", server.port)), name, record_type, timeout))
+
+
+def test_query_record_types(stub_server):
+    records = {
+        ("example.com", "A"): [("10.0.0.1", None, 0), ("10.0.0.2", None, 0)],
+        ("example.com", "AAAA"): [("2001:db8::1", None, 0)],
+        ("example.com", "MX"): [("mail.example.com", 10, 0)],
+        ("www.example.com", "CNAME"): [("example.com", None, 0)],
+        ("_sip._tcp.example.com", "SRV"): [("5 5060 sip.example.com", 20, 0)],
+        ("example.com", "CAA"): [("0 issue letsencrypt.org", None, 0)],
+        ("example.com", "TXT"): [("v=spf1 ~all", None, 0)],
+    }
+    server = stub_server(records)
+
+    assert _query(server, "example.com", "A") == {("10.0.0.1", None), ("10.0.0.2", None)}
+    assert _query(server, "example.com", "AAAA") == {("2001:db8::1", None)}
+    assert _query(server, "example.com", "MX") == {("mail.example.com", 10)}
+    assert _query(server, "www.example.com", "CNAME") == {("example.com", None)}
+    assert _query(server, "_sip._tcp.example.com", "SRV") == {("5 5060 sip.example.com", 20)}
+    assert _query(server, "example.com", "CAA") == {("0 issue letsencrypt.org", None)}
+    assert _query(server, "example.com", "TXT") == {("v=spf1 ~all", None)}
+    # names that do not exist have no answers
+    assert _query(server, "missing.example.com", "A") == set()
+
+
+def test_query_truncated(stub_server):
+    dkim = "v=DKIM1; k=rsa; p=" + "A" * 1500
+    server = stub_server({("mail._domainkey.example.com", "TXT"): [(dkim, None, 0)]}, truncated=["TXT"])
+
+    assert _query(server, "mail._domainkey.example.com", "TXT") == {(dkim, None)}
+    # asked again over TCP
+    assert [x[2] for x in server.queries] == ["udp", "tcp"]
+
+
+def test_query_errors(stub_server):
+    server = stub_server({}, refused=["example.com"])
+    with pytest.raises(ValueError, match="nameserver answered with REFUSED"):
+        _query(server, "example.com", "A")
+
+    server = stub_server({}, silent=True)
+    with pytest.raises(asyncio.TimeoutError):
+        _query(server, "example.com", "A", timeout=0.1)
+
+
+def test_decode_response_malformed():
+    query = propagation.encode_query("example.com", "A", 7)
+    # the question without the EDNS record
+    response = b"\x00\x07\x84\x00" + query[4:10] + b"\x00\x00" + query[12:-11]
+    with pytest.raises(ValueError, match="response does not match the query"):
+        propagation.decode_response(response, 8, "example.com", "A")
+    # an answer is announced but missing
+    with pytest.raises(ValueError, match="malformed response"):
+        propagation.decode_response(response[:6] + b"\x00\x01" + response[8:], 7, "example.com", "A")
+
+
+def test_verify_latency(stub_server):
+    records = {
+        ("example.com", "A"): [("10.0.0.1", None, 0)],
+        ("www.example.com", "CNAME"): [("example.com", None, 0.3)],
+    }
+    first = stub_server(records)
+    stub_server({**records, ("example.com", "A"): [("10.0.0.1", None, 0.5)]}, host="127.0.0.2", port=first.port)
+    changes = [
+        ("example.com", {"name": "", "type": "A", "content": "10.0.0.1"}),
+        ("example.com", {"name": "www", "type": "CNAME", "content": "example.com"}),
+    ]
+
+    results = propagation.verify(changes, {"example.com": ["127.0.0.1", "127.0.0.2"]}, 5, port=first.port, interval=0.1)
+
+    a_record, cname_record = results
+    assert a_record.live
+    assert cname_record.live
+    assert a_record.latencies["127.0.0.1"] < 0.3 <= cname_record.latencies["127.0.0.1"] < 1
+    assert 0.5 <= a_record.latency < 1.5
+    assert cname_record.errors == {}
+
+
+def test_verify_timeout(stub_server):
+    records = {("example.com", "MX"): [("mail.example.com", 10, 0)]}
+    server = stub_server(records)
+    stub_server(records, refused=["example.com"], host="127.0.0.2", port=server.port)
+    changes = [("example.com", {"name": "", "type": "MX", "content": "mail.example.com", "prio": "20"})]
+
+    start = time.monotonic()
+    (result,) = propagation.verify(
+        changes, {"example.com": ["127.0.0.1", "127.0.0.2"]}, 0.5, port=server.port, interval=0.1
+    )
+
+    assert time.monotonic() - start < 2
+    # served with another priority
+    assert not result.live
+    assert result.latency is None
+    assert result.pending == ["127.0.0.1", "127.0.0.2"]
+    assert result.errors == {"127.0.0.2": "nameserver answered with REFUSED"}
+    assert len(server.queries) > 1
+
+
+def test_verify_concurrency(stub_server):
+    server = stub_server({(f"host{i}.example.com", "A"): [("10.0.0.1", None, 0)] for i in range(20)})
+    changes = [("example.com", {"name": f"host{i}", "type": "A", "content": "10.0.0.1"}) for i in range(20)]
+
+    results = propagation.verify(changes, {"example.com": ["127.0.0.1"]}, 5, port=server.port, concurrency=4)
+
+    assert all(x.live for x in results)
+    assert len(server.queries) == 20
+    assert 1 < server.max_in_flight <= 4
+
+
+def test_verify_unresolvable_nameserver():
+    changes = [("example.com", {"name": "", "type": "A", "content": "10.0.0.1"})]
+
+    (result,) = propagation.verify(changes, {"example.com": ["ns.invalid"]}, 1)
+
+    assert result.pending == ["ns.invalid"]
+    assert result.errors["ns.invalid"].startswith("resolving nameserver failed")
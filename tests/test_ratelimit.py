@@ -0,0 +1,58 @@
+import threading
+
+import pytest
+
+from porkbun_api_cli.ratelimit import TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+        self.waits = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.waits.append(seconds)
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_token_bucket(clock):
+    bucket = TokenBucket(rate=2, burst=3, clock=clock, sleep=clock.sleep)
+
+    # a burst passes, later requests wait for their turn
+    assert [bucket.acquire() for _ in range(5)] == [0.0, 0.0, 0.0, 0.5, 1.0]
+    assert clock.waits == [0.5, 1.0]
+
+    # tokens taken ahead are paid back before the bucket refills
+    clock.now += 1.0
+    assert bucket.acquire() == 0.5
+    clock.now += 10.0
+    assert [bucket.acquire() for _ in range(4)] == [0.0, 0.0, 0.0, 0.5]
+
+
+def test_token_bucket_threads():
+    bucket = TokenBucket(rate=10, burst=1)
+    waits = []
+
+    def acquire():
+        waits.append(bucket.acquire())
+
+    threads = [threading.Thread(target=acquire) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # every thread gets its own turn
+    assert sorted(round(x, 1) for x in waits) == [0.0, 0.1, 0.2, 0.3, 0.4]
+
+
+def test_token_bucket_invalid():
+    with pytest.raises(ValueError, match="rate must be positive"):
+        TokenBucket(rate=0)
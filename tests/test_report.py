@@ -0,0 +1,99 @@
+import io
+import json
+
+import pytest
+
+from porkbun_api_cli import report
+
+PLAN = [
+    ("skipped.com", None),
+    (
+        "example.com",
+        [
+            {"operation": "create", "new": {"name": "www", "type": "A", "content": "127.0.0.1"}, "existing": None},
+            {
+                "operation": "update",
+                "new": {"name": "", "type": "A", "content": "127.0.0.1"},
+                "existing": {"id": "1", "name": "example.com", "type": "A", "content": "10.0.0.1"},
+            },
+        ],
+    ),
+    ("empty.com", []),
+]
+
+
+def _consume(plan_writer, plan):
+    result = []
+    for domain_name, operations in plan_writer.write((name, None if ops is None else iter(ops)) for name, ops in plan):
+        result.append((domain_name, None if operations is None else list(operations)))
+    plan_writer.close()
+    return result
+
+
+def test_plan_writer_ndjson():
+    stream = io.StringIO()
+    result = _consume(report.PlanWriter("ndjson", file=stream), PLAN)
+
+    # plan is passed through unchanged
+    assert result == PLAN
+
+    entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert entries == [
+        {"type": "summary", "domain": "skipped.com", "skipped": True, "create": 0, "update": 0, "delete": 0},
+        {
+            "type": "operation",
+            "domain": "example.com",
+            "op": "create",
+            "id": None,
+            "old": None,
+            "new": {"name": "www", "type": "A", "content": "127.0.0.1"},
+        },
+        {
+            "type": "operation",
+            "domain": "example.com",
+            "op": "update",
+            "id": "1",
+            "old": {"id": "1", "name": "example.com", "type": "A", "content": "10.0.0.1"},
+            "new": {"name": "", "type": "A", "content": "127.0.0.1"},
+        },
+        {"type": "summary", "domain": "example.com", "skipped": False, "create": 1, "update": 1, "delete": 0},
+        {"type": "summary", "domain": "empty.com", "skipped": False, "create": 0, "update": 0, "delete": 0},
+    ]
+
+
+def test_plan_writer_json():
+    stream = io.StringIO()
+    _consume(report.PlanWriter("json", file=stream), PLAN)
+
+    entries = json.loads(stream.getvalue())
+    assert [(x["type"], x["domain"]) for x in entries] == [
+        ("summary", "skipped.com"),
+        ("operation", "example.com"),
+        ("operation", "example.com"),
+        ("summary", "example.com"),
+        ("summary", "empty.com"),
+    ]
+
+
+def test_plan_writer_json_empty():
+    stream = io.StringIO()
+    _consume(report.PlanWriter("json", file=stream), [])
+
+    assert json.loads(stream.getvalue()) == []
+
+
+def test_plan_writer_streams_operations():
+    stream = io.StringIO()
+    plan_writer = report.PlanWriter("ndjson", file=stream)
+    operations = iter(PLAN[1][1])
+
+    _, passed = next(plan_writer.write(iter([("example.com", operations)])))
+    next(passed)
+
+    # first operation is written before the second one is planned
+    assert len(stream.getvalue().splitlines()) == 1
+
+
+def test_plan_writer_invalid_format():
+    with pytest.raises(ValueError, match="unsupported output format 'yaml'"):
+        report.PlanWriter("yaml")
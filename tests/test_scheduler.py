@@ -0,0 +1,218 @@
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from porkbun_api_cli import scheduler
+from porkbun_api_cli.budget import DeadlineExceeded
+
+
+def _create(name, record_type, content):
+    return {"operation": "create", "new": {"name": name, "type": record_type, "content": content}, "existing": None}
+
+
+def _update(name, record_type, content, old_content):
+    fqdn = f"{name}.example.com" if name else "example.com"
+    return {
+        "operation": "update",
+        "new": {"name": name, "type": record_type, "content": content},
+        "existing": {"id": "1", "name": fqdn, "type": record_type, "content": old_content},
+    }
+
+
+def _delete(fqdn, record_type, content):
+    return {
+        "operation": "delete",
+        "new": None,
+        "existing": {"id": "2", "name": fqdn, "type": record_type, "content": content},
+    }
+
+
+def test_operation_graph_dependencies():
+    graph = scheduler.OperationGraph(
+        {
+            "example.com": [
+                # 0: MX record pointing at a mail server created later
+                _create("", "MX", "mail.example.com"),
+                # 1: name server delegation before its glue record
+                _create("sub", "NS", "ns1.example.org."),
+                # 2: CNAME replacing an A record of the same name
+                _create("www", "CNAME", "example.com"),
+                # 3
+                _delete("www.example.com", "A", "10.0.0.1"),
+                # 4: CNAME moving away from a host that is deleted
+                _update("ftp", "CNAME", "files.example.com", "old.example.com"),
+                # 5
+                _delete("old.example.com", "A", "10.0.0.2"),
+                # 6
+                _create("mail", "A", "10.0.0.3"),
+                # 7: SRV record pointing at a host created later
+                _create("_sip._tcp", "SRV", "5 5060 sip.example.com"),
+                # 8
+                _create("sip", "AAAA", "fe80::1"),
+                # 9: independent
+                _create("txt", "TXT", "mail.example.com"),
+            ],
+            "example.org": [
+                # 10
+                _create("ns1", "A", "10.0.0.4"),
+            ],
+            "skipped.com": None,
+        }
+    )
+
+    assert len(graph) == 11
+    assert graph.dependencies == [{6}, {10}, {3}, set(), set(), {4}, set(), {8}, set(), set(), set()]
+    assert graph.lanes == [1, 1, 0, 0, 1, 1, 1, 1, 1, 2, 1]
+    assert graph.order() == [3, 2, 4, 5, 6, 0, 8, 7, 10, 1, 9]
+
+
+def test_operation_graph_cycle():
+    graph = scheduler.OperationGraph(
+        {
+            "example.com": [
+                _create("a", "CNAME", "b.example.com"),
+                _create("b", "CNAME", "a.example.com"),
+                _create("c", "MX", "a.example.com"),
+                _create("d", "A", "10.0.0.1"),
+            ]
+        }
+    )
+
+    # operations in the cycle and those depending on it run in plan order
+    assert graph.dependencies == [set(), {0}, {0, 1}, set()]
+    assert graph.order() == [0, 1, 2, 3]
+
+
+def test_operation_graph_run():
+    graph = scheduler.OperationGraph(
+        {
+            "example.com": [
+                _create("", "MX", "mail.example.com"),
+                _create("mail", "A", "10.0.0.1"),
+                _create("www", "A", "10.0.0.2"),
+                _create("ftp", "A", "10.0.0.3"),
+            ]
+        }
+    )
+    started, finished = {}, {}
+    lock = threading.Lock()
+
+    def execute(domain_name, operation):
+        name = operation["new"]["name"]
+        with lock:
+            started[name] = time.perf_counter()
+        time.sleep(0.1)
+        with lock:
+            finished[name] = time.perf_counter()
+        return name
+
+    start = time.perf_counter()
+    results = list(graph.run(execute, jobs=4))
+    elapsed = time.perf_counter() - start
+
+    assert sorted(results) == [(0, "", None), (1, "mail", None), (2, "www", None), (3, "ftp", None)]
+    # independent operations run concurrently, the MX record waits for its mail server
+    assert results[-1] == (0, "", None)
+    assert started[""] >= finished["mail"]
+    assert elapsed < 0.3
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_operation_graph_run_failure(jobs):
+    graph = scheduler.OperationGraph(
+        {
+            "example.com": [
+                _create("", "MX", "mail.example.com"),
+                _create("mail", "A", "10.0.0.1"),
+                _create("www", "A", "10.0.0.2"),
+            ]
+        }
+    )
+    executed = []
+
+    def execute(domain_name, operation):
+        executed.append(operation["new"]["name"])
+        if operation["new"]["name"] == "mail":
+            raise RuntimeError("create_record failed")
+        return True
+
+    results = {i: (result, error) for i, result, error in graph.run(execute, jobs=jobs)}
+
+    assert sorted(executed) == ["mail", "www"]
+    assert results[2] == (True, None)
+    assert str(results[1][1]) == "create_record failed"
+    assert results[0][0] is None
+    assert isinstance(results[0][1], scheduler.DependencyFailed)
+
+
+def test_operation_graph_lanes():
+    graph = scheduler.OperationGraph(
+        {
+            "example.com": [
+                _create("txt", "TXT", "token"),
+                _create("www", "CNAME", "lb.example.net"),
+                _create("", "AAAA", "fe80::1"),
+            ],
+            "example.net": [
+                _create("lb", "A", "10.0.0.1"),
+                _create("", "A", "10.0.0.2"),
+            ],
+        },
+        priorities={"example.net": "bulk"},
+    )
+
+    # the load balancer address is raised to the lane of the CNAME record pointing at it
+    assert [scheduler.LANES[x] for x in graph.lanes] == ["bulk", "critical", "critical", "critical", "bulk"]
+    assert graph.order() == [2, 3, 1, 0, 4]
+
+
+@pytest.mark.parametrize(("jobs", "expected"), [(1, ["", "www", "mail", "txt1", "txt2"]), (2, ["", "mail", "www"])])
+def test_operation_graph_run_lanes(jobs, expected):
+    graph = scheduler.OperationGraph(
+        {
+            "example.com": [
+                _create("txt1", "TXT", "token"),
+                _create("txt2", "TXT", "token"),
+                _create("", "A", "10.0.0.1"),
+                _create("www", "A", "10.0.0.1"),
+                _create("mail", "A", "10.0.0.1"),
+            ]
+        }
+    )
+    started = []
+    lock = threading.Lock()
+
+    def execute(domain_name, operation):
+        with lock:
+            started.append(operation["new"]["name"])
+        # critical changes are quick to let the mail server keep its job
+        time.sleep(0.01 if operation["new"]["name"] in ["", "www"] else 0.2)
+
+    list(graph.run(execute, jobs=jobs))
+
+    # higher lanes are started first, one job is left to the next lower lane
+    assert started[: len(expected)] == expected
+    assert sorted(started) == ["", "mail", "txt1", "txt2", "www"]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_operation_graph_run_deadline(jobs):
+    graph = scheduler.OperationGraph(
+        {"example.com": [_create(f"host{i}", "A", "10.0.0.1") for i in range(6)]},
+    )
+    deadline = Mock(expired=False)
+    executed = []
+
+    def execute(domain_name, operation):
+        executed.append(operation["new"]["name"])
+        time.sleep(0.05)
+        deadline.expired = True
+
+    results = list(graph.run(execute, jobs=jobs, deadline=deadline))
+
+    # operations running at the deadline complete, no further ones are started
+    assert len(executed) == jobs
+    assert len(results) == 6
+    assert sum(1 for _, _, error in results if isinstance(error, DeadlineExceeded)) == 6 - jobs
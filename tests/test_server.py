@@ -0,0 +1,285 @@
+import http.client
+import json
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+
+import pytest
+
+from porkbun_api_cli import server
+from porkbun_api_cli import transport
+from porkbun_api_cli.api import PorkbunAPI
+
+TOKEN = "0123456789abcdef"
+OTHER_TOKEN = "fedcba9876543210"
+CLIENTS = {
+    "host1": {"token": TOKEN, "records": ["host1.example.com", "*.dyn.example.com"]},
+    "host2": {"token": OTHER_TOKEN, "records": ["host2.example.com"]},
+}
+
+
+def _body(**fields):
+    return json.dumps({"domain": "example.com", "type": "A", "content": "10.0.0.1", **fields}).encode("utf-8")
+
+
+def _api(records):
+    api = Mock()
+    api.iter_dns_records.side_effect = lambda domain_name: iter(records[domain_name])
+    api.create_record.return_value = 42
+    return api
+
+
+def test_load_clients():
+    clients = server.load_clients(
+        {"server": {"clients": {"host1": {"token": TOKEN, "records": ["Host1.Example.com."]}}}}
+    )
+    assert clients == {"host1": {"token": TOKEN, "records": ["host1.example.com"]}}
+
+
+@pytest.mark.parametrize(
+    ("section", "message"),
+    [
+        (None, "'server.clients' must be a mapping"),
+        ({"clients": {"host1": {"token": "short", "records": ["a.example.com"]}}}, "at least 16 characters"),
+        ({"clients": {"host1": {"token": TOKEN}}}, "'records' must be a list"),
+        ({"clients": CLIENTS, "rate_limit": 0}, "'server.rate_limit' must be a positive number"),
+        ({"clients": {"a": CLIENTS["host1"], "b": CLIENTS["host1"]}}, "already used by another client"),
+        ({"clients": CLIENTS, "coalesce_window": -1}, "'server.coalesce_window' must be a non-negative number"),
+    ],
+)
+def test_load_clients_invalid(section, message):
+    with pytest.raises(ValueError, match=message):
+        server.load_clients({"server": section})
+
+
+def test_set_record():
+    existing = {"id": "7", "name": "host1.example.com", "type": "A", "content": "10.0.0.2", "ttl": "600", "prio": "0"}
+    api = _api({"example.com": [existing]})
+    log = Mock()
+    service = server.RecordService(server.ZoneCache(api), CLIENTS, log=log)
+
+    # update the existing record, then nothing is left to do
+    assert service.set_record(f"Bearer {TOKEN}", _body(name="host1")) == (
+        200,
+        {"status": "SUCCESS", "operation": "update"},
+    )
+    assert service.set_record(f"Bearer {TOKEN}", _body(name="host1")) == (
+        200,
+        {"status": "SUCCESS", "operation": "none"},
+    )
+    # create a record, then nothing is left to do
+    assert service.set_record(f"bearer {TOKEN}", _body(name="a.dyn", ttl=3600)) == (
+        200,
+        {"status": "SUCCESS", "operation": "create"},
+    )
+    assert service.set_record(f"Bearer {TOKEN}", _body(name="a.dyn", ttl="3600"))[1]["operation"] == "none"
+
+    api.update_record.assert_called_once_with("example.com", "7", {"name": "host1", "type": "A", "content": "10.0.0.1"})
+    api.create_record.assert_called_once_with(
+        "example.com", {"name": "a.dyn", "type": "A", "content": "10.0.0.1", "ttl": "3600"}
+    )
+    # the zone is retrieved once
+    api.iter_dns_records.assert_called_once_with("example.com")
+    assert [x.args[0] for x in log.call_args_list] == ["host1"] * 4
+    assert log.call_args_list[0].args[3] == "update"
+
+
+@pytest.mark.parametrize(
+    ("authorization", "body", "expected"),
+    [
+        (None, _body(name="host1"), (401, "invalid token")),
+        ("Bearer wrong-token-0123456789", _body(name="host1"), (401, "invalid token")),
+        (f"Basic {TOKEN}", _body(name="host1"), (401, "invalid token")),
+        (f"Bearer {TOKEN}", b"{", (400, "malformed JSON")),
+        (f"Bearer {TOKEN}", b"[]", (400, "request must be a JSON object")),
+        (f"Bearer {TOKEN}", _body(name="host1", domain="com"), (400, "'domain' must be a domain name")),
+        (f"Bearer {TOKEN}", _body(name="host1", content="10.0.0.256"), (400, "invalid IPv4 address '10.0.0.256'")),
+        (f"Bearer {TOKEN}", _body(name="host1", content="{{ip}}"), (400, "placeholders are not supported")),
+        (f"Bearer {TOKEN}", _body(name="host2"), (403, "client 'host1' may not set records of 'host2.example.com'")),
+        (
+            f"Bearer {OTHER_TOKEN}",
+            _body(name="a.dyn"),
+            (403, "client 'host2' may not set records of 'a.dyn.example.com'"),
+        ),
+    ],
+)
+def test_set_record_rejected(authorization, body, expected):
+    api = _api({"example.com": []})
+    service = server.RecordService(server.ZoneCache(api), CLIENTS)
+
+    code, response = service.set_record(authorization, body)
+
+    assert (code, response["message"]) == expected
+    assert response["status"] == "ERROR"
+    api.iter_dns_records.assert_not_called()
+
+
+def test_set_record_api_failure():
+    api = _api({"example.com": []})
+    api.create_record.side_effect = [RuntimeError("create_record failed: Invalid content."), 42]
+    service = server.RecordService(server.ZoneCache(api), CLIENTS)
+
+    assert service.set_record(f"Bearer {TOKEN}", _body(name="host1")) == (
+        502,
+        {"status": "ERROR", "message": "create_record failed: Invalid content."},
+    )
+    assert service.set_record(f"Bearer {TOKEN}", _body(name="host1"))[1]["operation"] == "create"
+    # the zone is retrieved again after a failed change
+    assert api.iter_dns_records.call_count == 2
+
+
+def test_zone_cache_max_age():
+    api = _api({"example.com": []})
+    now = [0.0]
+    cache = server.ZoneCache(api, max_age=300, clock=lambda: now[0])
+
+    cache.set_record("example.com", {"name": "a", "type": "A", "content": "10.0.0.1"})
+    now[0] = 200.0
+    assert cache.set_record("example.com", {"name": "a", "type": "A", "content": "10.0.0.1"}) == "none"
+    now[0] = 400.0
+    # the retrieved zone does not contain the record created before
+    assert cache.set_record("example.com", {"name": "a", "type": "A", "content": "10.0.0.1"}) == "create"
+    assert api.iter_dns_records.call_count == 2
+
+
+def _submit_all(submit, values, delay=0.02):
+    """Submit values from threads started one after another, returns their results in order."""
+    results = [None] * len(values)
+
+    def run(i):
+        try:
+            results[i] = submit(values[i])
+        except RuntimeError as e:
+            results[i] = e
+
+    threads = []
+    for i in range(len(values)):
+        threads.append(threading.Thread(target=run, args=(i,)))
+        threads[-1].start()
+        time.sleep(delay)
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_write_coalescer():
+    write = Mock(side_effect=lambda key, value: f"wrote {value}")
+    coalescer = server.WriteCoalescer(write, window=0.2)
+
+    results = _submit_all(lambda value: coalescer.submit("a", value), ["1", "2", "3"])
+
+    # only the latest value is written
+    assert results == ["superseded", "superseded", "wrote 3"]
+    write.assert_called_once_with("a", "3")
+
+    # keys are coalesced on their own, later requests start a new batch
+    results = _submit_all(lambda value: coalescer.submit(value[0], value), ["a4", "b1", "a5"])
+    assert results == ["superseded", "wrote b1", "wrote a5"]
+    assert coalescer.submit("a", "6") == "wrote 6"
+
+
+def test_write_coalescer_failure():
+    write = Mock(side_effect=RuntimeError("update_record failed"))
+    coalescer = server.WriteCoalescer(write, window=0.1)
+
+    results = _submit_all(lambda value: coalescer.submit("a", value), ["1", "2"])
+
+    assert [str(x) for x in results] == ["update_record failed"] * 2
+    write.assert_called_once_with("a", "2")
+
+
+def test_set_record_coalesced():
+    existing = {"id": "7", "name": "host1.example.com", "type": "A", "content": "10.0.0.1"}
+    api = _api({"example.com": [existing]})
+    service = server.RecordService(server.ZoneCache(api), CLIENTS, window=0.2)
+
+    results = _submit_all(
+        lambda content: service.set_record(f"Bearer {TOKEN}", _body(name="host1", content=content)),
+        ["10.0.0.2", "10.0.0.3", "10.0.0.1"],
+    )
+
+    # a flapping address ends up where it started, no change is made
+    assert [response["operation"] for _, response in results] == ["superseded", "superseded", "none"]
+    api.update_record.assert_not_called()
+
+    results = _submit_all(
+        lambda content: service.set_record(f"Bearer {TOKEN}", _body(name="host1", content=content)),
+        ["10.0.0.2", "10.0.0.3"],
+    )
+    assert [response["operation"] for _, response in results] == ["superseded", "update"]
+    api.update_record.assert_called_once_with("example.com", "7", {"name": "host1", "type": "A", "content": "10.0.0.3"})
+
+
+def _serve(fake_api, **kwargs):
+    api = PorkbunAPI(
+        apikey="apikey",
+        secretapikey="secretapikey",
+        endpoint=f"http://127.0.0.1:{fake_api.server_port}/",
+        transport=transport.RequestsTransport(pool_size=8),
+    )
+    record_server = server.create_server(server.RecordService(server.ZoneCache(api), CLIENTS), **kwargs)
+    thread = threading.Thread(target=record_server.serve_forever, daemon=True)
+    thread.start()
+    return api, record_server, thread
+
+
+class UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path):
+        super().__init__("localhost")
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+@pytest.mark.parametrize("unix", [False, True])
+def test_server(fake_api, tmp_path, unix):
+    socket_path = str(tmp_path / "porkbun.sock")
+    api, record_server, thread = _serve(fake_api, **({"socket_path": socket_path} if unix else {"port": 0}))
+
+    def connect():
+        return (
+            UnixConnection(socket_path) if unix else http.client.HTTPConnection("127.0.0.1", record_server.server_port)
+        )
+
+    def set_records(i):
+        connection = connect()
+        results = []
+        # requests share a kept open connection
+        for content in ["10.0.0.1", "10.0.0.2", "10.0.0.2"]:
+            connection.request(
+                "POST",
+                "/records",
+                body=_body(name=f"h{i}.dyn", content=content),
+                headers={"Authorization": f"Bearer {TOKEN}"},
+            )
+            response = connection.getresponse()
+            results.append((response.status, json.loads(response.read())["operation"]))
+        connection.close()
+        return results
+
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(set_records, range(8)))
+
+        connection = connect()
+        connection.request("POST", "/other", body=b"{}")
+        assert connection.getresponse().status == 404
+        connection.close()
+    finally:
+        record_server.shutdown()
+        record_server.server_close()
+        thread.join()
+        api.close()
+
+    assert results == [[(200, "create"), (200, "update"), (200, "none")]] * 8
+    # a single zone retrieval, connections to the API are reused
+    assert fake_api.requests.count("/dns/retrieve/example.com") == 1
+    assert len(fake_api.requests) == 17
+    assert fake_api.connections <= 8
+    assert sorted(x["content"] for x in fake_api.zones["example.com"]) == ["10.0.0.2"] * 8
+    if unix:
+        assert not (tmp_path / "porkbun.sock").exists()
@@ -0,0 +1,38 @@
+from porkbun_api_cli import state
+
+
+def test_zone_state_roundtrip(tmp_path):
+    zone_state = state.ZoneState(str(tmp_path / "state"))
+    assert not zone_state.unchanged("example.com", "zone", "desired")
+
+    zone_state.update("example.com", "zone", "desired")
+    zone_state.update("other.com", "zone", "desired")
+    zone_state.save()
+
+    zone_state = state.ZoneState(str(tmp_path / "state"))
+    assert zone_state.unchanged("example.com", "zone", "desired")
+    assert not zone_state.unchanged("example.com", "other-zone", "desired")
+    assert not zone_state.unchanged("example.com", "zone", "other-desired")
+    assert not zone_state.unchanged("example.com", None, "desired")
+
+    zone_state.discard("example.com")
+    zone_state.save()
+
+    zone_state = state.ZoneState(str(tmp_path / "state"))
+    assert not zone_state.unchanged("example.com", "zone", "desired")
+    assert zone_state.unchanged("other.com", "zone", "desired")
+
+
+def test_zone_state_corrupt(tmp_path):
+    (tmp_path / state.ZoneState.FILENAME).write_text("{not json")
+
+    zone_state = state.ZoneState(str(tmp_path))
+    assert not zone_state.unchanged("example.com", "zone", "desired")
+
+
+def test_zone_state_save_unchanged(tmp_path):
+    zone_state = state.ZoneState(str(tmp_path / "state"))
+    zone_state.discard("example.com")
+    zone_state.save()
+
+    assert not (tmp_path / "state").exists()
@@ -0,0 +1,158 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+
+import pytest
+
+from porkbun_api_cli import utils
+from porkbun_api_cli.api import PorkbunAPI
+from porkbun_api_cli.sync import sync
+
+
+def _api(records):
+    api = Mock(deadline=None)
+    api.with_deadline.side_effect = lambda deadline: api
+    api.get_my_ip.return_value = "10.0.0.1"
+
+    def iter_dns_records(domain_name):
+        if domain_name not in records:
+            raise RuntimeError(f"iter_dns_records failed: Invalid domain '{domain_name}'.")
+        return iter(records[domain_name])
+
+    api.iter_dns_records.side_effect = iter_dns_records
+    api.list_dns_records.side_effect = lambda domain_name, name_types: list(iter_dns_records(domain_name))
+    return api
+
+
+@pytest.fixture
+def config():
+    return utils.load_config("tests/config_templates.yml")
+
+
+def test_sync_dry_run(config, capsys):
+    api = _api({"example.com": [], "example.org": []})
+
+    result = sync(config, api, mode="upgrade", dry_run=True)
+
+    assert [(x.domain, x.operation, x.record["type"], x.status) for x in result.operations] == [
+        ("example.com", "create", "TXT", "planned"),
+        ("example.com", "create", "A", "planned"),
+        ("example.com", "create", "CNAME", "planned"),
+        ("example.com", "create", "MX", "planned"),
+        ("example.com", "create", "TXT", "planned"),
+        ("example.org", "create", "MX", "planned"),
+        ("example.org", "create", "TXT", "planned"),
+    ]
+    assert result.operations[1].record["content"] == "10.0.0.1"
+    assert result.ok
+    api.create_record.assert_not_called()
+    # nothing is written out
+    assert capsys.readouterr() == ("", "")
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_sync_results(config, jobs):
+    existing = [{"id": "1", "name": "example.org", "type": "MX", "content": "old.example.com", "prio": "10"}]
+    api = _api({"example.com": [], "example.org": existing})
+
+    def create_record(domain_name, record):
+        if record["type"] == "CNAME":
+            raise RuntimeError("create_record failed: Invalid content.")
+
+    api.create_record.side_effect = create_record
+
+    result = sync(config, api, mode="upgrade", jobs=jobs)
+
+    assert [(x.operation, x.record["type"], x.status) for x in result.operations] == [
+        ("create", "TXT", "applied"),
+        ("create", "A", "applied"),
+        ("create", "CNAME", "failed"),
+        ("create", "MX", "applied"),
+        ("create", "TXT", "applied"),
+        ("update", "MX", "applied"),
+        ("create", "TXT", "applied"),
+    ]
+    assert str(result.by_status("failed")[0].error) == "create_record failed: Invalid content."
+    assert not result.ok
+    api.update_record.assert_called_once_with(
+        "example.org", "1", config["templates"]["mail"].expand({"mx": "mail.example.com", "spf": "~all"})[0]
+    )
+    # the IP address is queried once
+    api.get_my_ip.assert_called_once_with()
+
+
+def test_sync_repeated_calls(config):
+    api = _api({"example.com": [], "example.org": []})
+
+    first = sync(config, api, dry_run=True, ip="10.0.0.2")
+    second = sync(config, api, dry_run=True, ip="10.0.0.2")
+
+    # expanded records are shared between calls
+    assert first.operations[1].record is second.operations[1].record
+    api.get_my_ip.assert_not_called()
+
+
+def test_sync_reuses_connections(config, fake_api):
+    api = PorkbunAPI(apikey="apikey", secretapikey="secretapikey", endpoint=f"http://127.0.0.1:{fake_api.server_port}/")
+
+    first = sync(config, api, mode="upgrade", targeted_lookups=0, ip="10.0.0.1")
+    second = sync(config, api, mode="upgrade", targeted_lookups=0, ip="10.0.0.1")
+    api.close()
+
+    assert {x.status for x in first.operations} == {"applied"}
+    # the second call finds the records created by the first one
+    assert second.operations == []
+    # requests of both calls share a kept open connection
+    assert fake_api.connections == 1
+
+
+def test_sync_skipped_domain(config):
+    api = _api({"example.com": []})
+
+    result = sync(config, api, dry_run=True)
+
+    assert result.skipped == {
+        "example.org": "querying existing records failed: iter_dns_records failed: Invalid domain 'example.org'."
+    }
+    assert {x.domain for x in result.operations} == {"example.com"}
+    assert not result.ok
+
+
+def test_sync_ip_failure(config):
+    api = _api({"example.com": [], "example.org": []})
+    api.get_my_ip.side_effect = RuntimeError("get_my_ip failed: Invalid API key.")
+
+    with pytest.raises(RuntimeError, match="get_my_ip failed: Invalid API key."):
+        sync(config, api, jobs=2)
+
+    api.get_my_ip.assert_called_once_with()
+    api.create_record.assert_not_called()
+
+
+def test_sync_deadline(config):
+    api = _api({"example.com": [], "example.org": []})
+
+    result = sync(config, api, deadline=1e-9)
+
+    assert {x.status for x in result.operations} == {"not_attempted"}
+    # requests are made with a client limited by the deadline of the call
+    (deadline,), _ = api.with_deadline.call_args
+    assert deadline.expired
+
+
+def test_sync_concurrent_deadlines(config, fake_api):
+    api = PorkbunAPI(apikey="apikey", secretapikey="secretapikey", endpoint=f"http://127.0.0.1:{fake_api.server_port}/")
+    with ThreadPoolExecutor(2) as executor:
+        expired = executor.submit(sync, config, api, mode="upgrade", targeted_lookups=0, deadline=1e-9, ip="10.0.0.1")
+        unlimited = executor.submit(sync, config, api, mode="upgrade", targeted_lookups=0, ip="10.0.0.1")
+        results = expired.result(), unlimited.result()
+    api.close()
+
+    # the deadline of one call does not limit the other one, nor the client
+    assert set(results[0].skipped) == {"example.com", "example.org"}
+    assert {x.status for x in results[1].operations} == {"applied"}
+    assert api.deadline is None
+
+
+def test_sync_invalid_mode(config):
+    with pytest.raises(ValueError, match="unsupported mode 'merge'"):
+        sync(config, Mock(), mode="merge")
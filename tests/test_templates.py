@@ -0,0 +1,102 @@
+import pytest
+
+from porkbun_api_cli import templates
+
+CONFIG_TEMPLATES = {
+    "mail": {
+        "vars": {"mx": "mail.example.net"},
+        "records": [
+            {"name": "", "type": "MX", "content": "{{ mx }}", "prio": 10},
+            {"name": "", "type": "TXT", "content": "v=spf1 a:{{mx}} ip4:{{ip}} -all"},
+        ],
+    },
+    "web": {
+        "records": [
+            {"name": "", "type": "A", "content": "{{ip}}"},
+            {"name": "www", "type": "CNAME", "content": "{{domain}}"},
+        ],
+    },
+}
+
+
+def test_record_template_expand():
+    template = templates.compile_templates(CONFIG_TEMPLATES)["mail"]
+
+    assert template.variables == ["ip", "mx"]
+    assert template.expand({"ip": "127.0.0.1"}) == [
+        {"name": "", "type": "MX", "content": "mail.example.net", "prio": 10},
+        {"name": "", "type": "TXT", "content": "v=spf1 a:mail.example.net ip4:127.0.0.1 -all"},
+    ]
+    assert template.expand({"ip": "127.0.0.1", "mx": "mx.example.org"})[0]["content"] == "mx.example.org"
+
+
+def test_record_template_memoized():
+    template = templates.RecordTemplate("web", CONFIG_TEMPLATES["web"]["records"])
+
+    first = template.expand({"ip": "127.0.0.1", "domain": "example.com", "unused": "value"})
+    assert template.expand({"ip": "127.0.0.1", "domain": "example.com"}) is first
+    assert template.expand({"ip": "127.0.0.1", "domain": "example.org"}) is not first
+
+
+def test_record_template_undefined_variable():
+    template = templates.RecordTemplate("web", CONFIG_TEMPLATES["web"]["records"])
+
+    with pytest.raises(ValueError, match="template 'web': variable 'domain' is not defined"):
+        template.expand({"ip": "127.0.0.1"})
+
+
+@pytest.mark.parametrize(
+    ("config_templates", "message"),
+    [
+        ([], "'templates' must be a mapping of template names to templates"),
+        ({"empty": None}, "template 'empty': list of 'records' not found"),
+        ({"invalid": {"records": {}}}, "template 'invalid': list of 'records' not found"),
+        ({"partial": {"records": [{"name": "", "type": "A"}]}}, "template 'partial': records require"),
+    ],
+)
+def test_compile_templates_invalid(config_templates, message):
+    with pytest.raises(ValueError, match=message):
+        templates.compile_templates(config_templates)
+
+
+def test_check_includes():
+    compiled = templates.compile_templates(CONFIG_TEMPLATES)
+
+    templates.check_includes([{"name": "example.com", "include": ["mail", "web"]}], compiled)
+
+    with pytest.raises(ValueError, match="domain 'example.com': template 'unknown' not found"):
+        templates.check_includes([{"name": "example.com", "include": ["unknown"]}], compiled)
+
+    compiled["custom"] = templates.RecordTemplate("custom", [{"name": "{{host}}", "type": "A", "content": "{{addr}}"}])
+    with pytest.raises(ValueError, match="template 'custom' requires undefined variables: addr, host"):
+        templates.check_includes([{"name": "example.com", "include": ["custom"]}], compiled)
+    templates.check_includes(
+        [{"name": "example.com", "include": ["custom"], "vars": {"host": "h"}}], compiled, ["addr"]
+    )
+
+
+def test_config_domains():
+    compiled = templates.compile_templates(CONFIG_TEMPLATES)
+    own = {"name": "test", "type": "TXT", "content": "{{ip}}"}
+    config_domains = templates.ConfigDomains(
+        [
+            {"name": "example.com", "include": ["web"], "records": [own]},
+            {"name": "example.org", "include": ["mail"], "vars": {"mx": "mx.example.org"}},
+            {"name": "plain.com", "records": [own]},
+            {"name": "empty.com"},
+        ],
+        compiled,
+        {"ip": "127.0.0.1"},
+    )
+
+    assert list(config_domains) == ["example.com", "example.org", "plain.com", "empty.com"]
+    assert len(config_domains) == 4
+    assert config_domains["example.com"] == [
+        own,
+        {"name": "", "type": "A", "content": "127.0.0.1"},
+        {"name": "www", "type": "CNAME", "content": "example.com"},
+    ]
+    assert config_domains["example.org"][0]["content"] == "mx.example.org"
+    assert config_domains["plain.com"] == [own]
+    assert config_domains["empty.com"] == []
+    assert config_domains.get("unknown.com") is None
@@ -0,0 +1,338 @@
+import gzip
+import json
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+from unittest.mock import patch
+
+import pytest
+
+from porkbun_api_cli import transport
+from porkbun_api_cli.api import PorkbunAPI
+from porkbun_api_cli.transport import HTTP2Transport
+
+
+@pytest.fixture
+def _http2_extra():
+    pytest.importorskip("httpx")
+    pytest.importorskip("h2")
+
+
+class H2StubServer:
+    """HTTP/2 server with prior knowledge serving canned responses keyed by request path.
+    Responses are sent after ``delay`` seconds from a separate thread, so that requests
+    multiplexed over one connection overlap."""
+
+    def __init__(self, responses, delay=0):
+        self.responses = responses
+        self.delay = delay
+        self.connections = 0
+        self.max_open_streams = 0
+        self._sock = socket.create_server(("127.0.0.1", 0))
+        self.port = self._sock.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                sock, _ = self._sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._handle, args=(sock,), daemon=True).start()
+
+    def _handle(self, sock):
+        import h2.config
+        import h2.connection
+        import h2.events
+
+        conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False))
+        lock = threading.Lock()
+        paths, pending = {}, {}
+
+        def flush():
+            data = conn.data_to_send()
+            if data:
+                sock.sendall(data)
+
+        def send_pending(stream_id):
+            body = pending[stream_id]
+            while body:
+                size = min(conn.local_flow_control_window(stream_id), conn.max_outbound_frame_size, len(body))
+                if size <= 0:
+                    break
+                conn.send_data(stream_id, body[:size])
+                body = body[size:]
+            pending[stream_id] = body
+            if not body:
+                del pending[stream_id]
+                conn.end_stream(stream_id)
+
+        def respond(stream_id):
+            status, body = self.responses.get(paths.pop(stream_id), (404, b""))
+            body = gzip.compress(body)
+            with lock:
+                conn.send_headers(
+                    stream_id,
+                    [
+                        (":status", str(status)),
+                        ("content-type", "application/json"),
+                        ("content-encoding", "gzip"),
+                        ("content-length", str(len(body))),
+                    ],
+                )
+                pending[stream_id] = body
+                send_pending(stream_id)
+                flush()
+
+        with lock:
+            conn.initiate_connection()
+            flush()
+        while True:
+            data = sock.recv(65535)
+            if not data:
+                break
+            with lock:
+                for event in conn.receive_data(data):
+                    if isinstance(event, h2.events.RequestReceived):
+                        paths[event.stream_id] = dict(event.headers)[b":path"].decode()
+                        self.max_open_streams = max(self.max_open_streams, len(paths))
+                    elif isinstance(event, h2.events.DataReceived):
+                        conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+                    elif isinstance(event, h2.events.StreamEnded):
+                        threading.Timer(self.delay, respond, args=(event.stream_id,)).start()
+                    elif isinstance(event, h2.events.WindowUpdated):
+                        for stream_id in list(pending):
+                            send_pending(stream_id)
+                flush()
+        sock.close()
+
+    def close(self):
+        self._sock.close()
+
+
+def _zone_response(size):
+    records = [
+        {"id": str(i), "name": f"host{i}.some.domain", "type": "A", "content": "10.0.0.1", "ttl": "600"}
+        for i in range(size)
+    ]
+    return json.dumps({"status": "SUCCESS", "records": records}).encode("utf-8")
+
+
+ZONE_SIZE = 5000
+
+
+@pytest.fixture
+def server(_http2_extra):
+    server = H2StubServer(
+        {
+            "/dns/retrieve/some.domain": (200, _zone_response(ZONE_SIZE)),
+            "/dns/retrieve/error.domain": (200, b'{"status": "ERROR", "message": "Invalid domain."}'),
+            "/dns/retrieve/failed.domain": (500, b''),
+            "/ping": (200, b'{"status": "SUCCESS", "yourIp": "127.0.0.1"}'),
+        },
+        delay=0.2,
+    )
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def http2_api(server):
+    api = PorkbunAPI(
+        apikey="apikey", secretapikey="secretapikey", endpoint=f"http://127.0.0.1:{server.port}/", http2=True
+    )
+    yield api
+    api.close()
+
+
+def test_http2_methods(http2_api):
+    assert http2_api.get_my_ip() == "127.0.0.1"
+    assert len(http2_api.list_dns_records("some.domain")) == ZONE_SIZE
+    assert sum(1 for _ in http2_api.iter_dns_records("some.domain")) == ZONE_SIZE
+
+
+@pytest.mark.parametrize("method", ["list_dns_records", "iter_dns_records"])
+@pytest.mark.parametrize(
+    ("domain", "message"),
+    [("error.domain", "Invalid domain."), ("failed.domain", "failed with 500 HTTP status code")],
+)
+def test_http2_methods_failure(http2_api, method, domain, message):
+    with pytest.raises(RuntimeError, match=message):
+        list(getattr(http2_api, method)(domain))
+
+
+def test_http2_multiplexing(server, http2_api):
+    jobs = 8
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = list(executor.map(lambda _: http2_api.get_my_ip(), range(jobs)))
+    elapsed = time.perf_counter() - start
+
+    assert results == ["127.0.0.1"] * jobs
+    # all requests are in flight at once over a single connection
+    assert server.connections == 1
+    assert server.max_open_streams > 1
+    assert elapsed < jobs * server.delay / 2
+
+
+def test_http2_many_concurrent_requests(server, http2_api):
+    server.delay = 0
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        results = list(executor.map(lambda _: http2_api.get_my_ip(), range(500)))
+
+    assert results == ["127.0.0.1"] * 500
+    assert server.connections == 1
+
+
+@pytest.mark.usefixtures("_http2_extra")
+def test_http2_connection_error():
+    api = PorkbunAPI(apikey="apikey", secretapikey="secretapikey", endpoint="http://127.0.0.1:1/", http2=True)
+    try:
+        with pytest.raises(RuntimeError, match="get_my_ip failed: request raised an exception: "):
+            api.get_my_ip()
+        with pytest.raises(RuntimeError, match="iter_dns_records failed: request raised an exception: "):
+            list(api.iter_dns_records("some.domain"))
+    finally:
+        api.close()
+
+
+@pytest.mark.usefixtures("_http2_extra")
+def test_http2_errors():
+    import httpx
+
+    async def fail(error):
+        raise error
+
+    http2_transport = HTTP2Transport(prior_knowledge=True)
+    http2_transport._start()
+    try:
+        error = httpx.ConnectError("connection refused")
+        with pytest.raises(transport.TransportError, match="connection refused") as excinfo:
+            http2_transport._run(fail(error))
+        assert excinfo.value.__cause__ is error
+        # other errors are raised unchanged, not chained to themselves
+        error = ValueError("invalid")
+        with pytest.raises(ValueError, match="invalid") as excinfo:
+            http2_transport._run(fail(error))
+        assert excinfo.value is error
+        assert excinfo.value.__cause__ is None
+    finally:
+        http2_transport.close()
+
+
+@pytest.mark.usefixtures("_http2_extra")
+def test_http2_transport_close():
+    transport = HTTP2Transport(prior_knowledge=True)
+    transport.close()
+    transport._start()
+    thread = transport._thread
+    assert thread.is_alive()
+    transport.close()
+    assert not thread.is_alive()
+    assert transport._client is None
+
+
+def _recorded_responses():
+    responses = {
+        "/api/ping": b'{"status": "SUCCESS", "yourIp": "10.0.0.1"}',
+        "/api/dns/retrieve/some.domain": _zone_response(3),
+        "/api/dns/create/some.domain": b'{"status": "SUCCESS", "id": 42}',
+    }
+
+    def post(url, data, headers, stream=False, timeout=None):
+        path = url[len("http://porkbun.com") :]
+        if path not in responses:
+            return transport._BufferedResponse(404, b"")
+        return transport._BufferedResponse(200, responses[path])
+
+    inner = Mock()
+    inner.post.side_effect = post
+    return inner
+
+
+def _record(path):
+    inner = _recorded_responses()
+    api = PorkbunAPI(apikey="pk1_secret", secretapikey="sk1_secret", endpoint="http://porkbun.com/api/", transport=None)
+    api.transport = transport.RecordingTransport(inner, str(path))
+    records = api.list_dns_records("some.domain")
+    assert api.get_my_ip() == "10.0.0.1"
+    assert api.get_my_ip() == "10.0.0.1"
+    assert list(api.iter_dns_records("some.domain")) == records
+    assert api.create_record("some.domain", {"name": "www", "type": "A", "content": "10.0.0.1"}) == 42
+    with pytest.raises(RuntimeError, match="failed with 404 HTTP status code"):
+        api.list_dns_records("other.domain")
+    api.close()
+    inner.close.assert_called_once_with()
+    return records
+
+
+def test_record_replay(tmp_path):
+    cassette = tmp_path / "cassette.jsonl.gz"
+    records = _record(cassette)
+
+    # credentials are not recorded
+    content = gzip.decompress(cassette.read_bytes())
+    assert b"pk1_secret" not in content
+    assert b"sk1_secret" not in content
+    assert b"apikey" not in content
+    assert len(content.splitlines()) == 6
+
+    # responses are served for the same requests with other credentials and endpoint host
+    api = PorkbunAPI(
+        apikey="other",
+        secretapikey="other",
+        endpoint="http://localhost/api/",
+        transport=transport.ReplayTransport(str(cassette)),
+    )
+    assert api.get_my_ip() == "10.0.0.1"
+    assert api.list_dns_records("some.domain") == records
+    assert list(api.iter_dns_records("some.domain")) == records
+    assert api.create_record("some.domain", {"name": "www", "type": "A", "content": "10.0.0.1"}) == 42
+    with pytest.raises(RuntimeError, match="failed with 404 HTTP status code"):
+        api.list_dns_records("other.domain")
+
+    # requests that were not recorded fail
+    with pytest.raises(RuntimeError, match="no recorded response for '/api/dns/create/some.domain'"):
+        api.create_record("some.domain", {"name": "ftp", "type": "A", "content": "10.0.0.1"})
+    with pytest.raises(RuntimeError, match="no recorded response for '/api/dns/retrieve/new.domain'"):
+        list(api.iter_dns_records("new.domain"))
+
+
+@pytest.mark.parametrize(("latency", "delays"), [(None, []), (0.25, [0.25, 0.25]), ("recorded", [1.5, 0.5])])
+def test_replay_latency(tmp_path, latency, delays):
+    cassette = tmp_path / "cassette.jsonl.gz"
+    entries = [
+        {
+            "endpoint": "/ping",
+            "payload": {},
+            "status": 200,
+            "body": '{"status": "SUCCESS", "yourIp": "1"}',
+            "elapsed": 1.5,
+        },
+        {
+            "endpoint": "/ping",
+            "payload": {},
+            "status": 200,
+            "body": '{"status": "SUCCESS", "yourIp": "2"}',
+            "elapsed": 0.5,
+        },
+    ]
+    cassette.write_bytes(gzip.compress(b"".join(json.dumps(x).encode() + b"\n" for x in entries)))
+
+    replay = transport.ReplayTransport(str(cassette), latency=latency)
+    with patch("porkbun_api_cli.transport.time.sleep") as mock_sleep:
+        ips = [replay.post("http://localhost/ping", b'{"apikey": "key"}', {}).content for _ in range(3)]
+
+    # responses are served in recorded order, the last one is repeated
+    assert [json.loads(x)["yourIp"] for x in ips] == ["1", "2", "2"]
+    assert [x.args[0] for x in mock_sleep.call_args_list][:2] == delays
+
+
+def test_replay_latency_invalid(tmp_path):
+    cassette = tmp_path / "cassette.jsonl.gz"
+    cassette.write_bytes(gzip.compress(b""))
+    with pytest.raises(ValueError, match="unsupported replay latency 'slow'"):
+        transport.ReplayTransport(str(cassette), latency="slow")
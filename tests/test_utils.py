@@ -93,6 +93,40 @@ def test_operation_allowed_by_mode_not_allowed(operation, mode):
     assert not utils.operation_allowed_by_mode(operation, mode)
 
 
+@pytest.mark.parametrize(
+    ("domain_name", "name", "subdomain"),
+    [
+        ("example.com", "example.com", ""),
+        ("example.com", "www.example.com", "www"),
+        ("example.com", "_dmarc.mail.example.com", "_dmarc.mail"),
+    ],
+)
+def test_get_record_subdomain(domain_name, name, subdomain):
+    assert utils.get_record_subdomain(domain_name, {"name": name}) == subdomain
+    assert utils.get_record_fqdn(domain_name, {"name": subdomain}) == name
+
+
+def test_get_record_subdomain_invalid():
+    with pytest.raises(ValueError, match="record name 'www.other.com' is not within domain 'example.com'"):
+        utils.get_record_subdomain("example.com", {"name": "www.other.com"})
+    with pytest.raises(ValueError, match="is not within domain"):
+        utils.get_record_subdomain("example.com", {"name": "notexample.com"})
+
+
+def test_export_domain_entry():
+    records = [
+        {"id": "1", "name": "example.com", "type": "A", "content": "1.2.3.4", "ttl": "600", "prio": None, "notes": ""},
+        {"id": "2", "name": "example.com", "type": "MX", "content": "mx.example.com", "ttl": "600", "prio": "10"},
+    ]
+    assert utils.export_domain_entry("example.com", records) == {
+        "name": "example.com",
+        "records": [
+            {"name": "", "type": "A", "content": "1.2.3.4", "ttl": "600"},
+            {"name": "", "type": "MX", "content": "mx.example.com", "ttl": "600", "prio": "10"},
+        ],
+    }
+
+
 def test_load_config_valid():
 
     data = "api:\n  apikey: 'mock_apikey'\n  secretapikey: 'mock_secretapikey'\ndomains:\n"
@@ -124,3 +158,99 @@ def test_load_config_invalid(data):
             ValueError, match="required objects 'api' and/or 'domain' with all required fields not found"
         ):
             utils.load_config("")
+
+
+def test_fingerprint_records():
+    records = [
+        {"name": "www.example.com", "type": "A", "content": "127.0.0.1"},
+        {"name": "example.com", "type": "MX", "content": "mail.example.com", "prio": "10"},
+    ]
+
+    assert utils.fingerprint_records(records) == utils.fingerprint_records(reversed(records))
+    assert utils.fingerprint_records(records) != utils.fingerprint_records(records[:1])
+    assert utils.fingerprint_records(records, "append") != utils.fingerprint_records(records, "replace")
+    assert utils.fingerprint_records(records) != utils.fingerprint_records(
+        [{**records[0], "content": "10.0.0.1"}, records[1]]
+    )
+
+
+def test_load_config_templates():
+    config = utils.load_config("tests/config_templates.yml")
+
+    assert sorted(config["templates"]) == ["mail", "web"]
+    assert config["templates"]["web"].variables == ["domain", "ip"]
+
+
+@pytest.mark.parametrize(
+    ("data", "message"),
+    [
+        (
+            "api:\n  apikey: 'key'\n  secretapikey: 'secret'\ndomains:\n  - name: example.com\n    include: [web]\n",
+            "domains include templates but no 'templates' are defined",
+        ),
+        (
+            "api:\n  apikey: 'key'\n  secretapikey: 'secret'\ntemplates:\n  web:\n"
+            "    records: [{name: '', type: A, content: '{{addr}}'}]\n"
+            "domains:\n  - name: example.com\n    include: [web]\n",
+            "domain 'example.com': template 'web' requires undefined variables: addr",
+        ),
+    ],
+)
+def test_load_config_templates_invalid(data, message):
+    with mock.patch("builtins.open", mock.mock_open(read_data=data)):
+        with pytest.raises(ValueError, match=message):
+            utils.load_config("")
+
+
+def test_load_config_defaults_invalid():
+    data = "api:\n  apikey: 'key'\n  secretapikey: 'secret'\ndefaults: []\ndomains:\n"
+    with mock.patch("builtins.open", mock.mock_open(read_data=data)):
+        with pytest.raises(ValueError, match="'defaults' must be a mapping with 'records' and/or 'include'"):
+            utils.load_config("")
+
+    data = "api:\n  apikey: 'key'\n  secretapikey: 'secret'\ndefaults:\n  include: [web]\ndomains:\n"
+    with mock.patch("builtins.open", mock.mock_open(read_data=data)):
+        with pytest.raises(ValueError, match="domains include templates but no 'templates' are defined"):
+            utils.load_config("")
+
+
+def test_load_config_http2_invalid():
+    data = "api:\n  apikey: 'key'\n  secretapikey: 'secret'\n  http2: 'yes'\ndomains:\n"
+    with mock.patch("builtins.open", mock.mock_open(read_data=data)):
+        with pytest.raises(ValueError, match="'api.http2' must be a boolean"):
+            utils.load_config("")
+
+
+def test_load_config_validation(tmp_path):
+    config_file = tmp_path / "config.yml"
+    config_file.write_text(
+        "api:\n  apikey: 'key'\n  secretapikey: 'secret'\ndomains:\n  - name: example.com\n    records:\n"
+        "      - {name: www, type: A, content: 10.0.0.1}\n"
+        "      - {name: www, type: A, content: 10.0.0.1}\n"
+    )
+    warnings = []
+    config = utils.load_config(str(config_file), warnings)
+    assert config["domains"][0]["records"] == [{"name": "www", "type": "A", "content": "10.0.0.1"}]
+    assert warnings == [
+        f"{config_file}:8: domain 'example.com': duplicate A-record 'www' dropped, first defined at {config_file}:7"
+    ]
+
+    config_file.write_text(
+        "api:\n  apikey: 'key'\n  secretapikey: 'secret'\ndomains:\n  - name: example.com\n    records:\n"
+        "      - {name: www, type: A, content: www.example.com}\n"
+        "      - {name: mail, type: MX, content: mail.example.com, ttl: 60}\n"
+    )
+    with pytest.raises(ValueError, match="2 problems found:\n") as e:
+        utils.load_config(str(config_file))
+    assert str(e.value).splitlines()[1:] == [
+        f"{config_file}:7: domain 'example.com': invalid IPv4 address 'www.example.com'",
+        f"{config_file}:8: domain 'example.com': 'ttl' must be at least 600",
+    ]
+
+
+@pytest.mark.parametrize("value", ["'10'", "0", "-1", "true"])
+def test_load_config_timeout_invalid(value):
+    data = f"api:\n  apikey: 'key'\n  secretapikey: 'secret'\n  read_timeout: {value}\ndomains:\n"
+    with mock.patch("builtins.open", mock.mock_open(read_data=data)):
+        with pytest.raises(ValueError, match="'api.read_timeout' must be a positive number of seconds"):
+            utils.load_config("")
@@ -0,0 +1,156 @@
+import pytest
+import yaml
+
+from porkbun_api_cli import validate
+
+
+def _load(data):
+    loader = validate.line_tracking_loader(getattr(yaml, "CSafeLoader", yaml.SafeLoader))(data)
+    try:
+        return loader.get_single_data(), loader.lines
+    finally:
+        loader.dispose()
+
+
+def _config(records, **kwargs):
+    return {"api": {}, "domains": [{"name": "example.com", "records": records}], **kwargs}
+
+
+@pytest.mark.parametrize(
+    "record",
+    [
+        {"name": "", "type": "A", "content": "10.0.0.1"},
+        {"name": "*", "type": "A", "content": "10.0.0.1", "ttl": 600},
+        {"name": "*.dev", "type": "AAAA", "content": "fe80::1", "ttl": "3600"},
+        {"name": "www", "type": "CNAME", "content": "example.com."},
+        {"name": "", "type": "ALIAS", "content": "lb.example.net"},
+        {"name": "", "type": "MX", "content": "mail.example.com", "prio": 10},
+        {"name": "_sip._tcp", "type": "SRV", "content": "5 5060 sip.example.com", "prio": "0"},
+        {"name": "", "type": "CAA", "content": '0 issue "letsencrypt.org"'},
+        {"name": "", "type": "TXT", "content": "v=spf1 mx -all"},
+        {"name": "{{sub}}", "type": "A", "content": "{{ip}}"},
+    ],
+)
+def test_validate_config_valid(record):
+    assert validate.validate_config(_config([record])) == []
+
+
+@pytest.mark.parametrize(
+    ("record", "message"),
+    [
+        ("www", "record must be a mapping"),
+        ({"name": "www"}, "record requires 'type', 'content' fields"),
+        ({"name": "www", "type": "A"}, "record requires 'content' field"),
+        ({"name": 1, "type": "A", "content": "10.0.0.1"}, "'name' must be a string"),
+        ({"name": "-www", "type": "A", "content": "10.0.0.1"}, "invalid subdomain name '-www'"),
+        ({"name": "www", "type": "PTR", "content": "10.0.0.1"}, "invalid record type 'PTR', expected one of: A,"),
+        ({"name": "www", "type": "A", "content": "10.0.0.256"}, "invalid IPv4 address '10.0.0.256'"),
+        ({"name": "www", "type": "AAAA", "content": "10.0.0.1"}, "invalid IPv6 address '10.0.0.1'"),
+        ({"name": "www", "type": "CNAME", "content": "http://example.com"}, "invalid host name 'http://example.com'"),
+        ({"name": "", "type": "MX", "content": ""}, "content must be a non-empty string"),
+        ({"name": "", "type": "TXT", "content": True}, "content must be a non-empty string"),
+        ({"name": "_sip._tcp", "type": "SRV", "content": "5060 sip.example.com"}, "invalid SRV content"),
+        ({"name": "", "type": "CAA", "content": "issue letsencrypt.org"}, "invalid CAA content"),
+        ({"name": "", "type": "CNAME", "content": "example.net"}, "CNAME record is not allowed at the domain apex"),
+        ({"name": "www", "type": "A", "content": "10.0.0.1", "ttl": 300}, "'ttl' must be at least 600"),
+        ({"name": "www", "type": "A", "content": "10.0.0.1", "ttl": "1h"}, "'ttl' must be a non-negative integer"),
+        ({"name": "", "type": "MX", "content": "mail.example.com", "prio": -1}, "'prio' must be a non-negative"),
+    ],
+)
+def test_validate_config_invalid_record(record, message):
+    with pytest.raises(ValueError, match="1 problem found:\n<config>: domain 'example.com': " + message):
+        validate.validate_config(_config([record]))
+
+
+def test_validate_config_reports_all_problems_with_lines():
+    config, lines = _load(
+        "api: {}\n"  # 1
+        "domains:\n"  # 2
+        "  - name: example.com\n"  # 3
+        "    records:\n"  # 4
+        "      - {name: www, type: A, content: 10.0.0.1}\n"  # 5
+        "      - {name: www, type: CNAME, content: example.net}\n"  # 6
+        "      - {name: '', type: A, content: 10.0.0.300, ttl: 60}\n"  # 7
+        "  - name: example.org\n"  # 8
+        "  - name: example.com\n"  # 9
+        "  - name: invalid\n"  # 10
+    )
+
+    with pytest.raises(ValueError, match="problems found:") as e:
+        validate.validate_config(config, "config.yml", lines)
+
+    assert str(e.value).splitlines() == [
+        "5 problems found:",
+        "config.yml:9: domain 'example.com' is already defined at config.yml:3",
+        "config.yml:10: invalid domain name 'invalid'",
+        "config.yml:7: domain 'example.com': invalid IPv4 address '10.0.0.300'",
+        "config.yml:7: domain 'example.com': 'ttl' must be at least 600",
+        "config.yml:6: domain 'example.com': CNAME-record 'www' conflicts with other records of the same name: A",
+    ]
+
+
+def test_validate_config_cname_conflicts():
+    config = _config(
+        [
+            {"name": "www", "type": "CNAME", "content": "a.example.net"},
+            {"name": "www", "type": "CNAME", "content": "b.example.net"},
+            {"name": "ftp", "type": "CNAME", "content": "a.example.net"},
+            {"name": "mail", "type": "MX", "content": "mx.example.net"},
+        ],
+        templates={"mail": {"records": [{"name": "mail", "type": "CNAME", "content": "{{mx}}"}]}},
+    )
+    config["domains"][0]["include"] = ["mail"]
+
+    with pytest.raises(ValueError, match="problems found:") as e:
+        validate.validate_config(config)
+
+    assert str(e.value).splitlines()[1:] == [
+        "<config>: domain 'example.com': CNAME-record 'mail' conflicts with other records of the same name: MX",
+        "<config>: domain 'example.com': CNAME-record 'www' conflicts with other records of the same name: CNAME",
+        "<config>: domain 'example.com': CNAME-record 'www' conflicts with other records of the same name: CNAME",
+    ]
+
+
+def test_validate_config_duplicates():
+    config, lines = _load(
+        "api: {}\n"  # 1
+        "templates:\n"  # 2
+        "  mail:\n"  # 3
+        "    records:\n"  # 4
+        "      - {name: '', type: MX, content: mail.example.com, prio: 10}\n"  # 5
+        "      - {name: '', type: MX, content: mail.example.com, prio: '10'}\n"  # 6
+        "domains:\n"  # 7
+        "  - name: example.com\n"  # 8
+        "    include: [mail]\n"  # 9
+        "    records:\n"  # 10
+        "      - {name: www, type: A, content: 10.0.0.1}\n"  # 11
+        "      - {name: '', type: MX, content: mail.example.com, prio: 10}\n"  # 12
+        "      - {name: www, type: A, content: 10.0.0.1}\n"  # 13
+        "      - {name: www, type: A, content: 10.0.0.1, ttl: 600}\n"  # 14
+    )
+
+    warnings = validate.validate_config(config, "config.yml", lines)
+
+    assert warnings == [
+        "config.yml:6: template 'mail': duplicate MX-record '' dropped, first defined at config.yml:5",
+        "config.yml:13: domain 'example.com': duplicate A-record 'www' dropped, first defined at config.yml:11",
+        "config.yml:12: domain 'example.com': duplicate MX-record '' dropped, also included from a template"
+        " at config.yml:5",
+    ]
+    assert config["templates"]["mail"]["records"] == [
+        {"name": "", "type": "MX", "content": "mail.example.com", "prio": 10}
+    ]
+    assert config["domains"][0]["records"] == [
+        {"name": "www", "type": "A", "content": "10.0.0.1"},
+        {"name": "www", "type": "A", "content": "10.0.0.1", "ttl": 600},
+    ]
+
+
+def test_validate_config_priority():
+    config = _config([])
+    config["domains"][0]["priority"] = "critical"
+    assert validate.validate_config(config) == []
+
+    config["domains"][0]["priority"] = "urgent"
+    with pytest.raises(ValueError, match="domain 'example.com': 'priority' must be one of: critical, normal, bulk"):
+        validate.validate_config(config)